@@ -1,9 +1,14 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Union
-from BinanceQuantTradingEngine import BinanceQuantTradingEngine
+from typing import Dict, Union
+from EngineHost import EngineHost
+from JobQueue import JobQueue, JobSkipped
+from Metrics import REGISTRY
 from fastapi.middleware.cors import CORSMiddleware
-import threading
+import asyncio
+import json
+import logging
 
 app = FastAPI()
 app.add_middleware(
@@ -16,8 +21,10 @@ app.add_middleware(
 
 
 CONFIG = {
-    "SIMULATION_MODE": False, # True / False
-    "DRY_RUN": False, # True / False
+    "SIMULATION_MODE": False, # True runs a backtest over BACKTEST_DATA_DIR on /start instead of trading live
+    "DRY_RUN": False, # True sends orders to an in-memory paper exchange instead of Binance (set before start-up)
+    "PAPER_BALANCE": 1000.0, # starting USDT balance of the DRY_RUN paper account
+    "PAPER_MATCH_INTERVAL": 1.0, # seconds between paper matches of resting orders against the latest quotes (0 = only on submission and account reads)
     "RISK_REWARD_RATIO": 2.0, #1.0 to 4.0
     "MAX_PORTFOLIO_RISK": 1.0, # 0.1 to 1.0
     "TRADE_FEE_RATE": 0.0018, # float
@@ -29,18 +36,111 @@ CONFIG = {
     "TP": 0.50, # 0.08 means 8% take profit
     "SL": 0.20, # 0.08 means -8% stop loss
     "PAIRS_TO_PROCESS": 10, # 0 to 150
-    "SORTBY": "volume", # "volume" or "price"
+    "SORTBY": "volume", # "volume", "price", "spread" or "liquidity"
+    "QUOTE_ASSET": "USDT", # only symbols quoted in this asset are ranked
     "TOTAL_TRADES_OPEN": 0, 
     "MAX_TRADES": 8,  # Maximum number of trades to open at once
+    "EXCHANGE_INFO_TTL": 3600, # seconds before symbol filters are re-downloaded
+    "FETCH_WORKERS": 8, # concurrent depth/kline requests per cycle
+    "REQUEST_WEIGHT_PER_MINUTE": 2000, # stay below Binance's 2400 IP weight limit
+    "IP_WEIGHT_LIMIT": 2400, # exchange-side weight per minute, checked against X-MBX-USED-WEIGHT-1M
+    "REST_MAX_RETRIES": 3, # retries on 429, 5xx and connection errors (orders only on 429)
+    "DEPTH_LIMIT": 5, # order book levels fetched per symbol (5 = weight 2)
+    "KLINE_LIMIT": 500, # 15m bars fetched per symbol
+    "KLINE_STORE_DIR": "kline_store", # closed bars persisted here for warm restarts ("" disables)
+    "MARKET_DATA_MODE": "rest", # "rest" polls tickers each cycle, "stream" keeps them live over WebSocket
+    "STREAM_URL": "wss://fstream.binance.com", # point at a local replay server for testing
+    "STREAM_RECORD_PATH": None, # file to append raw stream messages to for later replay
+    "ACCOUNT_DATA_MODE": "rest", # "rest" polls positions/orders/balances, "stream" tracks them from the user-data stream (needs API credentials)
+    "ACCOUNT_RECONCILE_INTERVAL": 300, # seconds between REST reconciles of the streamed account state
+    "ORDER_WORKERS": 4, # brackets placed in parallel
+    "CYCLE_INTERVAL": 900, # seconds between scheduled cycles (900 = one 15m bar)
+    "ALIGN_TO_BAR_CLOSE": True, # True runs just after each bar closes, False every CYCLE_INTERVAL from start
+    "BAR_CLOSE_DELAY": 2, # seconds after the bar close before the cycle starts
+    "OVERLAP_POLICY": "skip", # "skip" or "coalesce" triggers missed while a cycle overran
+    "SHARDS": 1, # worker processes computing metrics (>1 splits the universe and the weight budget; such an engine must be the only hosted one; set before start-up)
+    "MARKET_DATA_TTL": 30, # seconds hosted engines reuse each other's ticker/depth/kline fetches
+    "API_KEY_ENV": "BINANCE_API_KEY", # env var holding the API key
+    "API_SECRET_ENV": "BINANCE_SECRET_KEY", # env var holding the API secret
+    "CREDENTIAL_PROFILE": "", # "X" reads API_KEY_ENV_X / API_SECRET_ENV_X instead (set per engine on POST /engines)
+    "LOG_FILE": "LogsBinanceQuantTradingEngine.log", # JSON lines (cycle, stage, symbol, latency), written by a background thread
+    "LOG_LEVEL": "INFO", # "DEBUG" adds per-stage timings and trade parameters
+    "LOG_MAX_BYTES": 20971520, # LOG_FILE size before it is rotated
+    "LOG_BACKUPS": 5, # rotated files kept
+    "LOG_SAMPLE_PER_MINUTE": 2, # per-symbol skip/block messages kept per symbol and message each minute
+    "LOG_QUEUE_SIZE": 10000, # records buffered for the writer; beyond this they are dropped, never waited on
+    "BACKTEST_DATA_DIR": "backtest_data", # <SYMBOL>.csv / .parquet / .bin (KlineStore) 15m klines, optional <SYMBOL>_book files
+    "BACKTEST_START": "", # first bar, e.g. "2024-01-01" ("" = all data)
+    "BACKTEST_END": "", # end bar, exclusive
+    "BACKTEST_BALANCE": 1000.0, # starting USDT balance
+    "BACKTEST_ENTRY_BARS": 1, # bars an unfilled LIMIT entry rests before it is cancelled
+    "BACKTEST_WORKERS": 0, # processes preparing symbols (0 = one per CPU)
 }
 
-engine = BinanceQuantTradingEngine(CONFIG)
+# One process hosts every engine; they share market data and the request
+# weight budget. "default" runs on CONFIG and answers the unprefixed routes,
+# every engine (default included) is also under /engines/{engine_id}/...
+DEFAULT_ENGINE = "default"
+host = EngineHost(CONFIG)
 READONLY_KEYS = {"TOTAL_TRADES_OPEN"}
+# Seconds between keep-alive comments on an idle /events stream.
+EVENTS_HEARTBEAT = 15
+
+# /refresh and /run_strategy run on the engine's job queue and return a job
+# id. They take the engine's cycle lock, so a job that finds a cycle running
+# ends "skipped" instead of trading alongside it. Read endpoints serve
+# engine.status_snapshot, which every cycle and job republishes.
+jobs = {}
+
+
+def add_engine(engine_id, overrides=None):
+    engine = host.add(engine_id, overrides)
+    jobs[engine_id] = JobQueue()
+    jobs[engine_id].submit("snapshot", engine.publish_status)
+    return engine
+
+
+def _refresh_job(engine):
+    with engine.cycle_slot() as acquired:
+        if not acquired:
+            raise JobSkipped("Cycle already in progress")
+        result = engine.refresh_data()
+    engine.publish_status()
+    return result
+
+
+def _strategy_job(engine):
+    with engine.cycle_slot() as acquired:
+        if not acquired:
+            raise JobSkipped("Cycle already in progress")
+        engine.execute_strategy()
+    engine.publish_status()
+    return "Strategy executed"
+
+
+engine = add_engine(DEFAULT_ENGINE)
 
 class ConfigUpdate(BaseModel):
     key: str
     value: Union[float, int, bool, str]
 
+class EngineCreate(BaseModel):
+    id: str
+    config: Dict[str, Union[float, int, bool, str, None]] = {}
+
+def instance(request: Request):
+    engine_id = request.path_params.get("engine_id", DEFAULT_ENGINE)
+    target = host.get(engine_id)
+    if target is None:
+        raise HTTPException(status_code=404, detail=f"Engine '{engine_id}' not found.")
+    return engine_id, target
+
+@app.on_event("shutdown")
+def shutdown():
+    for queue in jobs.values():
+        queue.shutdown()
+    host.close()
+
 # Health check endpoint for Railway
 @app.get("/health")
 async def health_check():
@@ -50,84 +150,158 @@ async def health_check():
 async def root():
     return {"message": "Binance Quant Trading Bot API", "status": "running"}
 
-@app.get("/config")
-def get_config():
-    return CONFIG
+@app.get("/engines")
+async def list_engines():
+    return host.status()
+
+@app.post("/engines", status_code=201)
+def create_engine(create: EngineCreate):
+    unknown = [key for key in create.config if key not in CONFIG]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Config keys {unknown} not found.")
+    try:
+        add_engine(create.id, create.config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=409, detail=f"Engine '{create.id}' already exists.")
+    return {"message": f"Engine '{create.id}' created"}
+
+@app.delete("/engines/{engine_id}")
+def delete_engine(engine_id: str):
+    if engine_id == DEFAULT_ENGINE:
+        raise HTTPException(status_code=400, detail="The default engine cannot be removed.")
+    if host.get(engine_id) is None:
+        raise HTTPException(status_code=404, detail=f"Engine '{engine_id}' not found.")
+    jobs.pop(engine_id).shutdown()
+    host.remove(engine_id)
+    return {"message": f"Engine '{engine_id}' removed"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+router = APIRouter()
 
-@app.post("/config")
-def update_config(update: ConfigUpdate):
+@router.get("/config")
+def get_config(target=Depends(instance)):
+    return target[1].config
+
+@router.post("/config")
+def update_config(update: ConfigUpdate, target=Depends(instance)):
+    _, engine = target
     key = update.key
     value = update.value
-    if key not in CONFIG:
+    if key not in engine.config:
         raise HTTPException(status_code=404, detail=f"Config key '{key}' not found.")
     if key in READONLY_KEYS:
         raise HTTPException(status_code=400, detail=f"Config key '{key}' is read-only.")
-    CONFIG[key] = value
+    engine.config[key] = value
     if hasattr(engine, key):
         setattr(engine, key, value)
     return {"message": f"{key} updated to {value}"}
 
-@app.post("/refresh")
-def run_refresh():
-    try:
-        result = engine.refresh_data()
-        return {"refresh": result}
-    except Exception as e:
-        print(f"Error refreshing data: {e}")
-        return {"status": "error", "message": str(e)}
+@router.post("/refresh", status_code=202)
+async def run_refresh(target=Depends(instance)):
+    engine_id, engine = target
+    return {"job": jobs[engine_id].submit("refresh", _refresh_job, engine)}
 
-@app.post("/run_strategy")
-def run_strategy():
-    try:
-        engine.execute_strategy()
-        return {"status": "Strategy executed"}
-    except Exception as e:
-        print(f"Error executing strategy: {e}")
-        return {"status": "error", "message": str(e)}    
+@router.post("/run_strategy", status_code=202)
+async def run_strategy(target=Depends(instance)):
+    engine_id, engine = target
+    return {"job": jobs[engine_id].submit("run_strategy", _strategy_job, engine)}
 
-@app.get("/positions")
-def get_positions():
-    try:
-        return {"positions": engine.get_pos()}
-    except Exception as e:
-        print(f"Error getting positions: {e}")
-        return {"positions": [], "status": "error", "message": str(e)}
+@router.get("/jobs")
+async def list_jobs(target=Depends(instance)):
+    return {"jobs": jobs[target[0]].list()}
 
-@app.get("/orders")
-def get_orders():
-    try:
-        return {"orders": engine.check_orders()}
-    except Exception as e:
-        print(f"Error getting orders: {e}")
-        return {"orders": [], "status": "error", "message": str(e)}
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, target=Depends(instance)):
+    job = jobs[target[0]].get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+@router.get("/positions")
+async def get_positions(target=Depends(instance)):
+    snapshot = target[1].status_snapshot
+    return {"positions": snapshot.get("positions", []), "published_at": snapshot.get("published_at")}
+
+@router.get("/orders")
+async def get_orders(target=Depends(instance)):
+    snapshot = target[1].status_snapshot
+    return {"orders": snapshot.get("orders", []), "published_at": snapshot.get("published_at")}
 
-@app.get("/status")
-def get_status():
+@router.get("/status")
+async def get_status(target=Depends(instance)):
+    engine_id, engine = target
+    snapshot = engine.status_snapshot
     return {
+        "engine": engine_id,
         "running": engine.running,
-        "run_count": engine.run_count,
-        "total_trades_open": CONFIG["TOTAL_TRADES_OPEN"],
+        "scheduler": engine.scheduler.status(),
+        "total_trades_open": engine.config.get("TOTAL_TRADES_OPEN", 0),
+        "events": engine.events.status(),
+        **{key: value for key, value in snapshot.items() if key not in ("market_metrics", "trend_scores")},
+    }
+
+@router.get("/market_metrics")
+async def get_market_metrics(target=Depends(instance)):
+    snapshot = target[1].status_snapshot
+    return {
+        "market_metrics": snapshot.get("market_metrics", {}),
+        "trend_scores": snapshot.get("trend_scores", {}),
+        "published_at": snapshot.get("published_at"),
     }
 
-@app.post("/start")
-def start_bot():
+@router.get("/events")
+async def stream_events(request: Request, target=Depends(instance)):
+    # Server-sent events: "metrics" after every refresh, "trade" per entry,
+    # "exits" per entry fill (protected, or closed at market when not),
+    # "status" with every published snapshot and "backtest" results.
+    hub = target[1].events
+    queue = hub.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                data = json.dumps(event['data'], default=str)
+                yield f"id: {event['id']}\nevent: {event['kind']}\ndata: {data}\n\n"
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.post("/start")
+def start_bot(target=Depends(instance)):
+    engine = target[1]
     try:
-        engine.run()
+        if not engine.start():
+            return {"message": "Bot is already running"}
         return {"message": "success"}
     except Exception as e:
-        print(f"Error starting bot: {e}")
+        logging.error(f"Error starting bot: {str(e)}")
         return {"status": "error", "message": str(e)}    
 
-@app.post("/stop")
-def stop_bot():
+@router.post("/stop")
+def stop_bot(target=Depends(instance)):
+    engine = target[1]
     try:
         if not engine.running:
             return {"message": "Bot is not running"}
         engine.stop()
         return {"message": "Bot stopped"}
     except Exception as e:
-        print(f"Error stopping bot: {e}")
+        logging.error(f"Error stopping bot: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+app.include_router(router)
+app.include_router(router, prefix="/engines/{engine_id}")
+
 #to run:
 #uvicorn AdminApi:app --reload --port 8000
@@ -0,0 +1,580 @@
+import argparse
+import heapq
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from KlineCache import INTERVAL_MS, KLINE_DTYPE
+from SignalEngine import MIN_BARS, trend_score_series
+from StrategyRules import (
+    FIXED_POSITION_SIZE, bracket_prices, entry_price, position_size, signal_direction, spread_ok, volatility_ok,
+)
+
+
+INTERVAL = '15m'
+BARS_PER_DAY = 86_400_000 // INTERVAL_MS[INTERVAL]
+KLINE_COLUMNS = ('open_time', 'open', 'high', 'low', 'close', 'volume')
+BOOK_COLUMNS = ('bid', 'ask', 'bid_qty', 'ask_qty')
+DATA_EXTENSIONS = ('.parquet', '.csv', '.bin')
+# SymbolRegistry's fallback when exchange info has no MIN_NOTIONAL filter.
+DEFAULT_MIN_NOTIONAL = 5.0
+
+
+def _to_ms(values):
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.int64)
+    stamps = pd.to_datetime(values, utc=True).dt.tz_convert(None)
+    return stamps.to_numpy().astype('datetime64[ms]').astype(np.int64)
+
+
+def _read_table(path, headerless=False):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.bin'):
+        # KlineStore files: raw KLINE_DTYPE records.
+        raw = np.fromfile(path, dtype=np.uint8)
+        usable = len(raw) - len(raw) % KLINE_DTYPE.itemsize
+        return pd.DataFrame(raw[:usable].view(KLINE_DTYPE))
+    frame = pd.read_csv(path)
+    if headerless and 'open_time' not in frame.columns:
+        # Binance's public kline dumps (data.binance.vision) have no header row.
+        frame = pd.read_csv(path, header=None).iloc[:, :len(KLINE_COLUMNS)]
+        frame.columns = KLINE_COLUMNS
+    return frame
+
+
+def find_data_files(data_dir, symbols=None):
+    # {symbol: (kline path, book path or None)} for every <SYMBOL>.csv /
+    # <SYMBOL>.parquet / <SYMBOL>.bin (a KlineStore interval directory) in
+    # data_dir. A <SYMBOL>_book file next to it adds top-of-book snapshots;
+    # parquet wins when several formats exist.
+    files = {}
+    for name in sorted(os.listdir(data_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext not in DATA_EXTENSIONS or stem.endswith('_book'):
+            continue
+        if symbols and stem not in symbols:
+            continue
+        if stem in files and ext != '.parquet':
+            continue
+        book = None
+        for book_ext in ('.parquet', '.csv'):
+            candidate = os.path.join(data_dir, f"{stem}_book{book_ext}")
+            if os.path.exists(candidate):
+                book = candidate
+                break
+        files[stem] = (os.path.join(data_dir, name), book)
+    return files
+
+
+def load_symbol(path, book_path=None):
+    # One symbol's 15m bars, sorted and de-duplicated. Book snapshots carry a
+    # `time` column and each bar gets the last one taken at or before its
+    # close, which is when the live cycle reads the book.
+    frame = _read_table(path, headerless=True)
+    bars = pd.DataFrame({'open_time': _to_ms(frame['open_time'])})
+    for column in KLINE_COLUMNS[1:]:
+        bars[column] = frame[column].to_numpy(dtype=np.float64)
+    for column in BOOK_COLUMNS:
+        if column in frame.columns:
+            bars[column] = frame[column].to_numpy(dtype=np.float64)
+    bars = bars.sort_values('open_time').drop_duplicates('open_time', keep='last').reset_index(drop=True)
+
+    if book_path is not None:
+        book = _read_table(book_path)
+        snapshots = pd.DataFrame({'time': _to_ms(book['time'] if 'time' in book.columns else book['open_time'])})
+        for column in BOOK_COLUMNS:
+            if column in book.columns:
+                snapshots[column] = book[column].to_numpy(dtype=np.float64)
+        bars = bars.drop(columns=[column for column in BOOK_COLUMNS if column in bars.columns])
+        bars['time'] = bars['open_time'] + INTERVAL_MS[INTERVAL] - 1
+        bars = pd.merge_asof(bars, snapshots.sort_values('time'), on='time').drop(columns='time')
+    return bars
+
+
+def rolling_volatility(close, window):
+    # Annualized std of the last `window` log returns at every bar, the
+    # number _calculate_volatility gives for a KLINE_LIMIT-bar window.
+    out = np.zeros(len(close))
+    if len(close) < 2:
+        return out
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.diff(np.log(close))
+    csum = np.concatenate(([0.0], np.cumsum(returns)))
+    csumsq = np.concatenate(([0.0], np.cumsum(returns * returns)))
+
+    end = np.arange(1, len(close))
+    start = np.maximum(end - window, 0)
+    count = end - start
+    mean = (csum[end] - csum[start]) / count
+    variance = np.maximum((csumsq[end] - csumsq[start]) / count - mean * mean, 0.0)
+    out[1:] = np.nan_to_num(np.sqrt(variance) * np.sqrt(365 * 24))
+    return out
+
+
+def prepare_symbol(job):
+    # Runs in a worker process: loads one symbol and computes its per-bar
+    # trend score, volatility and 24h volume over the full history, then
+    # trims to [start, end). Scores use the batch SignalEngine; over a
+    # 500-bar live window the EMA/Wilder seeds have fully decayed, so the
+    # numbers match what the live engine computes at each bar close.
+    symbol, path, book_path, kline_limit, start, end = job
+    bars = load_symbol(path, book_path)
+    close = bars['close'].to_numpy()
+
+    if len(close) >= MIN_BARS:
+        score = trend_score_series(close[None, :], bars['high'].to_numpy()[None, :], bars['low'].to_numpy()[None, :])[0]
+        score[:MIN_BARS - 1] = 0.0
+        score = np.nan_to_num(score)
+    else:
+        score = np.zeros(len(close))
+
+    # Prices, volume and book go back as float32 (see BacktestData); the
+    # indicators above ran on float64.
+    columns = {
+        'open_time': bars['open_time'].to_numpy(),
+        'open': bars['open'].to_numpy(dtype=np.float32),
+        'high': bars['high'].to_numpy(dtype=np.float32),
+        'low': bars['low'].to_numpy(dtype=np.float32),
+        'close': close.astype(np.float32),
+        'volume': bars['volume'].rolling(BARS_PER_DAY, min_periods=1).sum().to_numpy(dtype=np.float32),
+        'score': score,
+        'volatility': rolling_volatility(close, max(kline_limit - 1, 1)),
+    }
+    for column in BOOK_COLUMNS:
+        if column in bars.columns:
+            columns[column] = bars[column].to_numpy(dtype=np.float32)
+
+    keep = np.ones(len(close), dtype=bool)
+    if start is not None:
+        keep &= columns['open_time'] >= start
+    if end is not None:
+        keep &= columns['open_time'] < end
+    return symbol, {name: values[keep] for name, values in columns.items()}
+
+
+class BacktestData:
+    # Each symbol's own bars, never padded onto the union of all open times:
+    # prices, volume and book fields as float32, score and volatility as
+    # float64, plus `slots[row]`, the index of every bar in open_time (the
+    # union). Passes that need a cross-section, like the per-bar universe
+    # ranking, build it one window() at a time. Missing book data falls back
+    # to bid = ask = close with unbounded top-of-book liquidity.
+    PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume') + BOOK_COLUMNS
+
+    def __init__(self, prepared):
+        self.symbols = sorted(symbol for symbol, columns in prepared.items() if len(columns['open_time']))
+        times = [prepared[symbol]['open_time'] for symbol in self.symbols]
+        self.open_time = np.unique(np.concatenate(times)) if times else np.empty(0, dtype=np.int64)
+
+        self.slots = []
+        self.columns = []
+        for symbol in self.symbols:
+            prepared_columns = prepared[symbol]
+            close = prepared_columns['close'].astype(np.float32, copy=False)
+            columns = {'close': close, 'score': prepared_columns['score'], 'volatility': prepared_columns['volatility']}
+            for field in self.PRICE_FIELDS:
+                if field in prepared_columns and field != 'close':
+                    columns[field] = prepared_columns[field].astype(np.float32, copy=False)
+            for side in ('bid', 'ask'):
+                columns[side] = np.where(np.isnan(columns[side]), close, columns[side]) if side in columns else close
+            for qty in ('bid_qty', 'ask_qty'):
+                unbounded = np.full(len(close), np.inf, dtype=np.float32)
+                columns[qty] = np.where(np.isnan(columns[qty]), unbounded, columns[qty]) if qty in columns else unbounded
+            self.columns.append(columns)
+            self.slots.append(np.searchsorted(self.open_time, prepared_columns['open_time']))
+        self.last_bar = np.array([slots[-1] for slots in self.slots], dtype=np.int64)
+
+    def __getitem__(self, row):
+        return self.columns[row]
+
+    def window(self, start, stop, fields):
+        # {field: (symbols x bars) float64} for union bars [start, stop);
+        # bars a symbol has no data for are NaN.
+        view = {field: np.full((len(self.symbols), stop - start), np.nan) for field in fields}
+        for row, slots in enumerate(self.slots):
+            lo, hi = np.searchsorted(slots, (start, stop))
+            if lo == hi:
+                continue
+            local = slots[lo:hi] - start
+            for field in fields:
+                view[field][row, local] = self.columns[row][field][lo:hi]
+        return view
+
+    @staticmethod
+    def market_state_columns(view):
+        # spread and liquidity exactly as MarketSnapshot.select derives them.
+        bid, ask = view['bid'], view['ask']
+        spread = np.where((ask > 0) & (bid > 0), ask - bid, 0.0)
+        with np.errstate(invalid='ignore'):
+            liquidity = bid * view['ask_qty'] + ask * view['bid_qty']
+        return spread, liquidity
+
+
+class Trade:
+    __slots__ = (
+        'symbol', 'side', 'direction', 'qty', 'placed_bar', 'price', 'sl_price', 'tp_price', 'margin',
+        'fill_bar', 'exit_bar', 'exit_price', 'reason', 'fees', 'pnl',
+    )
+
+    def __init__(self, symbol, side, qty, placed_bar, price, sl_price, tp_price, margin):
+        self.symbol = symbol
+        self.side = side
+        self.direction = 1 if side == 'BUY' else -1
+        self.qty = qty
+        self.placed_bar = placed_bar
+        self.price = price
+        self.sl_price = sl_price
+        self.tp_price = tp_price
+        self.margin = margin
+        self.fill_bar = None
+        self.exit_bar = None
+        self.exit_price = None
+        self.reason = None
+        self.fees = 0.0
+        self.pnl = 0.0
+
+    def as_dict(self, open_time):
+        row = {slot: getattr(self, slot) for slot in self.__slots__}
+        for key in ('placed_bar', 'fill_bar', 'exit_bar'):
+            row[key.replace('_bar', '_time')] = int(open_time[row[key]]) if row[key] is not None else None
+        return row
+
+
+def _first_hit(mask_fn, start, stop, chunk=BARS_PER_DAY):
+    # First bar in [start, stop) where mask_fn(slice) is True, scanned in
+    # growing chunks so short trades never touch the rest of the history.
+    while start < stop:
+        end = min(start + chunk, stop)
+        hit = mask_fn(slice(start, end))
+        if hit.any():
+            return start + int(hit.argmax())
+        start = end
+        chunk *= 2
+    return None
+
+
+class Backtester:
+    # Replays local 15m klines (and optional top-of-book snapshots) through
+    # the live rules: universe = top PAIRS_TO_PROCESS by SORTBY at each bar
+    # close, trend score and volatility as the engine computes them, the
+    # StrategyRules risk checks and sizing, then a LIMIT entry with SL/TP
+    # exits. Indicator work is vectorized per symbol in worker processes;
+    # only the portfolio pass (MAX_TRADES, balance, one position per symbol)
+    # walks the bars in order.
+    #
+    # Fill model: an entry placed at the close of bar t rests for
+    # BACKTEST_ENTRY_BARS bars and fills at its limit price once the bar
+    # trades through it. Exits are checked from the bar after the fill; a
+    # bar that touches both SL and TP counts as a stop. Stops fill at the
+    # trigger price or the bar open when it gapped past it. Positions still
+    # open when a symbol's data ends are closed at its last close.
+    # TRADE_FEE_RATE is charged on the notional of every fill. Missing config
+    # keys fall back to the AdminApi defaults.
+    def __init__(self, config=None):
+        self.config = {**(config or {})}
+        self.data = None
+        self.trades = []
+        self.equity = np.empty(0)
+
+    def _setting(self, key, default, cast):
+        value = self.config.get(key)
+        return cast(default if value is None or value == "" else value)
+
+    def _time_bound(self, key):
+        value = self.config.get(key)
+        if value is None or value == "":
+            return None
+        if isinstance(value, (int, float)):
+            return int(value)
+        return int(pd.Timestamp(value, tz='UTC').value // 1_000_000)
+
+    def load(self):
+        data_dir = self._setting("BACKTEST_DATA_DIR", "backtest_data", str)
+        symbols = self.config.get("BACKTEST_SYMBOLS")
+        if isinstance(symbols, str):
+            symbols = [symbol.strip() for symbol in symbols.split(",") if symbol.strip()]
+        files = find_data_files(data_dir, set(symbols) if symbols else None)
+        if not files:
+            raise FileNotFoundError(f"No kline files ({' / '.join(DATA_EXTENSIONS)}) found in {data_dir}")
+
+        kline_limit = self._setting("KLINE_LIMIT", 500, int)
+        start, end = self._time_bound("BACKTEST_START"), self._time_bound("BACKTEST_END")
+        jobs = [(symbol, path, book, kline_limit, start, end) for symbol, (path, book) in files.items()]
+
+        workers = self._setting("BACKTEST_WORKERS", 0, int) or os.cpu_count() or 1
+        started = time.perf_counter()
+        if workers == 1 or len(jobs) == 1:
+            prepared = dict(map(prepare_symbol, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                prepared = dict(pool.map(prepare_symbol, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+        self.data = BacktestData(prepared)
+        logging.info(
+            f"Backtest data: {len(self.data.symbols)} symbols, {len(self.data.open_time)} bars "
+            f"prepared in {time.perf_counter() - started:.2f}s"
+        )
+        return self.data
+
+    def _universe_rank(self, view, spread, liquidity):
+        # Rank of every symbol at every bar of the window by SORTBY, 0 =
+        # best; symbols with no bar at that time are pushed past the end.
+        count = len(self.data.symbols)
+        sortby = self._setting("SORTBY", "volume", str)
+        keys = {'price': view['close'], 'volume': view['volume'], 'spread': spread, 'liquidity': liquidity}[sortby]
+        keys = np.where(np.isnan(view['close']), -np.inf, np.nan_to_num(keys, nan=-np.inf, posinf=np.finfo(np.float64).max))
+        order = np.argsort(-keys, axis=0, kind='stable')
+        rank = np.empty_like(order)
+        np.put_along_axis(rank, order, np.arange(count)[:, None], axis=0)
+        rank[np.isnan(view['close'])] = count
+        return rank
+
+    def _candidates(self, chunk=30 * BARS_PER_DAY):
+        # Every (bar, symbol) the live cycle would try to trade, bar by bar
+        # and best-ranked first, with the values the portfolio pass needs.
+        # The cross-section is built `chunk` bars at a time, so memory
+        # follows the chunk rather than the whole history.
+        data = self.data
+        pairs = self._setting("PAIRS_TO_PROCESS", 10, int)
+        fields = ('close', 'volume', 'score', 'volatility') + BOOK_COLUMNS
+        picked = {key: [] for key in ('bar', 'row') + fields + ('direction', 'liquidity')}
+
+        bars_total = len(data.open_time)
+        for start in range(0, bars_total, chunk):
+            stop = min(start + chunk, bars_total)
+            view = data.window(start, stop, fields)
+            spread, liquidity = data.market_state_columns(view)
+            rank = self._universe_rank(view, spread, liquidity)
+
+            direction = signal_direction(view['score'])
+            candidate = (rank < pairs) & (direction != 0) & ~np.isnan(view['close'])
+            candidate &= volatility_ok(view['volatility']) & spread_ok(spread, view['close'])
+            if stop == bars_total:
+                candidate[:, -1] = False
+
+            bars, rows = np.nonzero(candidate.T)
+            # Within a bar, the live loop walks market_state best-ranked first.
+            order = np.lexsort((rank[rows, bars], bars))
+            bars, rows = bars[order], rows[order]
+            picked['bar'].append(bars + start)
+            picked['row'].append(rows)
+            for field in fields:
+                picked[field].append(view[field][rows, bars])
+            picked['direction'].append(np.broadcast_to(direction, candidate.shape)[rows, bars])
+            picked['liquidity'].append(liquidity[rows, bars])
+
+        return {
+            key: np.concatenate(values) if values else np.empty(0, dtype=np.int64 if key in ('bar', 'row') else np.float64)
+            for key, values in picked.items()
+        }
+
+    def _simulate(self, row, trade, entry_bars):
+        # Works on the symbol's own bars; trade bars are union indices.
+        data = self.data
+        columns, slots = data[row], data.slots[row]
+        high, low, open_ = columns['high'], columns['low'], columns['open']
+        last = int(data.last_bar[row])
+        placed = trade.placed_bar
+        first = int(np.searchsorted(slots, placed)) + 1
+        window_end = int(np.searchsorted(slots, placed + entry_bars, side='right'))
+
+        if trade.direction > 0:
+            fill = _first_hit(lambda s: low[s] <= trade.price, first, window_end)
+        else:
+            fill = _first_hit(lambda s: high[s] >= trade.price, first, window_end)
+        if fill is None:
+            trade.exit_bar = min(placed + entry_bars, last)
+            trade.reason = 'unfilled'
+            return trade
+        trade.fill_bar = int(slots[fill])
+
+        sl, tp = trade.sl_price, trade.tp_price
+        if trade.direction > 0:
+            exit_at = _first_hit(lambda s: (low[s] <= sl) | (high[s] >= tp), fill + 1, len(slots))
+        else:
+            exit_at = _first_hit(lambda s: (high[s] >= sl) | (low[s] <= tp), fill + 1, len(slots))
+
+        if exit_at is None:
+            trade.exit_bar, trade.exit_price, trade.reason = last, float(columns['close'][-1]), 'end'
+        elif (low[exit_at] <= sl) if trade.direction > 0 else (high[exit_at] >= sl):
+            gap = open_[exit_at] < sl if trade.direction > 0 else open_[exit_at] > sl
+            trade.exit_bar, trade.reason = int(slots[exit_at]), 'stop_loss'
+            trade.exit_price = float(open_[exit_at] if gap else sl)
+        else:
+            gap = open_[exit_at] > tp if trade.direction > 0 else open_[exit_at] < tp
+            trade.exit_bar, trade.reason = int(slots[exit_at]), 'take_profit'
+            trade.exit_price = float(open_[exit_at] if gap else tp)
+
+        fee_rate = self._setting("TRADE_FEE_RATE", 0.0018, float)
+        trade.fees = fee_rate * trade.qty * (trade.price + trade.exit_price)
+        trade.pnl = trade.direction * trade.qty * (trade.exit_price - trade.price) - trade.fees
+        return trade
+
+    def run(self):
+        started = time.perf_counter()
+        if self.data is None:
+            self.load()
+        data = self.data
+
+        balance = self._setting("BACKTEST_BALANCE", 1000.0, float)
+        max_trades = self._setting("MAX_TRADES", 8, int)
+        leverage = max(self._setting("LEVERAGE", 40, int), 1)
+        entry_bars = max(self._setting("BACKTEST_ENTRY_BARS", 1, int), 1)
+        spread_adjustment = self._setting("SPREAD_ADJUSTMENT", 0.0075, float)
+        sl, tp = self._setting("SL", 0.2, float), self._setting("TP", 0.5, float)
+        dynamic = self._setting("DYNAMIC_POSITION_SIZING", True, bool)
+        risk_reward = self._setting("RISK_REWARD_RATIO", 2.0, float)
+        portfolio_risk = self._setting("MAX_PORTFOLIO_RISK", 1.0, float)
+
+        candidates = self._candidates()
+        cand_bars = candidates['bar']
+
+        self.trades = []
+        self.equity = np.full(len(data.open_time), balance)
+        active = {}
+        # row -> index of the symbol's next bar to mark an open position at.
+        marks = {}
+        releases = []
+        margin_used = 0.0
+        rejected = 0
+        pointer = 0
+
+        for bar in range(len(data.open_time)):
+            while releases and releases[0][0] <= bar:
+                _, _, row, trade = heapq.heappop(releases)
+                balance += trade.pnl
+                margin_used -= trade.margin
+                del active[row]
+                marks.pop(row, None)
+
+            equity = balance
+            for row, cursor in marks.items():
+                trade, slots = active[row], data.slots[row]
+                if trade.fill_bar > bar:
+                    continue
+                while cursor < len(slots) and slots[cursor] < bar:
+                    cursor += 1
+                marks[row] = cursor
+                if cursor < len(slots) and slots[cursor] == bar:
+                    equity += trade.direction * trade.qty * (float(data[row]['close'][cursor]) - trade.price)
+            self.equity[bar] = equity
+
+            while pointer < len(cand_bars) and cand_bars[pointer] == bar:
+                index = pointer
+                row = int(candidates['row'][index])
+                pointer += 1
+                if row in active or len(active) >= max_trades:
+                    continue
+
+                side = 'BUY' if candidates['direction'][index] > 0 else 'SELL'
+                price = float(candidates['close'][index])
+                if dynamic:
+                    qty = position_size(
+                        equity - margin_used, price, float(candidates['volatility'][index]),
+                        float(candidates['liquidity'][index]), float(candidates['score'][index]),
+                        risk_reward, portfolio_risk,
+                    )
+                else:
+                    qty = FIXED_POSITION_SIZE
+
+                limit = entry_price(side, float(candidates['bid'][index]), float(candidates['ask'][index]), spread_adjustment)
+                margin = qty * limit / leverage
+                if qty <= 0 or qty * limit < DEFAULT_MIN_NOTIONAL or margin > equity - margin_used:
+                    rejected += 1
+                    continue
+
+                sl_price, tp_price = bracket_prices(side, limit, sl, tp)
+                trade = Trade(data.symbols[row], side, qty, bar, limit, sl_price, tp_price, margin)
+                self._simulate(row, trade, entry_bars)
+                self.trades.append(trade)
+                active[row] = trade
+                if trade.fill_bar is not None:
+                    marks[row] = int(np.searchsorted(data.slots[row], trade.fill_bar))
+                margin_used += margin
+                heapq.heappush(releases, (trade.exit_bar, len(self.trades), row, trade))
+
+        report = self.report(balance, rejected)
+        report['elapsed'] = time.perf_counter() - started
+        logging.info(
+            f"Backtest done in {report['elapsed']:.1f}s: {report['trades']} trades, "
+            f"PnL {report['pnl']:.2f} ({report['return_pct']:.2f}%), max drawdown {report['max_drawdown_pct']:.2f}%"
+        )
+        return report
+
+    def report(self, final_balance, rejected=0):
+        initial = self._setting("BACKTEST_BALANCE", 1000.0, float)
+        filled = [trade for trade in self.trades if trade.fill_bar is not None]
+        pnl = np.array([trade.pnl for trade in filled])
+        wins, losses = pnl[pnl > 0], pnl[pnl <= 0]
+
+        peak = np.maximum.accumulate(self.equity) if len(self.equity) else np.empty(0)
+        drawdown = float(np.max((peak - self.equity) / peak)) if len(peak) else 0.0
+        exits = {}
+        for trade in filled:
+            exits[trade.reason] = exits.get(trade.reason, 0) + 1
+
+        open_time = self.data.open_time
+        return {
+            'symbols': len(self.data.symbols),
+            'bars': len(open_time),
+            'start': int(open_time[0]) if len(open_time) else None,
+            'end': int(open_time[-1]) if len(open_time) else None,
+            'initial_balance': initial,
+            'final_balance': final_balance,
+            'pnl': final_balance - initial,
+            'return_pct': (final_balance / initial - 1) * 100 if initial else 0.0,
+            'max_drawdown_pct': drawdown * 100,
+            'orders': len(self.trades),
+            'unfilled': len(self.trades) - len(filled),
+            'rejected': rejected,
+            'trades': len(filled),
+            'long_trades': sum(1 for trade in filled if trade.direction > 0),
+            'short_trades': sum(1 for trade in filled if trade.direction < 0),
+            'win_rate': len(wins) / len(pnl) if len(pnl) else 0.0,
+            'avg_win': float(wins.mean()) if len(wins) else 0.0,
+            'avg_loss': float(losses.mean()) if len(losses) else 0.0,
+            'profit_factor': float(wins.sum() / -losses.sum()) if losses.sum() < 0 else None,
+            'fees': float(sum(trade.fees for trade in filled)),
+            'avg_bars_held': float(np.mean([trade.exit_bar - trade.fill_bar for trade in filled])) if filled else 0.0,
+            'exits': exits,
+        }
+
+    def trades_frame(self):
+        return pd.DataFrame([trade.as_dict(self.data.open_time) for trade in self.trades])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Replay local 15m klines through the engine's strategy rules")
+    parser.add_argument("--data-dir", required=True, help="directory of <SYMBOL>.csv / .parquet / .bin klines")
+    parser.add_argument("--config", help="JSON file with engine config keys (SL, TP, LEVERAGE, ...)")
+    parser.add_argument("--start", help="first bar, e.g. 2024-01-01")
+    parser.add_argument("--end", help="end bar (exclusive)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (0 = one per CPU)")
+    parser.add_argument("--trades-csv", help="write every order and its outcome to this file")
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    config["BACKTEST_DATA_DIR"] = args.data_dir
+    config["BACKTEST_WORKERS"] = args.workers
+    if args.start:
+        config["BACKTEST_START"] = args.start
+    if args.end:
+        config["BACKTEST_END"] = args.end
+
+    backtester = Backtester(config)
+    print(json.dumps(backtester.run(), indent=2))
+    if args.trades_csv:
+        backtester.trades_frame().to_csv(args.trades_csv, index=False)
+
+#to run:
+#python Backtester.py --data-dir backtest_data --config config.json --start 2024-01-01 --trades-csv trades.csv
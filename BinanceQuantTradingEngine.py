@@ -1,49 +1,140 @@
-import os
 from dotenv import load_dotenv
-from binance.um_futures import UMFutures
 from binance.error import ClientError
+import contextvars
+import itertools
 import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sklearn.linear_model import LinearRegression
-import talib
-import pandas as pd
 import numpy as np
 import logging
+from KlineCache import INTERVAL_MS
+from MarketData import MarketData, credential_envs, credentials, exchange_client
+from MarketSnapshot import PairMetrics
+from SignalEngine import trend_scores_by_symbol
+from IndicatorState import TrendState
+from OrderExecutor import OrderExecutor
+from Scheduler import EngineScheduler
+from Metrics import REST_CALLS, timed
+from StrategyRules import (
+    FIXED_POSITION_SIZE, bracket_prices, entry_price, position_size, signal_direction, spread_ok, volatility_ok,
+)
+from Backtester import Backtester
+from PaperExchange import PaperExchange
+from ShardedEngine import ShardCoordinator, weight_share
+from UserDataStream import UserDataStream
+from EventHub import EventHub
+from LogPipeline import CYCLE, STAGE, configure_logging, pipeline_status
 
 
 load_dotenv()
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('LogsBinanceQuantTradingEngine.log'),
-        logging.StreamHandler()
-    ]
-)
+# Process-wide, so the cycle ids of engines sharing a log file never clash.
+CYCLE_IDS = itertools.count(1)
 
 
 class BinanceQuantTradingEngine:
-    def __init__(self, config=None):        
+    def __init__(self, config=None, role="standalone", market=None):
         # Merge provided config with defaults
         self.config = {**(config or {})}
-
-        self.api_key = os.getenv('BINANCE_API_KEY')
-        self.secret_key = os.getenv('BINANCE_SECRET_KEY')  # Fixed: was 'BINANCE_SECRET'
-        self.client = UMFutures(key=self.api_key, secret=self.secret_key)
-
+        # "standalone" does everything in-process. With SHARDS > 1 it becomes
+        # a coordinator that hands metric computation to "shard" engines
+        # running in worker processes (see ShardedEngine).
+        SHARDS = int(self.config.get("SHARDS", 1))
+        if role == "standalone" and SHARDS > 1 and market is None:
+            role = "coordinator"
+        self.role = role
+        # JSON lines to LOG_FILE through a background writer (see LogPipeline).
+        # Hosted engines log through the pipeline their EngineHost set up.
+        if market is None:
+            configure_logging(self.config, role=self.role)
+
+        self.api_key, self.secret_key = credentials(self.config)
         if not self.api_key or not self.secret_key:
             logging.error("Missing required API credentials in environment variables")
-            logging.error("Please set BINANCE_API_KEY and BINANCE_SECRET_KEY in your .env file")
+            key_env, secret_env = credential_envs(self.config)
+            logging.error(f"Please set {key_env} and {secret_env} in your .env file")
+
+        # Market data (REST client, symbol filters, klines, feeds) comes from
+        # `market`: the engine's own, or one an EngineHost shares between
+        # engines. Every REST call takes its weight from market.limiter
+        # (orders first); IP_WEIGHT_LIMIT is the exchange-side budget the
+        # used-weight headers are checked against. A coordinator keeps only
+        # its share of the weight; its shard processes spend the rest.
+        self.owns_market = market is None
+        if market is None:
+            market = MarketData(
+                self.config, role=self.role,
+                weight_per_minute=weight_share(self.config, SHARDS) if self.role == "coordinator" else None,
+            )
+        self.market = market
+        self.weight_limiter = self.market.limiter
+        self.client = self.market.client
+        self.symbol_registry = self.market.symbol_registry
+        self.kline_cache = self.market.kline_cache
+        self.market_feed = self.market.market_feed
+        self.order_books = self.market.order_books
+        self.market_snapshot = self.market.market_snapshot
+        # A hosted engine trades with its own credentials, through the
+        # host's shared weight budget.
+        self.account_client = self.client
+        if not self.owns_market:
+            self.account_client = exchange_client(
+                self.config, self.weight_limiter, pool_size=int(self.config.get("ORDER_WORKERS", 4)) + 2,
+            )
+
+        # Orders and account reads go through `execution`; market data always
+        # comes from the live client. DRY_RUN swaps in the local simulator.
+        self.execution = self.account_client
+        if bool(self.config.get("DRY_RUN")):
+            self.execution = PaperExchange(
+                self._best_quote,
+                balance=float(self.config.get("PAPER_BALANCE", 1000.0)),
+                fee_rate=float(self.config.get("TRADE_FEE_RATE", 0.0)),
+                asset=str(self.config.get("QUOTE_ASSET", "USDT")),
+            )
+            self.execution.start_matching(float(self.config.get("PAPER_MATCH_INTERVAL", 1.0)))
+        self.order_executor = OrderExecutor(self.execution, self.symbol_registry, int(self.config.get("ORDER_WORKERS", 4)))
+        self.shards = ShardCoordinator(self.config, SHARDS) if self.role == "coordinator" else None
+
+        # ACCOUNT_DATA_MODE = "stream" serves positions, open orders and
+        # balances from the user-data stream instead of polling them. The
+        # paper exchange is already local, and shards never trade.
+        self.account_stream = None
+        if (str(self.config.get("ACCOUNT_DATA_MODE", "rest")) == "stream"
+                and self.role != "shard" and self.execution is self.account_client):
+            self.account_stream = UserDataStream(
+                self.account_client,
+                stream_url=str(self.config.get("STREAM_URL", "wss://fstream.binance.com")),
+                reconcile_interval=int(self.config.get("ACCOUNT_RECONCILE_INTERVAL", 300)),
+                quote_of=self._quote_asset,
+            )
+            self.account_stream.start()
+            self.order_executor.follow(self.account_stream.ledger, self.account_stream.ready)
 
         self.market_state = {}
         self.portfolio = {}
         self.risk_model = LinearRegression()
-        self.market_metrics = pd.DataFrame()
+        self.market_metrics = {}
+        self.fetch_latency = {}
+        self.trend_scores = {}
+        self.indicators = {}
         self.run_count = 0          
         self.running = False
+        self.stage_timings = {}
+        self.last_cycle = {}
+        self.scheduler = EngineScheduler(self)
+        self._cycle_lock = threading.Lock()
+        self.last_backtest = {}
+        self._backtest_thread = None
+        # Readers (AdminApi) get the last published status and a push feed
+        # of metrics, trades and status instead of calling into the engine.
+        self.events = EventHub()
+        self.status_snapshot = {}
 
     def get_balance(self):
         try:
-            response = self.client.balance(recvWindow=6000)
+            response = self.execution.balance(recvWindow=6000)
             return response or []
         except ClientError as error:
             logging.error(
@@ -52,63 +143,30 @@ class BinanceQuantTradingEngine:
                 )
             )
 
+    @timed()
     def refresh_data(self):
         try:
-            all_24hr_tickers = self.client.ticker_24hr_price_change()
-            all_book_tickers = self.client.book_ticker()
-
-            ticker_24hr_map = {item['symbol']: item for item in all_24hr_tickers}
-            book_ticker_map = {item['symbol']: item for item in all_book_tickers}
-
-            self.market_state = {}
-
-            for symbol, book_data in book_ticker_map.items():
-                ticker_data = ticker_24hr_map.get(symbol)
-                if not ticker_data:
-                    continue
-
-                ask = float(book_data.get('askPrice', 0))
-                bid = float(book_data.get('bidPrice', 0))
-                ask_qty = float(book_data.get('askQty', 0))
-                bid_qty = float(book_data.get('bidQty', 0))
-
-                spread = ask - bid if ask > 0 and bid > 0 else 0
-                liquidity = (bid * ask_qty) + (ask * bid_qty)
-
-                price = float(ticker_data.get('lastPrice', 0))
-                volume = float(ticker_data.get('volume', 0))
-
-                self.market_state[symbol] = {
-                    'price': price,
-                    'volume': volume,
-                    'spread': spread,
-                    'liquidity': liquidity
-                }
+            with self._stage("market_snapshot"):
+                snapshot = self.market.snapshot()
 
             SORTBY = str(self.config.get("SORTBY"))
             PAIRS_TO_PROCESS = int(self.config.get("PAIRS_TO_PROCESS"))
-
-            top_symbols = sorted(
-                self.market_state.items(),
-                key=lambda x: x[1][SORTBY],
-                reverse=True
-            )[:PAIRS_TO_PROCESS]
-
-            usdt_tickers = {}
-            for symbol, data in top_symbols:
-                if 'USDT' in symbol:
-                    usdt_tickers[symbol] = data
-
-            self.market_state = usdt_tickers
-
-            self.portfolio = {
-                item['asset']: {
-                    'free': float(item['availableBalance']),
-                    'locked': float(item['balance']) - float(item['availableBalance']),
-                } for item in self.get_balance()
-            }
+            QUOTE_ASSET = str(self.config.get("QUOTE_ASSET", "USDT"))
+            self.market_state = snapshot.select(SORTBY, PAIRS_TO_PROCESS, QUOTE_ASSET)
+
+            with self._stage("balances"):
+                if self._account_stream_ready():
+                    self.portfolio = self.account_stream.ledger.portfolio()
+                else:
+                    self.portfolio = {
+                        item['asset']: {
+                            'free': float(item['availableBalance']),
+                            'locked': float(item['balance']) - float(item['availableBalance']),
+                        } for item in self.get_balance()
+                    }
 
             self._calculate_market_metrics()
+            self.events.publish("metrics", self._metrics_payload())
             logging.info("Data refresh complete")
             return True
 
@@ -116,24 +174,148 @@ class BinanceQuantTradingEngine:
             logging.error(f"Data refresh failed: {str(e)}")
             return False
 
+    def _best_quote(self, symbol):
+        # (best bid, best ask) from the local book when one is synced, else
+        # from the streamed or last polled market snapshot.
+        book = self.order_books.get(symbol) if self.order_books is not None else None
+        if book is not None:
+            return book.best_bid(), book.best_ask()
+        if self.market_feed is not None and self.market_feed.is_live():
+            row = self.market_feed.market.row(symbol)
+        else:
+            row = self.market_snapshot.row(symbol)
+        if row is None:
+            return None, None
+        return row['bid'], row['ask']
+
+    def _quote_asset(self, symbol):
+        return self.market.quote_asset(symbol)
+
+    @timed()
     def _calculate_market_metrics(self):
-        metrics = []
         logging.info("Calculating market metrics...")
+        if self.shards is not None:
+            with self._stage("sharded_metrics"):
+                metrics, self.trend_scores, self.fetch_latency = self.shards.compute(self.market_state)
+            self.market_metrics = {row.pair: row for row in metrics}
+            return
+
+        self.market.track(id(self), self.market_state)
+        self.indicators = {symbol: state for symbol, state in self.indicators.items() if symbol in self.market_state}
+        self.trend_scores = {}
+        with self._stage("market_data_fetch"):
+            fetched = self._fetch_market_data(list(self.market_state))
+
+        with self._stage("indicators"):
+            self._build_metrics(fetched)
+
+    def _build_metrics(self, fetched):
+        metrics = {}
         for symbol, data in self.market_state.items():
-            order_book = self.client.depth(symbol)
+            if symbol not in fetched:
+                continue
+
+            book = fetched[symbol]['book']
+            if book is not None:
+                best_bid = book.best_bid() or data['price']
+                imbalance = book.imbalance(5)
+            else:
+                order_book = fetched[symbol]['order_book']
+                best_bid = float(order_book['bids'][0][0]) if order_book['bids'] else data['price']
+                imbalance = self._calculate_imbalance(order_book)
+
+            trend_strength, volatility = self._update_indicators(symbol, fetched[symbol]['klines'])
+            self.trend_scores[symbol] = trend_strength
+
+            metrics[symbol] = PairMetrics(
+                pair=symbol,
+                mid_price=(data['price'] + best_bid) / 2,
+                order_book_imbalance=imbalance,
+                volatility=volatility,
+                volume_profile=data['volume'],
+            )
+
+        self.market_metrics = metrics
+
+    def _fetch_market_data(self, symbols):
+        FETCH_WORKERS = int(self.config.get("FETCH_WORKERS", 8))
+        results = {}
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max(1, FETCH_WORKERS)) as pool:
+            # Each task runs in a copy of this context, so its records carry
+            # the cycle id and stage.
+            futures = {
+                pool.submit(contextvars.copy_context().run, self._fetch_symbol_data, symbol): symbol
+                for symbol in symbols
+            }
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    results[symbol] = future.result()
+                except Exception as e:
+                    logging.error(f"Market data fetch failed for {symbol}: {str(e)}", extra={'symbol': symbol})
+
+        self.fetch_latency = {symbol: result['latency'] for symbol, result in results.items()}
+        if self.fetch_latency:
+            slowest = max(self.fetch_latency, key=self.fetch_latency.get)
+            elapsed = time.perf_counter() - started
+            logging.info(
+                f"Fetched {len(results)}/{len(symbols)} symbols in {elapsed:.2f}s "
+                f"(median {np.median(list(self.fetch_latency.values())):.3f}s, "
+                f"slowest {slowest} {self.fetch_latency[slowest]:.3f}s)",
+                extra={'latency': elapsed},
+            )
+        return results
 
-            best_bid = float(order_book['bids'][0][0]) if order_book['bids'] else data['price']
-            best_ask = float(order_book['asks'][0][0]) if order_book['asks'] else data['price']
+    def _fetch_symbol_data(self, symbol):
+        DEPTH_LIMIT = int(self.config.get("DEPTH_LIMIT", 5))
+        started = time.perf_counter()
 
-            metrics.append({
-                'pair': symbol,
-                'mid_price': (data['price'] + best_bid) / 2,
-                'order_book_imbalance': self._calculate_imbalance(order_book),
-                'volatility': self._calculate_volatility(symbol),
-                'volume_profile': data['volume']
-            })
+        book = self.order_books.get(symbol) if self.order_books is not None else None
+        order_book = None
+        if book is None:
+            order_book = self.market.depth(symbol, DEPTH_LIMIT)
 
-        self.market_metrics = pd.DataFrame(metrics)
+        try:
+            klines = self.market.klines(symbol, "15m")
+        except Exception as e:
+            logging.error(f"Historical data error: {str(e)}", extra={'symbol': symbol})
+            klines = self.kline_cache.get(symbol, "15m")
+
+        return {
+            'book': book,
+            'order_book': order_book,
+            'klines': klines,
+            'latency': time.perf_counter() - started,
+        }
+
+    def _update_indicators(self, symbol, bars, interval="15m"):
+        # Commits the closed bars the symbol's TrendState has not seen yet and
+        # previews the still-forming last bar. A gap or a reset cache reseeds
+        # the state from the cached history.
+        if bars is None or len(bars) < 2:
+            return 0.0, self._calculate_volatility(symbol, bars)
+
+        closed, forming = bars[:-1], bars[-1]
+        state = self.indicators.get(symbol)
+        new_bars = closed[:0]
+        if state is not None:
+            new_bars = closed[closed['open_time'] > state.last_open_time]
+            expected_open = state.last_open_time + INTERVAL_MS[interval]
+            if len(new_bars) and int(new_bars['open_time'][0]) != expected_open:
+                state = None
+            elif not len(new_bars) and int(closed['open_time'][-1]) != state.last_open_time:
+                state = None
+
+        if state is None:
+            state = TrendState.from_history(closed, self.kline_cache.limit)
+            new_bars = closed[:0]
+        for bar in new_bars:
+            state.update(int(bar['open_time']), float(bar['high']), float(bar['low']), float(bar['close']))
+        self.indicators[symbol] = state
+
+        return state.preview(float(forming['high']), float(forming['low']), float(forming['close']))
 
     def _calculate_imbalance(self, order_book):
         try:
@@ -143,12 +325,13 @@ class BinanceQuantTradingEngine:
         except (IndexError, ZeroDivisionError):
             return 0.0
 
-    def _calculate_volatility(self, symbol):
-        ohlc = self.get_historical_data(symbol, "15m")
-        if not ohlc:
+    def _calculate_volatility(self, symbol, ohlc=None):
+        if ohlc is None:
+            ohlc = self.kline_cache.get(symbol, "15m")
+        if ohlc is None or not len(ohlc):
             return 0.0
 
-        closes = [item[4] for item in ohlc if item[4] > 0]
+        closes = ohlc['close'][ohlc['close'] > 0]
         if len(closes) < 2:
             return 0.0
 
@@ -159,9 +342,9 @@ class BinanceQuantTradingEngine:
             logging.error(f"Volatility calculation error: {str(e)}")
             return 0.0
 
-    def get_historical_data(self, symbol,interval="15m"):
+    def get_historical_data(self, symbol, interval="15m", limit=500):
         try:
-            raw_klines = self.client.klines(symbol=symbol, interval=interval)
+            raw_klines = self.client.klines(symbol=symbol, interval=interval, limit=limit)
             return [(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in raw_klines]
         except Exception as e:
             logging.error(f"Historical data error: {str(e)}")
@@ -169,266 +352,388 @@ class BinanceQuantTradingEngine:
 
     def execute_strategy(self):
         logging.info("Executing strategy cycle...")
-        for pair in self.market_state:
-            current_price = self.market_state[pair]['price']
-
-            if not self._risk_approval(pair):
+        positions = self.get_pos()
+        if positions is not None:
+            self.config["TOTAL_TRADES_OPEN"] = len(positions)
+
+        pairs = list(self.market_state)
+        approved, direction, sizes = self._evaluate_pairs(pairs)
+        for i, pair in enumerate(pairs):
+            if not approved[i]:
                 continue
-
-            trend_strength = self._analyze_trend(pair)
-            volatility = self.market_metrics[self.market_metrics['pair'] == pair]['volatility'].values[0]
-            liquidity = self.market_state[pair]['liquidity']
-
-            position_size = self._calculate_position_size(pair, volatility, liquidity, trend_strength)
-
-            if trend_strength > 0.6:
-                self._execute_trade(pair, 'BUY', current_price, position_size)
-            elif trend_strength < -0.6:
-                self._execute_trade(pair, 'SELL', current_price, position_size)
+            if direction[i] > 0:
+                self._execute_trade(pair, 'BUY', self.market_state[pair]['price'], float(sizes[i]))
+            elif direction[i] < 0:
+                self._execute_trade(pair, 'SELL', self.market_state[pair]['price'], float(sizes[i]))
             else:
-                logging.info(f"No clear signal for {pair}")
+                logging.info(f"No clear signal for {pair}", extra={'symbol': pair, 'sample': True})
 
-    def _analyze_trend(self, pair):
-        data = self.get_historical_data(pair, "15m")
-        if not data or len(data) < 50:
-            return 0.0
-
-        df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        if df['close'].min() <= 0:
-            return 0.0
+        with self._stage("order_drain"):
+            self.order_executor.drain()
 
-        df['returns'] = np.log(df['close']).diff().fillna(0)
-        df['SMA20'] = talib.SMA(df['close'], 20)
-        df['SMA50'] = talib.SMA(df['close'], 50)
-        df['RSI'] = talib.RSI(df['close'], 14)
-        df['MACD'], df['MACD_Signal'], _ = talib.MACD(df['close'])
-        df['ADX'] = talib.ADX(df['high'], df['low'], df['close'], 14)
-        df.dropna(inplace=True)
-        if len(df) < 20:
-            return 0.0
-
-        score = pd.Series(0, index=df.index)
-        score += np.where(df['SMA20'] > df['SMA50'], 1, -1)
-        score += np.where(df['close'] > df['SMA20'], 1, -1)
-        score += np.where(df['MACD'] > df['MACD_Signal'], 1, -1)
-        score += np.where(df['RSI'] > 55, 1, 0)
-        score += np.where(df['RSI'] < 45, -1, 0)
-
-        adx_trend_direction = np.sign(df['SMA20'] - df['SMA50'])
-        score += np.where(df['ADX'] > 25, adx_trend_direction, 0)
+    @timed()
+    def _analyze_trend(self, pair):
+        if pair in self.trend_scores:
+            return self.trend_scores[pair]
+
+        data = self.kline_cache.get(pair, "15m")
+        if data is None:
+            try:
+                data = self.kline_cache.update(pair, "15m")
+            except Exception as e:
+                logging.error(f"Historical data error: {str(e)}")
+                return 0.0
+        return trend_scores_by_symbol({pair: data}).get(pair, 0.0)
+
+    def _evaluate_pairs(self, pairs):
+        # Risk checks, signal direction and position size for the whole
+        # universe in one pass: (approved mask, direction, sizes). Trend
+        # scores are only looked up for pairs that pass the risk checks.
+        count = len(pairs)
+        metrics = [self.market_metrics.get(pair) for pair in pairs]
+        state = [self.market_state[pair] for pair in pairs]
+        has_metrics = np.array([row is not None for row in metrics], dtype=bool)
+        volatility = np.array([row.volatility if row is not None else np.nan for row in metrics], dtype=np.float64)
+        price = np.array([data['price'] for data in state], dtype=np.float64)
+        spread = np.array([data['spread'] for data in state], dtype=np.float64)
+        liquidity = np.array([data['liquidity'] for data in state], dtype=np.float64)
+
+        calm = volatility_ok(volatility).reshape(count)
+        tight = spread_ok(spread, price).reshape(count)
+        approved = has_metrics & calm & tight
+        for i in np.flatnonzero(~approved):
+            if not has_metrics[i]:
+                logging.error(f"Risk check error: no metrics for {pairs[i]}", extra={'symbol': pairs[i]})
+            elif not calm[i]:
+                logging.warning(
+                    f"High volatility blocking: {pairs[i]} volatility: {volatility[i]}",
+                    extra={'symbol': pairs[i], 'sample': True},
+                )
+            else:
+                logging.warning(f"Wide spread blocking: {pairs[i]}", extra={'symbol': pairs[i], 'sample': True})
 
-        normalized_trend = np.clip(score / 5.0, -1, 1)
-        return normalized_trend.iloc[-1]
+        trend = np.zeros(count)
+        for i in np.flatnonzero(approved):
+            trend[i] = self._analyze_trend(pairs[i])
+        direction = signal_direction(trend).reshape(count)
 
-    def _calculate_position_size(self, pair, volatility, liquidity, trend_strength):
         if not bool(self.config.get("DYNAMIC_POSITION_SIZING")):
-            return 0.1
+            return approved, direction, np.full(count, FIXED_POSITION_SIZE)
 
-        balance = self.portfolio.get('USDT', {}).get('free', 0)
-        print(f"Balance for {pair}: {balance}")
-        if balance <= 0:
+        QUOTE_ASSET = str(self.config.get("QUOTE_ASSET", "USDT"))
+        balance = self.portfolio.get(QUOTE_ASSET, {}).get('free', 0)
+        logging.debug(f"Balance for position sizing: {balance}")
+        if balance <= 0 and (approved & (direction != 0)).any():
             logging.warning("Insufficient balance for position sizing")
-            return 0.0
-
-        win_prob = max(0.55, abs(trend_strength))
-        kelly_fraction = (win_prob * (self.config['RISK_REWARD_RATIO'] + 1) - 1) / self.config['RISK_REWARD_RATIO']
-        risk_capital = balance * self.config['MAX_PORTFOLIO_RISK'] * kelly_fraction
-
-        liquidity_factor = min(liquidity / (risk_capital * 2), 1) if risk_capital != 0 else 0
-        volatility_factor = 1 / (1 + volatility) if volatility != 0 else 1
-
-        return risk_capital * liquidity_factor * volatility_factor / self.market_state[pair]['price']
-
-    def _risk_approval(self, pair):
-        try:
-            if self.market_metrics[self.market_metrics['pair'] == pair]['volatility'].values[0] > 1.3:
-                logging.warning(f"High volatility blocking: {pair} volatility: {self.market_metrics[self.market_metrics['pair'] == pair]['volatility'].values[0]}")
-                return False
-
-            if self.market_state[pair]['spread'] / self.market_state[pair]['price'] > 0.1:
-                logging.warning(f"Wide spread blocking: {pair}")
-                return False
-
-            return True
-        except Exception as e:
-            logging.error(f"Risk check error: {str(e)}")
-            return False
+        sizes = position_size(
+            balance, price, volatility, liquidity, trend,
+            self.config['RISK_REWARD_RATIO'], self.config['MAX_PORTFOLIO_RISK'],
+        )
+        return approved, direction, np.broadcast_to(sizes, (count,))
 
+    @timed()
     def _execute_trade(self, pair, side, price, quantity):
         try:
-            if quantity < 1:
-                logging.warning(f"Insufficient quantity for {pair}")
-                return
-
             SPREAD_ADJUSTMENT = float(self.config.get("SPREAD_ADJUSTMENT"))
             LEVERAGE = int(self.config.get("LEVERAGE"))
             TYPE = str(self.config.get("TYPE"))
             SL = float(self.config.get("SL"))
             TP = float(self.config.get("TP"))
 
+            max_leverage = self.symbol_registry.get_max_leverage(pair)
+            if max_leverage and LEVERAGE > max_leverage:
+                LEVERAGE = max_leverage
 
-
-            qty_precision = self.get_qty_precision(pair)
-            price_precision = self.get_price_precision(pair)
-
-            order_book = self.client.depth(pair)
-            best_bid = float(order_book['bids'][0][0]) if order_book['bids'] else price
-            best_ask = float(order_book['asks'][0][0]) if order_book['asks'] else price
-
-            if side.lower() == 'buy':
-                price = best_bid * (1 - SPREAD_ADJUSTMENT)
+            book = self.order_books.get(pair) if self.order_books is not None else None
+            if book is not None:
+                best_bid = book.best_bid() or price
+                best_ask = book.best_ask() or price
             else:
-                price = best_ask * (1 + SPREAD_ADJUSTMENT)
+                order_book = self.client.depth(pair, limit=5)
+                best_bid = float(order_book['bids'][0][0]) if order_book['bids'] else price
+                best_ask = float(order_book['asks'][0][0]) if order_book['asks'] else price
+
+            price = entry_price(side, best_bid, best_ask, SPREAD_ADJUSTMENT)
+
+            qty = self.symbol_registry.round_qty(pair, quantity)
+            p_price = self.symbol_registry.round_price(pair, price)
+            logging.debug(
+                f"Trade parameters for {pair}: leverage {LEVERAGE}, type {TYPE}, sl {SL}, tp {TP}, "
+                f"spread adjustment {SPREAD_ADJUSTMENT}, price {p_price}, qty {qty}",
+                extra={'symbol': pair},
+            )
+            if qty <= 0 or qty < self.symbol_registry.get_min_qty(pair):
+                logging.warning(f"Insufficient quantity for {pair}", extra={'symbol': pair, 'sample': True})
+                return
 
-            qty = round(quantity, qty_precision)
-            p_price = round(price, price_precision)
-            print(f"""\n\nleverage: {LEVERAGE}, type: {TYPE}, sl: {SL}, tp: {TP} SPREAD_ADJUSTMENT: {SPREAD_ADJUSTMENT} pair: {pair}, price: {p_price}, qty: {qty} \n\n""")
-            if qty * p_price < 5:
-                logging.warning(f"Order size too small for {pair}")
+            if not self.symbol_registry.meets_min_notional(pair, qty, p_price):
+                logging.warning(f"Order size too small for {pair}", extra={'symbol': pair, 'sample': True})
                 return
 
             if self.config["TOTAL_TRADES_OPEN"] >= self.config["MAX_TRADES"]:
-                logging.warning("Max trades open limit reached")
+                logging.warning("Max trades open limit reached", extra={'symbol': pair, 'sample': True})
                 return
 
-            self.set_leverage(pair, LEVERAGE)
-            self.set_mode(pair, TYPE)
-
-            resp1 = self.client.new_order(symbol=pair, side=side, type='LIMIT', quantity=qty,   timeInForce='GTC', price=p_price)
-            logging.info(f"Order placed: {side} {qty} {pair} @ {p_price}")
-            #sleep 
-            time.sleep(2)
+            self.config["TOTAL_TRADES_OPEN"] += 1
 
-            self.config["TOTAL_TRADES_OPEN"] = len(self.get_pos()) or self.config["TOTAL_TRADES_OPEN"] + 1
+            sl_price, tp_price = bracket_prices(side, price, SL, TP)
+            sl_price = self.symbol_registry.round_price(pair, sl_price)
+            tp_price = self.symbol_registry.round_price(pair, tp_price)
 
-            sl_price = round(price - price * SL, price_precision)
-            resp2 = self.client.new_order(symbol=pair, side='SELL', type='STOP_MARKET',     quantity=qty, stopPrice=sl_price)
-            #sleep
-            time.sleep(2)
-            
-            # Take profit order
-            tp_price = round(price + price * TP, price_precision)
-            resp3 = self.client.new_order(symbol=pair, side='SELL', type='TAKE_PROFIT_MARKET',  quantity=qty, stopPrice=tp_price)
-
-            logging.info(resp1)
-            logging.info(resp2)
-            logging.info(resp3)
+            self.order_executor.submit_bracket(
+                pair, side, qty, p_price, sl_price, tp_price, LEVERAGE, TYPE,
+                on_done=self._on_bracket_done, on_exits=self._on_exits,
+            )
         except ClientError as error:
             logging.error(
                 "Found error. status: {}, error code: {}, error message: {}".format(
                     error.status_code, error.error_code, error.error_message
-                )
+                ),
+                extra={'symbol': pair},
             )
 
+    def _on_bracket_done(self, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            logging.error(f"Bracket placement failed: {str(e)}")
+            result = {'entry': None}
+        if result['entry'] is None:
+            self.config["TOTAL_TRADES_OPEN"] = max(self.config["TOTAL_TRADES_OPEN"] - 1, 0)
+        self.events.publish("trade", {
+            'symbol': result.get('symbol'),
+            'side': result.get('side'),
+            'placed': result['entry'] is not None,
+            'order_id': (result['entry'] or {}).get('orderId'),
+            'latency': result.get('latency'),
+        })
+
+    def _on_exits(self, result):
+        # Runs once per entry fill. A fill that could not be protected was
+        # closed at market; with nothing else of the entry open the trade
+        # slot is free again.
+        if not result['open']:
+            self.config["TOTAL_TRADES_OPEN"] = max(self.config["TOTAL_TRADES_OPEN"] - 1, 0)
+        self.events.publish("exits", {
+            'symbol': result['symbol'],
+            'order_id': result['entry_id'],
+            'qty': result['qty'],
+            'protected': result['protected'],
+            'flattened': result['flattened'],
+        })
+
+    def _account_stream_ready(self):
+        return self.account_stream is not None and self.account_stream.ready()
+
     def get_pos(self):
+        if self._account_stream_ready():
+            return self.account_stream.ledger.position_symbols()
         try:
-            resp = self.client.get_position_risk()
+            resp = self.execution.get_position_risk()
             pos = []
             for elem in resp:
                 if float(elem['positionAmt']) != 0:
                     pos.append(elem['symbol'])
             return pos
         except ClientError as error:
-            logging.info(
-                "Found error. status: {}, error code: {}, error message: {}".format(
+            logging.error(
+                "Position check failed. status: {}, error code: {}, error message: {}".format(
                     error.status_code, error.error_code, error.error_message
                 )
             )
-            print("error in get_pos")
+
     def check_orders(self):
+        if self._account_stream_ready():
+            return self.account_stream.ledger.order_symbols()
         try:
-            response = self.client.get_orders(recvWindow=6000)
+            response = self.execution.get_orders(recvWindow=6000)
             sym = []
             for elem in response:
                 sym.append(elem['symbol'])
             return sym
         except ClientError as error:
-            print(
+            logging.error(
                 "Found error. status: {}, error code: {}, error message: {}".format(
                     error.status_code, error.error_code, error.error_message
                 )
             )
+
     # Close open orders for the needed symbol. If one stop order is executed and another one is still there
     def close_open_orders(self, symbol):
         try:
-            response = self.client.cancel_open_orders(symbol=symbol, recvWindow=6000)
-            print(response)
+            response = self.execution.cancel_open_orders(symbol=symbol, recvWindow=6000)
+            logging.info(f"Open orders cancelled: {response}", extra={'symbol': symbol})
         except ClientError as error:
-            print(
+            logging.error(
                 "Found error. status: {}, error code: {}, error message: {}".format(
                     error.status_code, error.error_code, error.error_message
-                )
+                ),
+                extra={'symbol': symbol},
             )
-    
+
         # Set leverage for the needed symbol. You need this bcz different symbols can have different leverage
-    def set_leverage(self,symbol, level):
-        try:
-            response = self.client.change_leverage(
-                symbol=symbol, leverage=level, recvWindow=6000
-            )
-            print(response)
-        except ClientError as error:
-            logging.warning(
-                "Found error. status: {}, error code: {}, error message: {}".format(
-                    error.status_code, error.error_code, error.error_message
-                )
-            )
-    
+    def set_leverage(self, symbol, level):
+        return self.order_executor.ensure_leverage(symbol, level)
+
     # The same for the margin type
-    def set_mode(self,symbol, type):
-        try:
-            response = self.client.change_margin_type(
-                symbol=symbol, marginType=type, recvWindow=6000
-            )
-            
-        except ClientError as error:
-            logging.warning(
-                "Found error. status: {}, error code: {}, error message: {}".format(
-                    error.status_code, error.error_code, error.error_message
-                )
-            )
-  
-    def get_price_precision(self, symbol):
-        try:
-            resp = self.client.exchange_info()['symbols']
-            for elem in resp:
-                if elem['symbol'] == symbol:
-                    return elem['pricePrecision']
-        except ClientError as error:
-            logging.warning(
-                "Found error. status: {}, error code: {}, error message: {}".format(
-                    error.status_code, error.error_code, error.error_message
-                )
-            )
+    def set_mode(self, symbol, type):
+        return self.order_executor.ensure_margin_type(symbol, type)
 
+    def get_price_precision(self, symbol):
+        return self.symbol_registry.get_price_precision(symbol)
 
     def get_qty_precision(self, symbol):
+        return self.symbol_registry.get_qty_precision(symbol)
+
+    @contextmanager
+    def _stage(self, name):
+        started = time.perf_counter()
+        token = STAGE.set(name)
         try:
-            resp = self.client.exchange_info()['symbols']
-            for elem in resp:
-                if elem['symbol'] == symbol:
-                    return elem['quantityPrecision']
-        except ClientError as error:
-            logging.warning(
-                "Found error. status: {}, error code: {},error  message: {}".format(
-                    error.status_code, error.error_code,error.  error_message
-                )
+            yield
+        finally:
+            self.stage_timings[name] = time.perf_counter() - started
+            STAGE.reset(token)
+            logging.debug(f"Stage {name} done", extra={'stage': name, 'latency': self.stage_timings[name]})
+
+    @contextmanager
+    def cycle_slot(self):
+        # Holds the cycle lock around manual work (/refresh, /run_strategy
+        # jobs); yields False, holding nothing, while a cycle is running.
+        acquired = self._cycle_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._cycle_lock.release()
+
+    @timed()
+    def run_cycle(self):
+        # Manual (/refresh, /run_strategy, /start) and scheduled cycles share
+        # this lock, so a cycle never starts while another is still running.
+        if not self._cycle_lock.acquire(blocking=False):
+            logging.warning("Cycle already in progress, skipping")
+            return None
+        cycle_token = CYCLE.set(next(CYCLE_IDS))
+        try:
+            self.stage_timings = {}
+            started_at = time.time()
+            calls_before = REST_CALLS.total()
+            with self._stage("refresh_data"):
+                refreshed = self.refresh_data()
+            if refreshed:
+                with self._stage("execute_strategy"):
+                    self.execute_strategy()
+            self.run_count += 1
+            self.last_cycle = {
+                'cycle_id': CYCLE.get(),
+                'started_at': started_at,
+                'duration': time.time() - started_at,
+                'refreshed': refreshed,
+                'timings': dict(self.stage_timings),
+                'rest_calls': REST_CALLS.total() - calls_before,
+                'used_weight': self.client.used_weight,
+            }
+            logging.info(
+                "Cycle {} done in {:.2f}s: {}".format(
+                    self.run_count,
+                    self.last_cycle['duration'],
+                    ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in self.stage_timings.items()),
+                ),
+                extra={'latency': self.last_cycle['duration'], 'timings': self.last_cycle['timings']},
             )
+            self.publish_status()
+            return self.last_cycle
+        finally:
+            CYCLE.reset(cycle_token)
+            self._cycle_lock.release()
+
+    def _metrics_payload(self):
+        # NaN / inf become None so the payload stays valid JSON.
+        def clean(value):
+            return float(value) if value is not None and np.isfinite(value) else None
+
+        return {
+            'market_metrics': {
+                pair: {key: value if key == 'pair' else clean(value) for key, value in row.as_dict().items()}
+                for pair, row in self.market_metrics.items()
+            },
+            'trend_scores': {pair: clean(score) for pair, score in self.trend_scores.items()},
+        }
+
+    def publish_status(self):
+        # Rebuilds status_snapshot (one position and one open-order read,
+        # served by the user-data ledger when it is live) and pushes it as
+        # a "status" event. Readers only ever see a complete snapshot.
+        snapshot = {
+            'published_at': time.time(),
+            'run_count': self.run_count,
+            'total_trades_open': self.config.get("TOTAL_TRADES_OPEN", 0),
+            'positions': self.get_pos() or [],
+            'orders': self.check_orders() or [],
+            'portfolio': dict(self.portfolio),
+            'last_cycle': self.last_cycle,
+            'last_backtest': self.last_backtest,
+            'paper': self.execution.status() if isinstance(self.execution, PaperExchange) else None,
+            'account_stream': self.account_stream.status() if self.account_stream is not None else None,
+            'logging': pipeline_status(),
+            **self._metrics_payload(),
+        }
+        self.status_snapshot = snapshot
+        self.events.publish("status", snapshot)
+        return snapshot
+
+    def run_backtest(self):
+        # SIMULATION_MODE: replays local klines (BACKTEST_DATA_DIR) through the
+        # same signal, risk and sizing rules instead of trading live.
+        self.last_backtest = Backtester(self.config).run()
+        self.events.publish("backtest", self.last_backtest)
+        return self.last_backtest
+
+    def _run_backtest_thread(self):
+        try:
+            self.run_backtest()
+        except Exception as e:
+            logging.error(f"Backtest failed: {str(e)}")
+        finally:
+            self.running = False
 
-    
     def start(self):
+        if bool(self.config.get("SIMULATION_MODE")):
+            if self._backtest_thread is not None and self._backtest_thread.is_alive():
+                return False
+            self.running = True
+            self._backtest_thread = threading.Thread(target=self._run_backtest_thread, name="backtest", daemon=True)
+            self._backtest_thread.start()
+            return True
         self.running = True
+        return self.scheduler.start()
 
     def stop(self):
         self.running = False
+        self.scheduler.stop()
+
+    def close(self):
+        self.stop()
+        self.order_executor.shutdown()
+        if self.owns_market:
+            self.market.close()
+        else:
+            self.market.release(id(self))
+        if self.shards is not None:
+            self.shards.stop()
+        if self.account_stream is not None:
+            self.account_stream.stop()
+        if isinstance(self.execution, PaperExchange):
+            self.execution.stop_matching()
 
     def run(self):
         logging.info("Binance Quant Trading Engine Started")
 
         try:
-                self.refresh_data()
-                self.execute_strategy()
-                self.run_count += 1 
+            if bool(self.config.get("SIMULATION_MODE")):
+                return self.run_backtest()
+            return self.run_cycle()
         except KeyboardInterrupt:
             logging.info("Engine stopped by user")
             self.running = False
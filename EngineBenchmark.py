@@ -0,0 +1,352 @@
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from unittest import mock
+
+import numpy as np
+
+import MarketData
+from BinanceQuantTradingEngine import BinanceQuantTradingEngine
+from KlineCache import INTERVAL_MS
+from SignalBenchmark import synthetic_bars
+
+
+# Times the engine's cycle stages against recorded (or synthetic) REST
+# responses replayed through a stand-in UMFutures, at several universe
+# sizes, and compares wall time, CPU time, peak traced memory and REST call
+# counts with a stored baseline. Orders go to the DRY_RUN paper exchange.
+# Timings and memory are only compared with a baseline taken on the same
+# host (CPU, core count, Python); REST call counts are compared anywhere.
+
+BASELINE_PATH = "engine_benchmark_baseline.json"
+BAR_MS = INTERVAL_MS['15m']
+
+BENCH_CONFIG = {
+    "DRY_RUN": True,
+    "PAPER_BALANCE": 1000.0,
+    "RISK_REWARD_RATIO": 2.0,
+    "MAX_PORTFOLIO_RISK": 1.0,
+    "TRADE_FEE_RATE": 0.0018,
+    "SPREAD_ADJUSTMENT": 0.0075,
+    "DYNAMIC_POSITION_SIZING": True,
+    "LEVERAGE": 40,
+    "TYPE": "CROSSED",
+    "TP": 0.50,
+    "SL": 0.20,
+    "SORTBY": "volume",
+    "QUOTE_ASSET": "USDT",
+    "TOTAL_TRADES_OPEN": 0,
+    "MAX_TRADES": 8,
+    "FETCH_WORKERS": 8,
+    "REQUEST_WEIGHT_PER_MINUTE": 10 ** 9,
+    "DEPTH_LIMIT": 5,
+    "KLINE_LIMIT": 500,
+    "KLINE_STORE_DIR": "",
+    "MARKET_DATA_MODE": "rest",
+    "ACCOUNT_DATA_MODE": "rest",
+    "ORDER_WORKERS": 4,
+    "SHARDS": 1,
+}
+
+
+def synthetic_fixtures(symbols=500, bars=500, seed=0):
+    # Same payload shapes as the recorded fixtures, for machines without
+    # a recording. Prices follow SignalBenchmark's random walks.
+    close, high, low = synthetic_bars(symbols, bars, seed)
+    rng = np.random.default_rng(seed + 1)
+    volume = rng.lognormal(10, 2, (symbols, bars))
+    names = [f"S{i:03d}USDT" for i in range(symbols)]
+    open_times = np.arange(bars, dtype=np.int64) * BAR_MS
+
+    fixtures = {'source': f"synthetic:{symbols}x{bars}:seed{seed}", 'exchange_info': {'symbols': []},
+                'ticker_24hr': [], 'book_ticker': [], 'depth': {}, 'klines': {}}
+    for i, symbol in enumerate(names):
+        last = float(close[i, -1])
+        tick = 10.0 ** (np.floor(np.log10(last)) - 4)
+        spread = last * rng.uniform(0.0001, 0.002)
+        bid, ask = last - spread / 2, last + spread / 2
+        fixtures['exchange_info']['symbols'].append({
+            'symbol': symbol, 'quoteAsset': 'USDT', 'status': 'TRADING',
+            'pricePrecision': 6, 'quantityPrecision': 3,
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'tickSize': f"{tick:.10f}"},
+                {'filterType': 'LOT_SIZE', 'stepSize': '0.001', 'minQty': '0.001', 'maxQty': '1000000'},
+                {'filterType': 'MIN_NOTIONAL', 'notional': '5'},
+            ],
+        })
+        fixtures['ticker_24hr'].append({
+            'symbol': symbol, 'lastPrice': str(last), 'volume': str(float(volume[i, -96:].sum())),
+        })
+        fixtures['book_ticker'].append({
+            'symbol': symbol, 'bidPrice': str(bid), 'askPrice': str(ask),
+            'bidQty': str(rng.uniform(1, 500)), 'askQty': str(rng.uniform(1, 500)),
+        })
+        fixtures['depth'][symbol] = {
+            'bids': [[str(bid - level * spread), str(rng.uniform(1, 500))] for level in range(5)],
+            'asks': [[str(ask + level * spread), str(rng.uniform(1, 500))] for level in range(5)],
+        }
+        opens = np.r_[close[i, 0], close[i, :-1]]
+        fixtures['klines'][symbol] = [
+            [int(open_times[j]), str(opens[j]), str(high[i, j]), str(low[i, j]), str(close[i, j]),
+             str(volume[i, j]), int(open_times[j] + BAR_MS - 1)]
+            for j in range(bars)
+        ]
+    return fixtures
+
+
+def record_fixtures(path, symbols=500, bars=500):
+    # Public endpoints only, paced by the engine's own limiter.
+    from binance.um_futures import UMFutures
+    from Metrics import ExchangeClient
+    from RateLimiter import WeightLimiter
+
+    client = ExchangeClient(UMFutures(), limiter=WeightLimiter(1200))
+    tickers = client.ticker_24hr_price_change()
+    usdt = sorted((t for t in tickers if t['symbol'].endswith('USDT')), key=lambda t: -float(t['quoteVolume']))
+    chosen = [t['symbol'] for t in usdt[:symbols]]
+    fixtures = {
+        'source': f"recorded:{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}",
+        'exchange_info': client.exchange_info(),
+        'ticker_24hr': tickers,
+        'book_ticker': client.book_ticker(),
+        'depth': {symbol: client.depth(symbol, limit=5) for symbol in chosen},
+        'klines': {symbol: client.klines(symbol=symbol, interval='15m', limit=bars) for symbol in chosen},
+    }
+    with gzip.open(path, 'wt') as f:
+        json.dump(fixtures, f)
+    print(f"Recorded {len(chosen)} symbols to {path}")
+
+
+def load_fixtures(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        return json.load(f)
+
+
+class ReplayUMFutures:
+    # Serves fixture payloads for the UMFutures calls a cycle makes and
+    # counts them. Kline open times are shifted so the last recorded bar is
+    # the current one, which makes warm cycles take the same incremental
+    # path as live ones. Symbols without recorded depth or klines get an
+    # empty book and no bars.
+    def __init__(self, fixtures, **kwargs):
+        self.fixtures = fixtures
+        self.calls = Counter()
+        now_bar = int(time.time() * 1000) // BAR_MS * BAR_MS
+        self.klines_by_symbol = {}
+        for symbol, rows in fixtures['klines'].items():
+            if not rows:
+                continue
+            shift = now_bar - int(rows[-1][0])
+            self.klines_by_symbol[symbol] = [[int(row[0]) + shift] + list(row[1:]) for row in rows]
+
+    def exchange_info(self):
+        self.calls['exchange_info'] += 1
+        return self.fixtures['exchange_info']
+
+    def leverage_brackets(self, **kwargs):
+        self.calls['leverage_brackets'] += 1
+        return []
+
+    def ticker_24hr_price_change(self, symbol=None, **kwargs):
+        self.calls['ticker_24hr_price_change'] += 1
+        return self.fixtures['ticker_24hr']
+
+    def book_ticker(self, symbol=None, **kwargs):
+        self.calls['book_ticker'] += 1
+        return self.fixtures['book_ticker']
+
+    def depth(self, symbol, limit=5, **kwargs):
+        self.calls['depth'] += 1
+        book = self.fixtures['depth'].get(symbol, {'bids': [], 'asks': []})
+        return {'bids': book['bids'][:limit], 'asks': book['asks'][:limit]}
+
+    def klines(self, symbol, interval, limit=500, startTime=None, **kwargs):
+        self.calls['klines'] += 1
+        rows = self.klines_by_symbol.get(symbol, [])
+        if startTime is not None:
+            rows = [row for row in rows[-limit:] if row[0] >= startTime]
+        return rows[-limit:]
+
+
+def build_engine(fixtures, size):
+    replay = ReplayUMFutures(fixtures)
+    config = {**BENCH_CONFIG, "PAIRS_TO_PROCESS": size}
+    with mock.patch.object(MarketData, "UMFutures", lambda **kwargs: replay):
+        engine = BinanceQuantTradingEngine(config)
+    return engine, replay
+
+
+def _clear_trend_scores(engine):
+    engine.trend_scores = {}
+    return engine
+
+
+def _analyze_universe(engine):
+    for pair in engine.market_state:
+        engine._analyze_trend(pair)
+
+
+# name -> (prepare engine, stage under test). Every measurement gets a new
+# engine, so "cold" really starts from an empty kline cache.
+STAGES = {
+    'refresh_data_cold': (lambda engine: engine, lambda engine: engine.refresh_data()),
+    'refresh_data_warm': (lambda engine: engine.refresh_data() and engine, lambda engine: engine.refresh_data()),
+    'calculate_market_metrics': (
+        lambda engine: engine.refresh_data() and engine, lambda engine: engine._calculate_market_metrics(),
+    ),
+    'analyze_trend': (lambda engine: engine.refresh_data() and _clear_trend_scores(engine), _analyze_universe),
+    'evaluate_pairs': (
+        lambda engine: engine.refresh_data() and engine, lambda engine: engine._evaluate_pairs(list(engine.market_state)),
+    ),
+    'execute_strategy': (lambda engine: engine.refresh_data() and engine, lambda engine: engine.execute_strategy()),
+    'run_cycle_warm': (lambda engine: engine.refresh_data() and engine, lambda engine: engine.run_cycle()),
+}
+
+
+def measure(fixtures, size, prepare, stage, repeat=3):
+    # Best-of-`repeat` wall and CPU time, then one extra run under
+    # tracemalloc for peak memory (kept apart so tracing does not skew the
+    # timings). CPU time is process-wide, so it includes fetch threads.
+    result = {'wall': float('inf'), 'cpu': float('inf')}
+    for run in range(repeat + 1):
+        engine, replay = build_engine(fixtures, size)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                if not prepare(engine):
+                    raise RuntimeError("stage setup failed")
+                calls_before = sum(replay.calls.values())
+                if run == repeat:
+                    tracemalloc.start()
+                    stage(engine)
+                    result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                    tracemalloc.stop()
+                    continue
+                wall, cpu = time.perf_counter(), time.process_time()
+                stage(engine)
+                result['wall'] = min(result['wall'], time.perf_counter() - wall)
+                result['cpu'] = min(result['cpu'], time.process_time() - cpu)
+                result['calls'] = sum(replay.calls.values()) - calls_before
+        finally:
+            engine.close()
+    return result
+
+
+# Differences below these are noise for millisecond stages, whatever the ratio.
+NOISE_FLOOR = {'wall': 0.01, 'cpu': 0.01, 'peak_mb': 1.0}
+
+
+def host_info():
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    return {'cpu': cpu, 'cores': os.cpu_count(), 'python': platform.python_version(), 'system': platform.system()}
+
+
+def compare(results, baseline, tolerance, timings=True):
+    # Regressions: slower / larger than baseline by more than `tolerance`
+    # (and the noise floor), or any extra REST call. timings=False checks
+    # call counts only.
+    regressions = []
+    for size, stages in results.items():
+        for name, current in stages.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            for key in ('wall', 'cpu', 'peak_mb') if timings else ():
+                grew = current[key] - previous[key]
+                if grew > NOISE_FLOOR[key] and current[key] > previous[key] * (1 + tolerance):
+                    regressions.append(f"{size} symbols {name} {key}: {previous[key]:.4f} -> {current[key]:.4f}")
+            if current['calls'] > previous['calls']:
+                regressions.append(f"{size} symbols {name} calls: {previous['calls']} -> {current['calls']}")
+    return regressions
+
+
+def benchmark(fixtures, sizes, stages, repeat, baseline=None):
+    print(f"{'symbols':>8} {'stage':<26} {'wall':>10} {'cpu':>10} {'peak':>9} {'calls':>6} {'vs base':>8}")
+    results = {}
+    for size in sizes:
+        results[str(size)] = {}
+        for name in stages:
+            prepare, stage = STAGES[name]
+            current = measure(fixtures, size, prepare, stage, repeat)
+            results[str(size)][name] = current
+            previous = (baseline or {}).get(str(size), {}).get(name)
+            ratio = f"{current['wall'] / previous['wall']:>7.2f}x" if previous and previous['wall'] > 0 else ""
+            print(
+                f"{size:>8} {name:<26} {current['wall'] * 1000:>8.1f}ms {current['cpu'] * 1000:>8.1f}ms "
+                f"{current['peak_mb']:>7.1f}MB {current['calls']:>6} {ratio:>8}"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Engine cycle benchmark on replayed REST fixtures")
+    parser.add_argument("--fixtures", help="recorded fixture file (.json or .json.gz); synthetic data if omitted")
+    parser.add_argument("--record", metavar="PATH", help="record live public-endpoint fixtures to PATH and exit")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 150, 500])
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record, max(args.sizes))
+        sys.exit(0)
+
+    # The replay ignores credentials; keep the engine's per-instance
+    # warnings out of the table.
+    os.environ.setdefault("BINANCE_API_KEY", "benchmark")
+    os.environ.setdefault("BINANCE_SECRET_KEY", "benchmark")
+    logging.disable(logging.WARNING)
+    # One synthetic universe for every size list, so baselines stay comparable.
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else synthetic_fixtures(max(500, *args.sizes))
+
+    baseline = None
+    host = host_info()
+    same_host = False
+    try:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored.get('source') == fixtures['source']:
+            baseline = stored['results']
+            same_host = stored.get('host') == host
+            if not same_host:
+                print(f"Baseline was taken on {stored.get('host')}, not {host}; comparing REST calls only")
+        else:
+            print(f"Baseline was taken on {stored.get('source')}, not {fixtures['source']}; not comparing")
+    except FileNotFoundError:
+        pass
+
+    results = benchmark(fixtures, args.sizes, args.stages, args.repeat, baseline if same_host else None)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'source': fixtures['source'], 'host': host, 'results': results}, f, indent=1, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+    elif baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, timings=same_host)
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+#to run:
+#python EngineBenchmark.py --sizes 10 50 150 500
+#python EngineBenchmark.py --record fixtures.json.gz && python EngineBenchmark.py --fixtures fixtures.json.gz
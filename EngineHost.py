@@ -0,0 +1,111 @@
+import logging
+import re
+import threading
+
+from BinanceQuantTradingEngine import BinanceQuantTradingEngine
+from LogPipeline import configure_logging
+from MarketData import MarketData
+
+
+# Instance ids appear in API paths.
+ENGINE_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Suffix of the credential env vars (see MarketData.credential_envs).
+CREDENTIAL_PROFILE = re.compile(r'^[A-Za-z0-9_]{1,32}$')
+# Strategy, risk and scheduling keys an engine may override. Everything
+# else (credential env names, file paths, logging, market data and the
+# weight budget) belongs to the host.
+ENGINE_KEYS = {
+    "DRY_RUN", "PAPER_BALANCE", "PAPER_MATCH_INTERVAL",
+    "RISK_REWARD_RATIO", "MAX_PORTFOLIO_RISK", "TRADE_FEE_RATE", "PRICE_UPDATE_THRESHOLD", "SPREAD_ADJUSTMENT",
+    "DYNAMIC_POSITION_SIZING", "LEVERAGE", "TYPE", "TP", "SL", "PAIRS_TO_PROCESS", "SORTBY", "QUOTE_ASSET",
+    "MAX_TRADES", "ORDER_WORKERS", "CYCLE_INTERVAL", "ALIGN_TO_BAR_CLOSE", "BAR_CLOSE_DELAY", "OVERLAP_POLICY",
+    "ACCOUNT_DATA_MODE", "ACCOUNT_RECONCILE_INTERVAL", "SHARDS", "CREDENTIAL_PROFILE",
+}
+
+
+class EngineHost:
+    # Runs several engines (accounts or parameter sets) in one process. Each
+    # engine has its own config (ENGINE_KEYS), credentials (CREDENTIAL_PROFILE),
+    # paper or live account, risk state and scheduler; all of them read one
+    # MarketData built from the host config, so tickers, depth and klines
+    # are fetched once per MARKET_DATA_TTL however many engines cycle, and
+    # every REST call shares one per-IP weight budget. An engine configured
+    # with SHARDS > 1 keeps its own market data, since its shard processes
+    # fetch for themselves; it splits the whole REQUEST_WEIGHT_PER_MINUTE
+    # with them, so it can only be hosted alone. Logging is process-wide and
+    # set up once from the host config.
+    def __init__(self, config):
+        configure_logging(config)
+        self.config = config
+        self.market = None
+        self.engines = {}
+        self._lock = threading.Lock()
+
+    def _shared_market(self):
+        if self.market is None:
+            self.market = MarketData(self.config, ttl=float(self.config.get("MARKET_DATA_TTL", 30)))
+        return self.market
+
+    def add(self, engine_id, overrides=None):
+        if not ENGINE_ID.match(engine_id):
+            raise ValueError(f"Invalid engine id '{engine_id}'")
+        with self._lock:
+            if engine_id in self.engines:
+                raise KeyError(f"Engine '{engine_id}' already exists")
+            host_keys = sorted(key for key in (overrides or {}) if key not in ENGINE_KEYS)
+            if host_keys:
+                raise ValueError(f"Config keys {host_keys} are set for the whole host and cannot be overridden per engine")
+            profile = (overrides or {}).get("CREDENTIAL_PROFILE")
+            if profile and not CREDENTIAL_PROFILE.match(str(profile)):
+                raise ValueError(f"Invalid credential profile '{profile}'")
+            config = {**self.config, **(overrides or {}), "TOTAL_TRADES_OPEN": 0}
+            sharded = [eid for eid, hosted in self.engines.items() if hosted.role == "coordinator"]
+            if sharded or (self.engines and int(config.get("SHARDS", 1)) > 1):
+                raise ValueError(
+                    f"Engine '{sharded[0] if sharded else engine_id}' uses SHARDS > 1 and needs the "
+                    "whole request weight budget; it cannot share the process with other engines"
+                )
+            if int(config.get("SHARDS", 1)) > 1:
+                engine = BinanceQuantTradingEngine(config)
+            else:
+                engine = BinanceQuantTradingEngine(config, market=self._shared_market())
+            self.engines[engine_id] = engine
+        logging.info(f"Engine '{engine_id}' added ({len(self.engines)} hosted)")
+        return engine
+
+    def remove(self, engine_id):
+        with self._lock:
+            engine = self.engines.pop(engine_id)
+        engine.close()
+        logging.info(f"Engine '{engine_id}' removed ({len(self.engines)} hosted)")
+
+    def get(self, engine_id):
+        with self._lock:
+            return self.engines.get(engine_id)
+
+    def ids(self):
+        with self._lock:
+            return list(self.engines)
+
+    def close(self):
+        with self._lock:
+            engines, self.engines = list(self.engines.values()), {}
+        for engine in engines:
+            engine.close()
+        if self.market is not None:
+            self.market.close()
+
+    def status(self):
+        with self._lock:
+            engines = dict(self.engines)
+        return {
+            'market': self.market.status() if self.market is not None else None,
+            'engines': {
+                engine_id: {
+                    'running': engine.running,
+                    'run_count': engine.run_count,
+                    'dry_run': bool(engine.config.get("DRY_RUN")),
+                    'total_trades_open': engine.config.get("TOTAL_TRADES_OPEN", 0),
+                } for engine_id, engine in engines.items()
+            },
+        }
@@ -0,0 +1,51 @@
+import asyncio
+import itertools
+import threading
+import time
+
+
+class EventHub:
+    # Fans engine events out to API subscribers (the /events stream). The
+    # engine publishes from its own threads; every subscriber is an
+    # asyncio.Queue on the API's event loop, fed through
+    # call_soon_threadsafe, so publishing never blocks a cycle. A subscriber
+    # that falls `maxsize` events behind loses its oldest ones.
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.published = 0
+        self._ids = itertools.count(1)
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        # Call from the event loop that will read the queue.
+        queue = asyncio.Queue(self.maxsize)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    @staticmethod
+    def _put(queue, event):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def publish(self, kind, payload):
+        event = {'id': next(self._ids), 'kind': kind, 'time': time.time(), 'data': payload}
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+            self.published += 1
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # Loop already closed; the subscriber is gone.
+                self.unsubscribe(queue)
+
+    def status(self):
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'published': self.published}
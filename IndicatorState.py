@@ -0,0 +1,225 @@
+import math
+from collections import deque
+
+import numpy as np
+
+from SignalEngine import (
+    ADX_PERIOD, MACD_FAST, MACD_SIGNAL, MACD_SLOW, MIN_BARS, RSI_PERIOD, SMA_FAST, SMA_SLOW,
+)
+
+
+ANNUALIZATION = np.sqrt(365 * 24)
+
+# The recursions mirror SignalEngine exactly: seeds are np.mean/np.sum over
+# the same values, and each step is `gain * x + decay * prev`, which is the
+# order scipy's lfilter evaluates, so seeding from history reproduces the
+# batch numbers.
+MACD_FAST_K = 2.0 / (MACD_FAST + 1)
+MACD_SLOW_K = 2.0 / (MACD_SLOW + 1)
+MACD_SIGNAL_K = 2.0 / (MACD_SIGNAL + 1)
+MACD_START = MACD_SLOW - 1
+SIGNAL_START = MACD_START + MACD_SIGNAL - 1
+RSI_DECAY = (RSI_PERIOD - 1) / RSI_PERIOD
+RSI_WEIGHT = 1.0 / RSI_PERIOD
+ADX_SMOOTH_DECAY = 1.0 - 1.0 / ADX_PERIOD
+ADX_DECAY = (ADX_PERIOD - 1) / ADX_PERIOD
+ADX_WEIGHT = 1.0 / ADX_PERIOD
+ADX_START = 2 * ADX_PERIOD - 1
+
+# Running sums are re-added from their window this often to stop drift.
+RESUM_EVERY = 1000
+
+
+def _ratio_or_zero(numerator, denominator):
+    return 0.0 if abs(denominator) < 1e-8 else numerator / denominator
+
+
+class TrendState:
+    # Per-symbol indicator state updated one closed bar at a time. The bar
+    # still forming at the end of the kline window is never committed;
+    # preview() evaluates the score and volatility as if it were the next
+    # bar, which is what the batch calculation over the full window does.
+    def __init__(self, volatility_window=500):
+        self.count = 0
+        self.last_open_time = None
+        self.prev_high = self.prev_low = self.prev_close = self.prev_log_close = None
+
+        self.fast_window = deque(maxlen=SMA_FAST)
+        self.slow_window = deque(maxlen=SMA_SLOW)
+        self.fast_sum = 0.0
+        self.slow_sum = 0.0
+
+        self.gains = []
+        self.losses = []
+        self.avg_gain = self.avg_loss = None
+
+        self.seed_closes = []
+        self.ema_fast = self.ema_slow = None
+        self.macd_values = []
+        self.macd_signal = None
+
+        self.plus_dms, self.minus_dms, self.true_ranges = [], [], []
+        self.smooth_plus = self.smooth_minus = self.smooth_tr = None
+        self.dx_values = []
+        self.adx = None
+
+        # Returns of committed bars; the forming bar contributes the last one.
+        self.returns = deque(maxlen=max(volatility_window - 2, 1))
+        self.return_sum = 0.0
+        self.return_sumsq = 0.0
+        self.valid = True
+
+    @classmethod
+    def from_history(cls, bars, volatility_window=500):
+        state = cls(volatility_window)
+        for bar in bars:
+            state.update(int(bar['open_time']), float(bar['high']), float(bar['low']), float(bar['close']))
+        return state
+
+    def _directional_moves(self, high, low, close):
+        diff_plus = high - self.prev_high
+        diff_minus = self.prev_low - low
+        minus_dm = diff_minus if diff_minus > 0 and diff_plus < diff_minus else 0.0
+        plus_dm = diff_plus if diff_plus > 0 and diff_plus > diff_minus else 0.0
+        true_range = max(high - low, max(abs(high - self.prev_close), abs(low - self.prev_close)))
+        return plus_dm, minus_dm, true_range
+
+    def _dx(self, smooth_plus, smooth_minus, smooth_tr):
+        if abs(smooth_tr) < 1e-8:
+            return 0.0
+        plus_di = 100.0 * smooth_plus / smooth_tr
+        minus_di = 100.0 * smooth_minus / smooth_tr
+        return _ratio_or_zero(100.0 * abs(minus_di - plus_di), plus_di + minus_di)
+
+    def update(self, open_time, high, low, close):
+        if close <= 0:
+            self.valid = False
+        index = self.count
+        log_close = math.log(close) if close > 0 else float('nan')
+
+        if len(self.fast_window) == SMA_FAST:
+            self.fast_sum -= self.fast_window[0]
+        if len(self.slow_window) == SMA_SLOW:
+            self.slow_sum -= self.slow_window[0]
+        self.fast_window.append(close)
+        self.slow_window.append(close)
+        self.fast_sum += close
+        self.slow_sum += close
+        if index % RESUM_EVERY == 0:
+            self.fast_sum = math.fsum(self.fast_window)
+            self.slow_sum = math.fsum(self.slow_window)
+
+        if index >= 1:
+            delta = close - self.prev_close
+            gain, loss = (delta if delta > 0 else 0.0), (-delta if delta < 0 else 0.0)
+            if self.avg_gain is None:
+                self.gains.append(gain)
+                self.losses.append(loss)
+                if index == RSI_PERIOD:
+                    self.avg_gain = np.mean(np.array(self.gains))
+                    self.avg_loss = np.mean(np.array(self.losses))
+            else:
+                self.avg_gain = RSI_WEIGHT * gain + RSI_DECAY * self.avg_gain
+                self.avg_loss = RSI_WEIGHT * loss + RSI_DECAY * self.avg_loss
+
+            plus_dm, minus_dm, true_range = self._directional_moves(high, low, close)
+            if self.smooth_tr is None:
+                self.plus_dms.append(plus_dm)
+                self.minus_dms.append(minus_dm)
+                self.true_ranges.append(true_range)
+                if index == ADX_PERIOD - 1:
+                    self.smooth_plus = np.sum(np.array(self.plus_dms))
+                    self.smooth_minus = np.sum(np.array(self.minus_dms))
+                    self.smooth_tr = np.sum(np.array(self.true_ranges))
+            else:
+                self.smooth_plus = 1.0 * plus_dm + ADX_SMOOTH_DECAY * self.smooth_plus
+                self.smooth_minus = 1.0 * minus_dm + ADX_SMOOTH_DECAY * self.smooth_minus
+                self.smooth_tr = 1.0 * true_range + ADX_SMOOTH_DECAY * self.smooth_tr
+                dx = self._dx(self.smooth_plus, self.smooth_minus, self.smooth_tr)
+                if self.adx is None:
+                    self.dx_values.append(dx)
+                    if index == ADX_START:
+                        self.adx = np.mean(np.array(self.dx_values))
+                else:
+                    self.adx = ADX_WEIGHT * dx + ADX_DECAY * self.adx
+
+            ret = log_close - self.prev_log_close
+            if len(self.returns) == self.returns.maxlen:
+                dropped = self.returns[0]
+                self.return_sum -= dropped
+                self.return_sumsq -= dropped * dropped
+            self.returns.append(ret)
+            self.return_sum += ret
+            self.return_sumsq += ret * ret
+            if index % RESUM_EVERY == 0:
+                self.return_sum = math.fsum(self.returns)
+                self.return_sumsq = math.fsum(r * r for r in self.returns)
+
+        if self.ema_slow is None:
+            self.seed_closes.append(close)
+            if index == MACD_START:
+                closes = np.array(self.seed_closes)
+                self.ema_fast = np.mean(closes[-MACD_FAST:])
+                self.ema_slow = np.mean(closes)
+        else:
+            self.ema_fast = MACD_FAST_K * close + (1.0 - MACD_FAST_K) * self.ema_fast
+            self.ema_slow = MACD_SLOW_K * close + (1.0 - MACD_SLOW_K) * self.ema_slow
+        if self.ema_slow is not None:
+            line = self.ema_fast - self.ema_slow
+            if self.macd_signal is None:
+                self.macd_values.append(line)
+                if index == SIGNAL_START:
+                    self.macd_signal = np.mean(np.array(self.macd_values))
+            else:
+                self.macd_signal = MACD_SIGNAL_K * line + (1.0 - MACD_SIGNAL_K) * self.macd_signal
+
+        self.count += 1
+        self.last_open_time = open_time
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+        self.prev_log_close = log_close
+
+    def preview(self, high, low, close):
+        # (trend score, volatility) of the committed history plus one more
+        # bar, without changing the state.
+        volatility = self._preview_volatility(close)
+        if not self.valid or close <= 0 or self.count + 1 < MIN_BARS:
+            return 0.0, volatility
+
+        sma_fast = (self.fast_sum - self.fast_window[0] + close) / SMA_FAST
+        sma_slow = (self.slow_sum - self.slow_window[0] + close) / SMA_SLOW
+
+        delta = close - self.prev_close
+        avg_gain = RSI_WEIGHT * (delta if delta > 0 else 0.0) + RSI_DECAY * self.avg_gain
+        avg_loss = RSI_WEIGHT * (-delta if delta < 0 else 0.0) + RSI_DECAY * self.avg_loss
+        rsi = 100.0 * _ratio_or_zero(avg_gain, avg_gain + avg_loss)
+
+        ema_fast = MACD_FAST_K * close + (1.0 - MACD_FAST_K) * self.ema_fast
+        ema_slow = MACD_SLOW_K * close + (1.0 - MACD_SLOW_K) * self.ema_slow
+        line = ema_fast - ema_slow
+        signal = MACD_SIGNAL_K * line + (1.0 - MACD_SIGNAL_K) * self.macd_signal
+
+        plus_dm, minus_dm, true_range = self._directional_moves(high, low, close)
+        smooth_plus = 1.0 * plus_dm + ADX_SMOOTH_DECAY * self.smooth_plus
+        smooth_minus = 1.0 * minus_dm + ADX_SMOOTH_DECAY * self.smooth_minus
+        smooth_tr = 1.0 * true_range + ADX_SMOOTH_DECAY * self.smooth_tr
+        adx = ADX_WEIGHT * self._dx(smooth_plus, smooth_minus, smooth_tr) + ADX_DECAY * self.adx
+
+        score = 1 if sma_fast > sma_slow else -1
+        score += 1 if close > sma_fast else -1
+        score += 1 if line > signal else -1
+        score += 1 if rsi > 55 else 0
+        score += -1 if rsi < 45 else 0
+        if adx > 25:
+            score += np.sign(sma_fast - sma_slow)
+        return float(np.clip(score / 5.0, -1, 1)), volatility
+
+    def _preview_volatility(self, close):
+        if self.prev_log_close is None or close <= 0:
+            return 0.0
+        ret = math.log(close) - self.prev_log_close
+        total = self.return_sum + ret
+        total_sq = self.return_sumsq + ret * ret
+        n = len(self.returns) + 1
+        mean = total / n
+        variance = max(total_sq / n - mean * mean, 0.0)
+        return math.sqrt(variance) * ANNUALIZATION
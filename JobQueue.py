@@ -0,0 +1,65 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobSkipped(Exception):
+    # Raised by a job that declined to run; it ends as "skipped".
+    pass
+
+
+class JobQueue:
+    # Runs API-triggered engine work (refresh, strategy, snapshot) on one
+    # background thread, so the request only returns a job id. Jobs run in
+    # submission order; the last `history` jobs stay queryable by id.
+    def __init__(self, history=100):
+        self.history = history
+        self.jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="engine-job")
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args):
+        job = {
+            'id': str(next(self._ids)), 'kind': kind, 'status': 'queued',
+            'submitted_at': time.time(), 'started_at': None, 'finished_at': None,
+            'result': None, 'error': None,
+        }
+        with self._lock:
+            self.jobs[job['id']] = job
+            while len(self.jobs) > self.history:
+                oldest = next(iter(self.jobs.values()))
+                if oldest['status'] in ('queued', 'running'):
+                    break
+                self.jobs.popitem(last=False)
+        self._pool.submit(self._run, job, fn, args)
+        return dict(job)
+
+    def _run(self, job, fn, args):
+        job.update(status='running', started_at=time.time())
+        try:
+            job['result'] = fn(*args)
+            job['status'] = 'done'
+        except JobSkipped as e:
+            logging.warning(f"Job {job['id']} ({job['kind']}) skipped: {str(e)}")
+            job.update(status='skipped', error=str(e))
+        except Exception as e:
+            logging.error(f"Job {job['id']} ({job['kind']}) failed: {str(e)}")
+            job.update(status='failed', error=str(e))
+        finally:
+            job['finished_at'] = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list(self):
+        with self._lock:
+            return [dict(job) for job in reversed(self.jobs.values())]
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
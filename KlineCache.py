@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+
+KLINE_DTYPE = np.dtype([
+    ('open_time', 'i8'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+])
+
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000,
+    '8h': 28_800_000, '12h': 43_200_000, '1d': 86_400_000,
+}
+
+
+def parse_klines(raw_klines):
+    if not raw_klines:
+        return np.empty(0, dtype=KLINE_DTYPE)
+    values = np.array([k[1:6] for k in raw_klines], dtype=np.float64)
+    bars = np.empty(len(raw_klines), dtype=KLINE_DTYPE)
+    bars['open_time'] = [int(k[0]) for k in raw_klines]
+    bars['open'] = values[:, 0]
+    bars['high'] = values[:, 1]
+    bars['low'] = values[:, 2]
+    bars['close'] = values[:, 3]
+    bars['volume'] = values[:, 4]
+    return bars
+
+
+class KlineCache:
+    # Keeps the last `limit` bars per (symbol, interval) as a structured array.
+    # After the first download only bars from the last cached open time onward
+    # are requested; the last cached bar is re-fetched because it is usually
+    # still forming. With a KlineStore, a symbol's first update starts from
+    # the stored history and every update persists the closed bars.
+    def __init__(self, client, limit=500, store=None):
+        self.client = client
+        self.limit = limit
+        self.store = store
+        self._bars = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol, interval='15m'):
+        return self._bars.get((symbol, interval))
+
+    def update(self, symbol, interval='15m'):
+        if self.store is None:
+            return self._update(symbol, interval)
+        if (symbol, interval) not in self._bars:
+            stored = self.store.load(symbol, interval, self.limit)
+            if stored is not None:
+                self._replace((symbol, interval), stored)
+        bars = self._update(symbol, interval)
+        self.store.append(symbol, interval, bars[:-1])
+        return bars
+
+    def _update(self, symbol, interval):
+        key = (symbol, interval)
+        cached = self._bars.get(key)
+        params = {'limit': self.limit}
+
+        if cached is not None and len(cached):
+            last_open = int(cached['open_time'][-1])
+            interval_ms = INTERVAL_MS.get(interval)
+            if interval_ms:
+                missing = (int(time.time() * 1000) - last_open) // interval_ms + 2
+                params['limit'] = int(min(self.limit, max(missing, 2)))
+            params['startTime'] = last_open
+
+        fresh = parse_klines(self.client.klines(symbol=symbol, interval=interval, **params))
+
+        if cached is not None and len(cached) and 'startTime' in params:
+            if len(fresh) == 0:
+                return cached
+            if len(fresh) >= self.limit:
+                # More bars are missing than one request returns; start over.
+                return self._replace(key, self._download(symbol, interval))
+            keep = cached[cached['open_time'] < fresh['open_time'][0]]
+            merged = np.concatenate([keep, fresh])[-self.limit:]
+            return self._replace(key, merged)
+
+        return self._replace(key, fresh[-self.limit:])
+
+    def _download(self, symbol, interval):
+        return parse_klines(self.client.klines(symbol=symbol, interval=interval, limit=self.limit))
+
+    def _replace(self, key, bars):
+        with self._lock:
+            self._bars[key] = bars
+        return bars
+
+    def evict(self, keep_symbols):
+        keep_symbols = set(keep_symbols)
+        with self._lock:
+            stale = [key for key in self._bars if key[0] not in keep_symbols]
+            for key in stale:
+                del self._bars[key]
+        if stale:
+            logging.info(f"Evicted {len(stale)} symbols from kline cache")
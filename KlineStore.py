@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+from KlineCache import KLINE_DTYPE
+
+
+class KlineStore:
+    # Append-only closed bars per (symbol, interval) as raw KLINE_DTYPE
+    # records in <root>/<interval>/<symbol>.bin. Reads memory-map the file
+    # and copy out only the tail they need, so a warm start costs one small
+    # read per symbol instead of a full kline download. A record cut short
+    # by a crash is dropped on the next open. Bars are only appended after
+    # the last stored open time; if the engine had to re-download a whole
+    # window after a long outage the file simply has a gap, which the
+    # indicator state already treats as a reseed.
+    def __init__(self, root):
+        self.root = root
+        self._last_open = {}
+        self._lock = threading.Lock()
+
+    def path(self, symbol, interval):
+        return os.path.join(self.root, interval, f"{symbol}.bin")
+
+    def _records(self, path):
+        # Whole-record memmap of the file (None when missing or empty).
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        count = size // KLINE_DTYPE.itemsize
+        if size % KLINE_DTYPE.itemsize:
+            logging.warning(f"Dropping partial kline record at the end of {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(count * KLINE_DTYPE.itemsize)
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=KLINE_DTYPE, mode='r', shape=(count,))
+
+    def read(self, symbol, interval='15m'):
+        # Every stored bar as a read-only memmap, for offline analysis.
+        return self._records(self.path(symbol, interval))
+
+    def load(self, symbol, interval='15m', limit=500):
+        records = self.read(symbol, interval)
+        if records is None:
+            return None
+        bars = np.array(records[-limit:])
+        with self._lock:
+            self._last_open[(symbol, interval)] = int(records['open_time'][-1])
+        del records
+        return bars
+
+    def _last_stored(self, key, path):
+        last = self._last_open.get(key)
+        if last is None:
+            records = self._records(path)
+            last = int(records['open_time'][-1]) if records is not None else -1
+            del records
+        return last
+
+    def append(self, symbol, interval, bars):
+        # Appends the bars newer than the last stored one; returns how many.
+        if bars is None or not len(bars):
+            return 0
+        key = (symbol, interval)
+        path = self.path(symbol, interval)
+        with self._lock:
+            last = self._last_stored(key, path)
+            fresh = bars[bars['open_time'] > last]
+            if not len(fresh):
+                self._last_open[key] = last
+                return 0
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as f:
+                f.write(np.ascontiguousarray(fresh, dtype=KLINE_DTYPE).tobytes())
+            self._last_open[key] = int(fresh['open_time'][-1])
+        return len(fresh)
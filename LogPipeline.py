@@ -0,0 +1,191 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+
+# Set by the engine around a cycle / stage; the context filter stamps them on
+# every record logged in that context. Worker pools get them by running
+# their tasks in a copy of the submitting context.
+CYCLE = contextvars.ContextVar("log_cycle", default=None)
+STAGE = contextvars.ContextVar("log_stage", default=None)
+
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# LogRecord attributes that are not `extra` fields.
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_TRACEBACKS = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line: time, level, logger, message, thread, the
+    # cycle/stage context and every `extra` field (symbol, latency, ...).
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    # Runs in the thread that logs, so it sees that thread's context.
+    def filter(self, record):
+        if getattr(record, 'cycle', None) is None:
+            record.cycle = CYCLE.get()
+        if getattr(record, 'stage', None) is None:
+            record.stage = STAGE.get()
+        return True
+
+
+class SymbolSampler(logging.Filter):
+    # Rate-limits the per-symbol chatter of a cycle: records logged with
+    # extra={'symbol': ..., 'sample': True} below ERROR pass at most
+    # `per_minute` times per minute for each (symbol, call site). The next
+    # record that passes carries how many were dropped as `suppressed`.
+    # Everything else (order events, errors, cycle summaries) always passes.
+    def __init__(self, per_minute=2):
+        super().__init__()
+        self.per_minute = per_minute
+        self.windows = {}
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, 'sample', False) or record.levelno >= logging.ERROR:
+            return True
+        key = (getattr(record, 'symbol', None), record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= 60:
+                if len(self.windows) > 10000:
+                    self.windows = {k: w for k, w in self.windows.items() if now - w[0] < 60}
+                suppressed = window[2] if window is not None else 0
+                window = self.windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if window[1] >= self.per_minute:
+                window[2] += 1
+                self.suppressed += 1
+                return False
+            window[1] += 1
+            return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Never blocks the caller: when the writer thread falls behind and the
+    # queue is full, the record is counted and dropped.
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolves the message and traceback text for the writer thread but,
+        # unlike QueueHandler, keeps the traceback out of `message`.
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _TRACEBACKS.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_pipeline = {'settings': None, 'handler': None, 'sampler': None, 'listener': None}
+_pipeline_lock = threading.Lock()
+
+
+def _settings(config, role):
+    config = config or {}
+    return (
+        str(config.get("LOG_FILE", "LogsBinanceQuantTradingEngine.log")),
+        int(config.get("LOG_MAX_BYTES", 20 * 1024 * 1024)),
+        int(config.get("LOG_BACKUPS", 5)),
+        str(config.get("LOG_LEVEL", "INFO")).upper(),
+        int(config.get("LOG_SAMPLE_PER_MINUTE", 2)),
+        int(config.get("LOG_QUEUE_SIZE", 10000)),
+        role == "shard",
+    )
+
+
+def configure_logging(config=None, role="standalone"):
+    # Points the root logger at a bounded queue drained by one writer
+    # thread: JSON lines to a rotating LOG_FILE, plain lines to the console.
+    # The settings are process-wide; calling again with the same ones is a
+    # no-op. Shard processes append to the same file without rotating it
+    # and reopen it after the main process rotates.
+    settings = _settings(config, role)
+    with _pipeline_lock:
+        if _pipeline['settings'] == settings:
+            return _pipeline['handler']
+        path, max_bytes, backups, level, per_minute, queue_size, follower = settings
+
+        if follower:
+            file_handler = logging.handlers.WatchedFileHandler(path)
+        else:
+            file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        file_handler.setFormatter(JsonFormatter())
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+        handler = DroppingQueueHandler(queue.Queue(queue_size))
+        handler.addFilter(ContextFilter())
+        sampler = SymbolSampler(per_minute)
+        handler.addFilter(sampler)
+        listener = logging.handlers.QueueListener(handler.queue, file_handler, console)
+
+        root = logging.getLogger()
+        _stop(root)
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+        listener.start()
+        _pipeline.update(settings=settings, handler=handler, sampler=sampler, listener=listener)
+        return handler
+
+
+def _stop(root=None):
+    # Flushes what is queued and closes the writer's handlers.
+    listener, handler = _pipeline['listener'], _pipeline['handler']
+    if listener is None:
+        return
+    (root or logging.getLogger()).removeHandler(handler)
+    listener.stop()
+    for target in listener.handlers:
+        target.close()
+    _pipeline.update(settings=None, handler=None, sampler=None, listener=None)
+
+
+def shutdown_logging():
+    with _pipeline_lock:
+        _stop()
+
+
+def pipeline_status():
+    handler, sampler = _pipeline['handler'], _pipeline['sampler']
+    if handler is None:
+        return None
+    return {'queued': handler.queue.qsize(), 'dropped': handler.dropped, 'sampled_out': sampler.suppressed}
+
+
+atexit.register(shutdown_logging)
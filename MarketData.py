@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from collections import defaultdict
+
+from binance.um_futures import UMFutures
+
+from KlineCache import KlineCache
+from KlineStore import KlineStore
+from MarketDataFeed import MarketDataFeed
+from MarketSnapshot import MarketSnapshot
+from Metrics import ExchangeClient
+from OrderBook import OrderBookManager
+from RateLimiter import WeightLimiter
+from SymbolRegistry import SymbolRegistry
+
+
+def credential_envs(config):
+    # Environment variables holding the (api key, secret). CREDENTIAL_PROFILE
+    # "X" reads <API_KEY_ENV>_X / <API_SECRET_ENV>_X, so several accounts can
+    # be configured without secrets in the config.
+    key_env = str(config.get("API_KEY_ENV", "BINANCE_API_KEY"))
+    secret_env = str(config.get("API_SECRET_ENV", "BINANCE_SECRET_KEY"))
+    profile = str(config.get("CREDENTIAL_PROFILE") or "").upper()
+    if profile:
+        return f"{key_env}_{profile}", f"{secret_env}_{profile}"
+    return key_env, secret_env
+
+
+def credentials(config):
+    key_env, secret_env = credential_envs(config)
+    return os.getenv(key_env), os.getenv(secret_env)
+
+
+def exchange_client(config, limiter, pool_size):
+    api_key, secret_key = credentials(config)
+    return ExchangeClient(
+        UMFutures(key=api_key, secret=secret_key, show_limit_usage=True),
+        limiter=limiter,
+        max_retries=int(config.get("REST_MAX_RETRIES", 3)),
+        pool_size=pool_size,
+    )
+
+
+class MarketData:
+    # Everything market-side an engine reads: the weight-limited REST client,
+    # symbol filters, kline cache/store, the optional ticker feed and depth
+    # books, and the polled market snapshot. A standalone engine owns one;
+    # EngineHost shares one between all its engines. There, `ttl` > 0 lets
+    # engines whose cycles land together reuse one another's snapshot, depth
+    # and kline fetches, and concurrent requests for the same key wait for
+    # the one fetch in flight. Evictions and depth subscriptions follow the
+    # union of every engine's universe (see track()).
+    def __init__(self, config, role="standalone", ttl=0.0, weight_per_minute=None):
+        self.config = config
+        self.ttl = float(ttl)
+
+        # Request weight is per IP, so one bucket serves every client of
+        # the process, account clients included. A sharding coordinator
+        # passes its share of REQUEST_WEIGHT_PER_MINUTE.
+        if weight_per_minute is None:
+            weight_per_minute = int(config.get("REQUEST_WEIGHT_PER_MINUTE", 2000))
+        self.limiter = WeightLimiter(
+            weight_per_minute,
+            ip_limit=int(config.get("IP_WEIGHT_LIMIT", 2400)),
+        )
+        self.client = exchange_client(
+            config, self.limiter,
+            pool_size=int(config.get("FETCH_WORKERS", 8)) + int(config.get("ORDER_WORKERS", 4)) + 2,
+        )
+
+        self.symbol_registry = SymbolRegistry(self.client, ttl=int(config.get("EXCHANGE_INFO_TTL", 3600)))
+        if role != "shard":
+            self.symbol_registry.refresh()
+        # In sharded mode the shards own the store files of their symbols.
+        KLINE_STORE_DIR = config.get("KLINE_STORE_DIR") if role != "coordinator" else None
+        self.kline_cache = KlineCache(
+            self.client,
+            int(config.get("KLINE_LIMIT", 500)),
+            store=KlineStore(KLINE_STORE_DIR) if KLINE_STORE_DIR else None,
+        )
+
+        self.market_feed = None
+        self.order_books = None
+        if str(config.get("MARKET_DATA_MODE", "rest")) == "stream":
+            # Shards keep diff-depth books for their own symbols only; the
+            # all-market ticker feed stays with the engine that ranks symbols.
+            STREAM_URL = str(config.get("STREAM_URL", "wss://fstream.binance.com"))
+            if role != "shard":
+                self.market_feed = MarketDataFeed(
+                    self.client,
+                    stream_url=STREAM_URL,
+                    record_path=config.get("STREAM_RECORD_PATH"),
+                    quote_of=self.quote_asset,
+                )
+                self.market_feed.start()
+            if role != "coordinator":
+                self.order_books = OrderBookManager(self.client, stream_url=STREAM_URL)
+
+        self.market_snapshot = MarketSnapshot(self.quote_asset)
+        self.universes = {}
+        self._fetched = {}
+        self._depth = {}
+        self._key_locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def quote_asset(self, symbol):
+        # Called under the snapshot lock, also from the stream thread, so it
+        # must not wait for an exchange_info download.
+        info = self.symbol_registry.peek(symbol)
+        return info.quote_asset if info is not None else None
+
+    def _fresh(self, key):
+        fetched_at = self._fetched.get(key)
+        return fetched_at is not None and time.monotonic() - fetched_at < self.ttl
+
+    def _once(self, key, fetch, cached):
+        # fetch() unless `key` was fetched within ttl; one caller fetches,
+        # the others wait on the key's lock and take the cached value.
+        if self.ttl <= 0:
+            return fetch()
+        with self._lock:
+            key_lock = self._key_locks[key]
+        with key_lock:
+            if self._fresh(key):
+                return cached()
+            value = fetch()
+            self._fetched[key] = time.monotonic()
+            return value
+
+    def snapshot(self):
+        # The live feed's copy when it is healthy, else the polled snapshot.
+        if self.market_feed is not None and self.market_feed.is_live():
+            return self.market_feed.snapshot()
+        return self._once(('snapshot',), self._fetch_snapshot, lambda: self.market_snapshot)
+
+    def _fetch_snapshot(self):
+        # Brings the registry up to date outside the snapshot lock, so the
+        # loads below resolve quotes without a download.
+        self.symbol_registry.symbols()
+        self.market_snapshot.load_tickers(self.client.ticker_24hr_price_change())
+        self.market_snapshot.load_books(self.client.book_ticker())
+        return self.market_snapshot
+
+    def depth(self, symbol, limit):
+        # track() may trim the cached book between the fetch and a later
+        # reader, so a miss fetches again.
+        def fetch():
+            book = self.client.depth(symbol, limit=limit)
+            with self._lock:
+                self._depth[(symbol, limit)] = book
+            return book
+
+        def cached():
+            with self._lock:
+                book = self._depth.get((symbol, limit))
+            return book if book is not None else fetch()
+        return self._once(('depth', symbol, limit), fetch, cached)
+
+    def klines(self, symbol, interval="15m"):
+        def cached():
+            bars = self.kline_cache.get(symbol, interval)
+            return bars if bars is not None else self.kline_cache.update(symbol, interval)
+        return self._once(('klines', symbol, interval), lambda: self.kline_cache.update(symbol, interval), cached)
+
+    def track(self, owner, symbols):
+        # Records `owner`'s universe and trims caches and depth streams to
+        # the union of all owners'.
+        with self._lock:
+            self.universes[owner] = set(symbols)
+            keep = set().union(*self.universes.values())
+            self._depth = {key: book for key, book in self._depth.items() if key[0] in keep}
+        self.kline_cache.evict(keep)
+        if self.order_books is not None:
+            self.order_books.track(keep)
+
+    def release(self, owner):
+        with self._lock:
+            self.universes.pop(owner, None)
+
+    def close(self):
+        if self.market_feed is not None:
+            self.market_feed.stop()
+        if self.order_books is not None:
+            self.order_books.stop()
+
+    def status(self):
+        with self._lock:
+            return {
+                'engines': len(self.universes),
+                'tracked_symbols': len(set().union(*self.universes.values())) if self.universes else 0,
+                'ttl': self.ttl,
+                'used_weight': self.client.used_weight,
+                'available_weight': self.limiter.available(),
+            }
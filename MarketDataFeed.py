@@ -0,0 +1,77 @@
+import json
+import logging
+
+from MarketSnapshot import MarketSnapshot
+from StreamConnection import StreamConnection
+
+
+class MarketDataFeed(StreamConnection):
+    # Keeps last price, 24h volume and top of book for every futures symbol
+    # current from the all-market !ticker@arr and !bookTicker streams. A REST
+    # snapshot seeds the state on start and after every reconnect so nothing
+    # missed while disconnected is kept stale.
+    def __init__(self, client, stream_url="wss://fstream.binance.com", stale_after=30, record_path=None, quote_of=None):
+        super().__init__(stream_url, stale_after, name="Market feed")
+        self.client = client
+        self.record_path = record_path
+
+        self.market = MarketSnapshot(quote_of)
+        self._record_file = None
+
+    def start(self):
+        if self.running:
+            return
+        if self.record_path:
+            self._record_file = open(self.record_path, 'a')
+        self.resync()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        if self._record_file:
+            self._record_file.close()
+            self._record_file = None
+
+    def snapshot(self):
+        return self.market.copy()
+
+    def resync(self):
+        try:
+            tickers = self.client.ticker_24hr_price_change()
+            books = self.client.book_ticker()
+        except Exception as e:
+            logging.error(f"Market feed resync failed: {str(e)}")
+            return False
+
+        self.market.load_tickers(tickers)
+        self.market.load_books(books)
+        self.mark_alive()
+        logging.info(f"Market feed resynced: {len(tickers)} tickers, {len(books)} books")
+        return True
+
+    def on_connected(self, ws):
+        ws.ticker()
+        ws.book_ticker(None)
+
+    def on_reconnected(self):
+        self.resync()
+
+    def handle_message(self, raw):
+        if self._record_file:
+            self._record_file.write(raw + "\n")
+        message = json.loads(raw)
+        if isinstance(message, dict) and 'stream' in message:
+            message = message['data']
+
+        if isinstance(message, list):
+            self.market.load_tickers(
+                (item for item in message if item.get('e') == '24hrTicker'),
+                symbol_key='s', price_key='c', volume_key='v',
+            )
+        elif isinstance(message, dict) and message.get('e') == 'bookTicker':
+            self.market.load_books(
+                [message], symbol_key='s', bid_key='b', ask_key='a', bid_qty_key='B', ask_qty_key='A',
+            )
+        else:
+            return
+        self.mark_alive()
@@ -0,0 +1,177 @@
+import threading
+
+import numpy as np
+
+
+TICKER_FIELDS = ('price', 'volume')
+BOOK_FIELDS = ('bid', 'ask', 'bid_qty', 'ask_qty')
+FIELDS = TICKER_FIELDS + BOOK_FIELDS
+
+# Used when no quote_of lookup is given; longest suffixes first.
+KNOWN_QUOTES = ('FDUSD', 'USDT', 'USDC', 'BUSD', 'BTC')
+
+
+def quote_from_suffix(symbol):
+    for quote in KNOWN_QUOTES:
+        if symbol.endswith(quote):
+            return quote
+    return None
+
+
+class PairMetrics:
+    # Per-cycle metrics for one pair of market_state; the engine keeps them
+    # in a dict keyed by pair.
+    __slots__ = ('pair', 'mid_price', 'order_book_imbalance', 'volatility', 'volume_profile')
+
+    def __init__(self, pair, mid_price, order_book_imbalance, volatility, volume_profile):
+        self.pair = pair
+        self.mid_price = mid_price
+        self.order_book_imbalance = order_book_imbalance
+        self.volatility = volatility
+        self.volume_profile = volume_profile
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class MarketSnapshot:
+    # Last price, 24h volume and top of book for the whole market, one float
+    # array per field indexed by a symbol -> slot map. Updates keep the raw
+    # strings they were parsed from, so a symbol whose values did not change
+    # since the last ticker/book update is not parsed again. Missing values
+    # are NaN; select() only ranks symbols that have both a ticker and a book.
+    # A symbol quote_of() cannot place yet (e.g. the symbol registry failed
+    # to load) is looked up again on every later load until it resolves.
+    def __init__(self, quote_of=None, capacity=512):
+        self.quote_of = quote_of or quote_from_suffix
+        self.symbols = []
+        self.index = {}
+        self.quotes = []
+        self.unresolved = set()
+        self.columns = {field: np.full(capacity, np.nan) for field in FIELDS}
+        self.raw = {'ticker': [], 'book': []}
+        self._quote_masks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def _slot(self, symbol):
+        slot = self.index.get(symbol)
+        if slot is not None:
+            return slot
+
+        slot = len(self.symbols)
+        capacity = len(self.columns['price'])
+        if slot == capacity:
+            for field, column in self.columns.items():
+                grown = np.full(capacity * 2, np.nan)
+                grown[:capacity] = column
+                self.columns[field] = grown
+        self.symbols.append(symbol)
+        self.index[symbol] = slot
+        self.quotes.append(self.quote_of(symbol))
+        if self.quotes[slot] is None:
+            self.unresolved.add(slot)
+        self.raw['ticker'].append(None)
+        self.raw['book'].append(None)
+        self._quote_masks = {}
+        return slot
+
+    def _resolve_quotes(self):
+        for slot in list(self.unresolved):
+            quote = self.quote_of(self.symbols[slot])
+            if quote is not None:
+                self.quotes[slot] = quote
+                self.unresolved.discard(slot)
+                self._quote_masks = {}
+
+    def _load(self, kind, fields, items, symbol_key, keys):
+        raw_store = self.raw[kind]
+        changed_slots, changed_values = [], []
+        with self._lock:
+            if self.unresolved:
+                self._resolve_quotes()
+            for item in items:
+                raw = tuple(item.get(key, 0) for key in keys)
+                slot = self._slot(item[symbol_key])
+                if raw_store[slot] != raw:
+                    raw_store[slot] = raw
+                    changed_slots.append(slot)
+                    changed_values.append(raw)
+            if changed_slots:
+                # One C-level string -> float conversion for every changed row.
+                values = np.array(changed_values, dtype=np.float64)
+                for column, field in enumerate(fields):
+                    self.columns[field][changed_slots] = values[:, column]
+        return len(changed_slots)
+
+    def load_tickers(self, items, symbol_key='symbol', price_key='lastPrice', volume_key='volume'):
+        return self._load('ticker', TICKER_FIELDS, items, symbol_key, (price_key, volume_key))
+
+    def load_books(self, items, symbol_key='symbol', bid_key='bidPrice', ask_key='askPrice',
+                   bid_qty_key='bidQty', ask_qty_key='askQty'):
+        return self._load('book', BOOK_FIELDS, items, symbol_key, (bid_key, ask_key, bid_qty_key, ask_qty_key))
+
+    def copy(self):
+        with self._lock:
+            count = len(self.symbols)
+            snapshot = MarketSnapshot(self.quote_of, capacity=max(count, 1))
+            snapshot.symbols = list(self.symbols)
+            snapshot.index = dict(self.index)
+            snapshot.quotes = list(self.quotes)
+            snapshot.unresolved = set(self.unresolved)
+            for field, column in self.columns.items():
+                snapshot.columns[field][:count] = column[:count]
+            snapshot.raw = {kind: list(values) for kind, values in self.raw.items()}
+        return snapshot
+
+    def row(self, symbol):
+        slot = self.index.get(symbol)
+        if slot is None:
+            return None
+        return {field: float(self.columns[field][slot]) for field in FIELDS}
+
+    def _quote_mask(self, quote_asset):
+        mask = self._quote_masks.get(quote_asset)
+        if mask is None:
+            mask = self._quote_masks[quote_asset] = np.array([quote == quote_asset for quote in self.quotes], dtype=bool)
+        return mask
+
+    def select(self, sortby, limit, quote_asset='USDT'):
+        # market_state for the `limit` symbols quoted in `quote_asset` with
+        # the highest `sortby` (price, volume, spread or liquidity), best
+        # first. The quote filter runs before ranking so the universe is
+        # always `limit` symbols when the market has that many.
+        if limit <= 0:
+            return {}
+
+        with self._lock:
+            count = len(self.symbols)
+            columns = {field: column[:count].copy() for field, column in self.columns.items()}
+            mask = self._quote_mask(quote_asset) if quote_asset else np.ones(count, dtype=bool)
+
+        price, volume = columns['price'], columns['volume']
+        bid, ask = columns['bid'], columns['ask']
+        spread = np.where((ask > 0) & (bid > 0), ask - bid, 0.0)
+        liquidity = bid * columns['ask_qty'] + ask * columns['bid_qty']
+        ranking = {'price': price, 'volume': volume, 'spread': spread, 'liquidity': liquidity}[sortby]
+
+        candidates = np.flatnonzero(mask & ~np.isnan(price) & ~np.isnan(bid))
+        keys = ranking[candidates]
+        if limit < len(candidates):
+            top = np.argpartition(-keys, limit - 1)[:limit]
+            candidates, keys = candidates[top], keys[top]
+        candidates = candidates[np.argsort(-keys, kind='stable')]
+
+        return {
+            self.symbols[slot]: {
+                'price': float(price[slot]),
+                'volume': float(volume[slot]),
+                'spread': float(spread[slot]),
+                'liquidity': float(liquidity[slot]),
+            } for slot in candidates
+        }
@@ -0,0 +1,302 @@
+import functools
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+
+import requests
+from binance.error import ClientError, ServerError
+from requests.adapters import HTTPAdapter
+
+from RateLimiter import PRIORITY_ORDER, request_priority, request_weight
+
+
+# Latency buckets in seconds, from sub-millisecond signal work up to slow
+# REST calls and whole refresh cycles.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def total(self):
+        with self._lock:
+            return sum(self.values.values())
+
+    def render(self):
+        with self._lock:
+            items = list(self.values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self.values[labels] = value
+
+    def get(self, *labels):
+        return self.values.get(labels)
+
+    def render(self):
+        with self._lock:
+            items = list(self.values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        # values[labels] = [per-bucket counts (+Inf last), sum, count]
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self.values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = ("le", bound if bound == "+Inf" else repr(float(bound)))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, description, labelnames, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, description, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, description, labelnames=()):
+        return self._get_or_create(Counter, name, description, labelnames)
+
+    def gauge(self, name, description, labelnames=()):
+        return self._get_or_create(Gauge, name, description, labelnames)
+
+    def histogram(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, description, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+METHOD_SECONDS = REGISTRY.histogram(
+    "engine_method_seconds", "Wall time of instrumented engine methods.", ("method",)
+)
+REST_SECONDS = REGISTRY.histogram(
+    "binance_rest_request_seconds", "Latency of each Binance REST request attempt (a retried call is observed once per attempt).", ("endpoint",)
+)
+REST_CALLS = REGISTRY.counter(
+    "binance_rest_requests_total", "Binance REST calls made.", ("endpoint",)
+)
+REST_ERRORS = REGISTRY.counter(
+    "binance_rest_errors_total", "Binance REST calls that failed.", ("endpoint", "status", "code")
+)
+LIMIT_USAGE = REGISTRY.gauge(
+    "binance_limit_usage", "Latest x-mbx-used-weight / x-mbx-order-count header values.", ("header",)
+)
+REST_RETRIES = REGISTRY.counter(
+    "binance_rest_retries_total", "Binance REST calls retried, by reason.", ("endpoint", "reason")
+)
+THROTTLE_SECONDS = REGISTRY.histogram(
+    "binance_rest_throttle_seconds", "Time REST calls waited for request weight.", ("priority",)
+)
+
+
+def timed(name=None):
+    # Records the wall time of every call to the decorated function in
+    # engine_method_seconds, whether it returns or raises.
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                METHOD_SECONDS.observe(time.perf_counter() - started, label)
+        return wrapper
+    return decorator
+
+
+def _retry_after(headers, default):
+    for key, value in (headers or {}).items():
+        if key.lower() == "retry-after":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                break
+    return default
+
+
+class ExchangeClient:
+    # Wraps a UMFutures client created with show_limit_usage=True. Every
+    # public method call is timed and counted per endpoint, the weight and
+    # order-count headers are kept in binance_limit_usage, and the response
+    # is unwrapped back to the plain payload so callers see no difference.
+    #
+    # With a limiter, each call first takes its request weight at its
+    # endpoint's priority (orders before account reads before market data),
+    # and the used-weight header is fed back into the limiter. A 429 pauses
+    # all callers for Retry-After and the call is retried; a 418 (IP ban)
+    # pauses and raises. Without a limiter the retrying caller itself sleeps
+    # for Retry-After, or an exponential backoff when there is none. 5xx and
+    # connection errors are retried with full jitter, except for order
+    # endpoints, whose outcome is then unknown.
+    def __init__(self, client, limiter=None, max_retries=3, pool_size=10, backoff=0.5):
+        self.client = client
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.used_weight = None
+        self._wrapped = {}
+
+        session = getattr(client, "session", None)
+        if session is not None:
+            # Keep-alive pool sized for the fetch/order thread pools; retries
+            # are handled here, not by urllib3.
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0, pool_block=True)
+            session.mount("https://", adapter)
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        wrapper = self._wrapped.get(name)
+        if wrapper is None:
+            wrapper = self._wrapped[name] = self._instrument(name, attr)
+        return wrapper
+
+    def _record_usage(self, headers):
+        for key, value in (headers or {}).items():
+            key = key.lower()
+            if key.startswith("x-mbx-used-weight") or key.startswith("x-mbx-order-count"):
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    continue
+                LIMIT_USAGE.set(value, key)
+                if key == "x-mbx-used-weight-1m":
+                    self.used_weight = value
+                    if self.limiter is not None:
+                        self.limiter.observe_used_weight(value)
+
+    def _throttle(self, name, priority, args, kwargs):
+        if self.limiter is None:
+            return
+        started = time.perf_counter()
+        self.limiter.acquire(request_weight(name, args, kwargs), priority=priority)
+        THROTTLE_SECONDS.observe(time.perf_counter() - started, str(priority))
+
+    def _sleep_before_retry(self, name, reason, attempt):
+        REST_RETRIES.inc(name, reason)
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _instrument(self, name, method):
+        priority = request_priority(name)
+        idempotent = priority != PRIORITY_ORDER
+
+        @functools.wraps(method)
+        def call(*args, **kwargs):
+            attempt = 0
+            while True:
+                self._throttle(name, priority, args, kwargs)
+                started = time.perf_counter()
+                REST_CALLS.inc(name)
+                try:
+                    response = method(*args, **kwargs)
+                except ClientError as error:
+                    REST_ERRORS.inc(name, error.status_code, error.error_code)
+                    self._record_usage(error.header)
+                    if error.status_code in (418, 429) and self.limiter is not None:
+                        wait = _retry_after(error.header, 60 if error.status_code == 418 else 1)
+                        logging.warning(f"Rate limited ({error.status_code}) on {name}, pausing requests for {wait:.1f}s")
+                        self.limiter.pause(wait)
+                    if error.status_code == 429 and attempt < self.max_retries:
+                        REST_RETRIES.inc(name, "429")
+                        if self.limiter is None:
+                            wait = _retry_after(error.header, self.backoff * 2 ** attempt)
+                            logging.warning(f"Rate limited (429) on {name}, retrying in {wait:.1f}s")
+                            time.sleep(wait)
+                        attempt += 1
+                        continue
+                    raise
+                except (ServerError, requests.ConnectionError, requests.Timeout) as error:
+                    status = getattr(error, "status_code", "")
+                    REST_ERRORS.inc(name, status, "")
+                    if idempotent and attempt < self.max_retries:
+                        self._sleep_before_retry(name, str(status or type(error).__name__), attempt)
+                        attempt += 1
+                        continue
+                    raise
+                except Exception:
+                    REST_ERRORS.inc(name, "", "")
+                    raise
+                finally:
+                    REST_SECONDS.observe(time.perf_counter() - started, name)
+
+                if isinstance(response, dict) and "limit_usage" in response and "data" in response:
+                    self._record_usage(response["limit_usage"])
+                    return response["data"]
+                return response
+        return call
@@ -0,0 +1,238 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from StreamConnection import StreamConnection
+
+
+def _levels(raw_levels):
+    if not raw_levels:
+        return np.empty(0), np.empty(0)
+    levels = np.array(raw_levels, dtype=np.float64)
+    return levels[:, 0], levels[:, 1]
+
+
+def _merge(prices, qtys, update_prices, update_qtys):
+    # Updates are placed first so np.unique's first-occurrence index picks
+    # the updated quantity; zero quantities remove the level.
+    all_prices = np.concatenate((update_prices, prices))
+    all_qtys = np.concatenate((update_qtys, qtys))
+    merged_prices, index = np.unique(all_prices, return_index=True)
+    merged_qtys = all_qtys[index]
+    keep = merged_qtys > 0
+    return merged_prices[keep], merged_qtys[keep]
+
+
+class OrderBook:
+    # Both sides are kept as ascending float64 price/qty arrays: the best bid
+    # is the last bid level, the best ask the first ask level. The stream
+    # thread writes under `lock`; the readers below take it too.
+    def __init__(self, symbol, max_levels=1000):
+        self.symbol = symbol
+        self.max_levels = max_levels
+        self.bid_prices = np.empty(0)
+        self.bid_qtys = np.empty(0)
+        self.ask_prices = np.empty(0)
+        self.ask_qtys = np.empty(0)
+        self.last_update_id = 0
+        self.synced = False
+        self.awaiting_first = False
+        self.lock = threading.Lock()
+
+    def load_snapshot(self, depth):
+        bid_prices, bid_qtys = _levels(depth.get('bids'))
+        ask_prices, ask_qtys = _levels(depth.get('asks'))
+        bid_order = np.argsort(bid_prices)
+        ask_order = np.argsort(ask_prices)
+        self.bid_prices, self.bid_qtys = bid_prices[bid_order], bid_qtys[bid_order]
+        self.ask_prices, self.ask_qtys = ask_prices[ask_order], ask_qtys[ask_order]
+        self.last_update_id = int(depth['lastUpdateId'])
+        self.awaiting_first = True
+        self.synced = True
+
+    def apply(self, event):
+        # Returns False when the event does not continue the update-id chain
+        # and the book has to be rebuilt from a fresh snapshot.
+        first_id, final_id = int(event['U']), int(event['u'])
+        if final_id < self.last_update_id:
+            return True
+        if self.awaiting_first:
+            if first_id > self.last_update_id:
+                return False
+            self.awaiting_first = False
+        elif int(event.get('pu', -1)) != self.last_update_id:
+            return False
+
+        if event.get('b'):
+            prices, qtys = _levels(event['b'])
+            bid_prices, bid_qtys = _merge(self.bid_prices, self.bid_qtys, prices, qtys)
+            self.bid_prices, self.bid_qtys = bid_prices[-self.max_levels:], bid_qtys[-self.max_levels:]
+        if event.get('a'):
+            prices, qtys = _levels(event['a'])
+            ask_prices, ask_qtys = _merge(self.ask_prices, self.ask_qtys, prices, qtys)
+            self.ask_prices, self.ask_qtys = ask_prices[:self.max_levels], ask_qtys[:self.max_levels]
+        self.last_update_id = final_id
+        return True
+
+    def _best_bid(self):
+        return float(self.bid_prices[-1]) if len(self.bid_prices) else None
+
+    def _best_ask(self):
+        return float(self.ask_prices[0]) if len(self.ask_prices) else None
+
+    def best_bid(self):
+        with self.lock:
+            return self._best_bid()
+
+    def best_ask(self):
+        with self.lock:
+            return self._best_ask()
+
+    def mid_price(self):
+        with self.lock:
+            bid, ask = self._best_bid(), self._best_ask()
+        if bid is None or ask is None:
+            return bid or ask
+        return (bid + ask) / 2
+
+    def imbalance(self, levels=5):
+        with self.lock:
+            bid_volume = float(self.bid_qtys[-levels:].sum())
+            ask_volume = float(self.ask_qtys[:levels].sum())
+        total = bid_volume + ask_volume
+        return (bid_volume - ask_volume) / total if total != 0 else 0.0
+
+
+class OrderBookManager(StreamConnection):
+    # Maintains one OrderBook per tracked symbol from <symbol>@depth@100ms
+    # diff streams. Events that arrive before a book's REST snapshot are
+    # buffered and replayed; a gap in the update ids queues a resync.
+    # Snapshots are fetched one at a time, `resync_interval` apart, through
+    # the client's limiter at data priority; at the default limit of 100 each
+    # costs weight 5, so a reconnect that resyncs every book stays well
+    # inside the weight budget.
+    def __init__(self, client, stream_url="wss://fstream.binance.com", snapshot_limit=100, stale_after=30,
+                 resync_interval=0.1):
+        super().__init__(stream_url, stale_after, name="Order book stream")
+        self.client = client
+        self.snapshot_limit = snapshot_limit
+        self.resync_interval = resync_interval
+        self.books = {}
+        self._buffers = {}
+        self._resync_queue = queue.Queue()
+        self._resync_worker = None
+
+    def start(self):
+        if self.running:
+            return
+        super().start()
+        self._resync_worker = threading.Thread(target=self._process_resyncs, name="order-book-resync", daemon=True)
+        self._resync_worker.start()
+
+    def stop(self):
+        super().stop()
+        self._resync_queue.put(None)
+
+    def is_live(self):
+        # With no books tracked nothing is subscribed and silence is expected.
+        if not self.books:
+            return self.connected
+        return super().is_live()
+
+    def get(self, symbol):
+        book = self.books.get(symbol)
+        if book is None or not book.synced or not self.is_live():
+            return None
+        return book
+
+    def track(self, symbols):
+        symbols = set(symbols)
+        added = symbols - set(self.books)
+        removed = set(self.books) - symbols
+
+        if added and not self.books:
+            # The stale clock starts with the first subscription.
+            self.mark_alive()
+        for symbol in added:
+            self.books[symbol] = OrderBook(symbol, self.snapshot_limit)
+            self._buffers[symbol] = []
+        if not self.running:
+            if self.books:
+                self.start()
+        elif self._ws is not None:
+            if removed:
+                self._ws.unsubscribe(self._streams(removed))
+            if added:
+                self._ws.subscribe(self._streams(added))
+
+        for symbol in removed:
+            self.books.pop(symbol, None)
+            self._buffers.pop(symbol, None)
+        for symbol in added:
+            self._resync_queue.put(symbol)
+
+    def _streams(self, symbols):
+        return [f"{symbol.lower()}@depth@100ms" for symbol in symbols]
+
+    def on_connected(self, ws):
+        if self.books:
+            ws.subscribe(self._streams(self.books))
+
+    def on_reconnected(self):
+        for symbol, book in list(self.books.items()):
+            with book.lock:
+                book.synced = False
+                self._buffers[symbol] = []
+            self._resync_queue.put(symbol)
+
+    def handle_message(self, raw):
+        event = json.loads(raw)
+        if isinstance(event, dict) and 'stream' in event:
+            event = event['data']
+        if not isinstance(event, dict) or event.get('e') != 'depthUpdate':
+            return
+        self.mark_alive()
+
+        symbol = event['s']
+        book = self.books.get(symbol)
+        if book is None:
+            return
+        with book.lock:
+            if not book.synced:
+                self._buffers.setdefault(symbol, []).append(event)
+            elif not book.apply(event):
+                logging.warning(f"Order book gap for {symbol}, resyncing")
+                book.synced = False
+                self._buffers[symbol] = [event]
+                self._resync_queue.put(symbol)
+
+    def _process_resyncs(self):
+        while self.running:
+            symbol = self._resync_queue.get()
+            if symbol is None:
+                break
+            book = self.books.get(symbol)
+            if book is None or book.synced:
+                continue
+            time.sleep(self.resync_interval)
+            try:
+                depth = self.client.depth(symbol, limit=self.snapshot_limit)
+            except Exception as e:
+                logging.error(f"Order book snapshot failed for {symbol}: {str(e)}")
+                time.sleep(1)
+                self._resync_queue.put(symbol)
+                continue
+
+            with book.lock:
+                book.load_snapshot(depth)
+                for event in self._buffers.get(symbol, []):
+                    if not book.apply(event):
+                        book.synced = False
+                        break
+                self._buffers[symbol] = []
+            if not book.synced:
+                self._resync_queue.put(symbol)
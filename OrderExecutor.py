@@ -0,0 +1,292 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from binance.error import ClientError
+
+from UserDataStream import CLOSED_ORDER_STATES
+
+
+def _log_client_error(error, symbol=None):
+    logging.error(
+        "Found error. status: {}, error code: {}, error message: {}".format(
+            error.status_code, error.error_code, error.error_message
+        ),
+        extra={'symbol': symbol},
+    )
+
+
+class OrderExecutor:
+    # Places entry + stop-loss + take-profit brackets off the strategy loop.
+    # The entry is a LIMIT order. Its exits are reduceOnly, which the
+    # exchange rejects (-2022) while there is no position to reduce, so they
+    # are only sent once the entry fills: every fill, partial or full, gets
+    # a STOP_MARKET + TAKE_PROFIT_MARKET pair for the newly filled quantity
+    # in one batchOrders request. Fills come from the account ledger's
+    # ORDER_TRADE_UPDATE events once follow() is called and the stream is
+    # live; otherwise query_order is polled every `poll_interval` seconds
+    # (with a live stream every STREAM_POLL_EVERY intervals, and once for
+    # each new entry, in case an event was missed). Rejected exits are
+    # retried `exit_retries` times; a pair that still cannot be placed has
+    # its placed leg and the rest of the entry cancelled, and the unprotected
+    # quantity is closed at market. No entry is sent when the leverage or
+    # margin type cannot be set. Leverage and margin type are cached per
+    # symbol and only changed when they differ.
+    STREAM_POLL_EVERY = 15
+
+    def __init__(self, client, symbol_registry, max_workers=4, poll_interval=2.0, exit_retries=1):
+        self.client = client
+        self.symbol_registry = symbol_registry
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="orders")
+        self.poll_interval = poll_interval
+        self.exit_retries = exit_retries
+        self.pending = set()
+        self.watching = {}
+        self.leverage = {}
+        self.margin_type = {}
+        self.trade_latency = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self._stream_ready = None
+        self._watcher = None
+        self._stopped = threading.Event()
+
+    def follow(self, ledger, ready):
+        # Take entry fills from `ledger` while ready() is true.
+        self._stream_ready = ready
+        ledger.add_listener(self.on_order_update)
+
+    def on_order_update(self, order):
+        if order['order_id'] in self.watching:
+            self._entry_update(order['order_id'], order['status'], order['filled'])
+
+    def ensure_leverage(self, symbol, level):
+        if self.leverage.get(symbol) == level:
+            return True
+        try:
+            self.client.change_leverage(symbol=symbol, leverage=level, recvWindow=6000)
+            self.leverage[symbol] = level
+            return True
+        except ClientError as error:
+            _log_client_error(error, symbol)
+            return False
+
+    def ensure_margin_type(self, symbol, margin_type):
+        if self.margin_type.get(symbol) == margin_type:
+            return True
+        try:
+            self.client.change_margin_type(symbol=symbol, marginType=margin_type, recvWindow=6000)
+            self.margin_type[symbol] = margin_type
+            return True
+        except ClientError as error:
+            # -4046: "No need to change margin type." means it is already set.
+            if error.error_code == -4046:
+                self.margin_type[symbol] = margin_type
+                return True
+            _log_client_error(error, symbol)
+            return False
+
+    def submit_bracket(self, symbol, side, qty, price, sl_price, tp_price, leverage, margin_type,
+                       on_done=None, on_exits=None):
+        # on_done gets the entry's result, on_exits the result of protecting
+        # each fill.
+        started = time.perf_counter()
+        # Run in a copy of the caller's context so the bracket's records keep
+        # the cycle id.
+        future = self._submit(
+            contextvars.copy_context(), self._place_bracket,
+            symbol, side, qty, price, sl_price, tp_price, leverage, margin_type, on_exits, started,
+        )
+        if on_done is not None:
+            future.add_done_callback(on_done)
+        return future
+
+    def _submit(self, context, fn, *args):
+        future = self.pool.submit(context.run, fn, *args)
+        with self._lock:
+            self.pending.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self.pending.discard(future)
+
+    def drain(self, timeout=30):
+        with self._lock:
+            pending = list(self.pending)
+        if pending:
+            wait(pending, timeout=timeout)
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+        if self.watching:
+            logging.warning(f"{len(self.watching)} entries still resting; exits for their fills will not be placed")
+        self.pool.shutdown(wait=True)
+
+    def _format(self, value, precision):
+        return f"{value:.{precision}f}" if precision is not None else repr(value)
+
+    def _place_bracket(self, symbol, side, qty, price, sl_price, tp_price, leverage, margin_type, on_exits, started):
+        result = {'symbol': symbol, 'side': side, 'entry': None, 'latency': None}
+        if not self.ensure_leverage(symbol, leverage) or not self.ensure_margin_type(symbol, margin_type):
+            logging.error(f"Bracket for {symbol} skipped: leverage or margin type could not be set", extra={'symbol': symbol})
+            result['latency'] = time.perf_counter() - started
+            return result
+
+        try:
+            result['entry'] = self.client.new_order(
+                symbol=symbol, side=side, type='LIMIT', quantity=qty, timeInForce='GTC', price=price
+            )
+            logging.info(f"Order placed: {side} {qty} {symbol} @ {price}", extra={'symbol': symbol})
+        except ClientError as error:
+            _log_client_error(error, symbol)
+            result['latency'] = time.perf_counter() - started
+            return result
+
+        entry = result['entry']
+        with self._lock:
+            self.watching[entry['orderId']] = {
+                'symbol': symbol, 'order_id': entry['orderId'], 'exit_side': 'SELL' if side.upper() == 'BUY' else 'BUY',
+                'sl_price': sl_price, 'tp_price': tp_price, 'filled': 0.0, 'covered': 0.0, 'polled': False,
+                'on_exits': on_exits, 'context': contextvars.copy_context(),
+            }
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch_fills, name="order-fills", daemon=True)
+                self._watcher.start()
+        self._entry_update(entry['orderId'], entry.get('status', 'NEW'), float(entry.get('executedQty', 0.0)))
+
+        result['latency'] = time.perf_counter() - started
+        self.trade_latency.append(result['latency'])
+        # The exchange response goes to the JSON log as a field, formatted by
+        # the writer thread rather than here.
+        logging.info(
+            f"Entry for {symbol} placed in {result['latency'] * 1000:.0f}ms",
+            extra={'symbol': symbol, 'latency': result['latency'], 'entry': entry},
+        )
+        return result
+
+    def _entry_update(self, order_id, status, filled):
+        # A fill beyond what already has exits gets its own pair.
+        with self._lock:
+            watch = self.watching.get(order_id)
+            if watch is None:
+                return
+            if status in CLOSED_ORDER_STATES:
+                self.watching.pop(order_id)
+            added = filled - watch['filled']
+            if added <= 0:
+                return
+            watch['filled'] = filled
+        try:
+            self._submit(watch['context'].copy(), self._protect, watch, added)
+        except RuntimeError as e:
+            logging.error(f"Exits for {watch['symbol']} not placed: {str(e)}", extra={'symbol': watch['symbol']})
+
+    def _watch_fills(self):
+        ticks = 0
+        while not self._stopped.wait(self.poll_interval):
+            ticks += 1
+            streamed = self._stream_ready is not None and self._stream_ready()
+            with self._lock:
+                watches = [
+                    watch for watch in self.watching.values()
+                    if not streamed or not watch['polled'] or ticks % self.STREAM_POLL_EVERY == 0
+                ]
+            for watch in watches:
+                watch['polled'] = True
+                symbol = watch['symbol']
+                try:
+                    order = self.client.query_order(symbol=symbol, orderId=watch['order_id'], recvWindow=6000)
+                except ClientError as error:
+                    _log_client_error(error, symbol)
+                    # -2013: "Order does not exist."
+                    if error.error_code == -2013:
+                        with self._lock:
+                            self.watching.pop(watch['order_id'], None)
+                    continue
+                except Exception as e:
+                    logging.error(f"Entry fill check failed for {symbol}: {str(e)}", extra={'symbol': symbol})
+                    continue
+                self._entry_update(watch['order_id'], order['status'], float(order.get('executedQty', 0.0)))
+
+    def _protect(self, watch, qty):
+        symbol = watch['symbol']
+        qty_text = self._format(qty, self.symbol_registry.get_qty_precision(symbol))
+        price_precision = self.symbol_registry.get_price_precision(symbol)
+        legs = [
+            {'symbol': symbol, 'side': watch['exit_side'], 'type': 'STOP_MARKET', 'quantity': qty_text,
+             'stopPrice': self._format(watch['sl_price'], price_precision), 'reduceOnly': 'true'},
+            {'symbol': symbol, 'side': watch['exit_side'], 'type': 'TAKE_PROFIT_MARKET', 'quantity': qty_text,
+             'stopPrice': self._format(watch['tp_price'], price_precision), 'reduceOnly': 'true'},
+        ]
+        placed = {}
+        for attempt in range(self.exit_retries + 1):
+            missing = [leg for leg in legs if leg['type'] not in placed]
+            try:
+                responses = self.client.new_batch_order(missing) or []
+            except ClientError as error:
+                _log_client_error(error, symbol)
+                responses = []
+            for leg, response in zip(missing, responses):
+                if 'code' in response:
+                    logging.error(
+                        f"Bracket exit rejected for {symbol}: {response.get('code')} {response.get('msg')}",
+                        extra={'symbol': symbol},
+                    )
+                else:
+                    placed[leg['type']] = response
+            if len(placed) == len(legs):
+                break
+
+        result = {'symbol': symbol, 'entry_id': watch['order_id'], 'qty': qty, 'exits': list(placed.values()),
+                  'protected': len(placed) == len(legs), 'flattened': False}
+        if result['protected']:
+            with self._lock:
+                watch['covered'] += qty
+            logging.info(f"Exits for {qty_text} {symbol} placed", extra={'symbol': symbol, 'exits': result['exits']})
+        else:
+            result['flattened'] = self._flatten(watch, qty, placed)
+        result['open'] = watch['covered'] > 0
+        if watch['on_exits'] is not None:
+            watch['on_exits'](result)
+        return result
+
+    def _flatten(self, watch, qty, placed):
+        # Cancels the rest of the entry and this fill's placed exit, then
+        # closes everything filled without exits at market.
+        symbol = watch['symbol']
+        with self._lock:
+            self.watching.pop(watch['order_id'], None)
+        try:
+            entry = self.client.cancel_order(symbol=symbol, orderId=watch['order_id'], recvWindow=6000)
+        except ClientError:
+            # Already closed (-2011); read how much it filled.
+            try:
+                entry = self.client.query_order(symbol=symbol, orderId=watch['order_id'], recvWindow=6000)
+            except ClientError as error:
+                _log_client_error(error, symbol)
+                entry = {}
+        with self._lock:
+            filled = max(float(entry.get('executedQty', 0.0)), watch['filled'])
+            qty += filled - watch['filled']
+            watch['filled'] = filled
+        for order in placed.values():
+            try:
+                self.client.cancel_order(symbol=symbol, orderId=order['orderId'], recvWindow=6000)
+            except ClientError as error:
+                _log_client_error(error, symbol)
+
+        qty_text = self._format(qty, self.symbol_registry.get_qty_precision(symbol))
+        try:
+            self.client.new_order(symbol=symbol, side=watch['exit_side'], type='MARKET', quantity=qty_text, reduceOnly='true')
+        except ClientError as error:
+            _log_client_error(error, symbol)
+            logging.critical(f"{qty_text} {symbol} is open without a stop-loss", extra={'symbol': symbol})
+            return False
+        logging.error(f"Exits for {symbol} could not be placed; closed {qty_text} at market", extra={'symbol': symbol})
+        return True
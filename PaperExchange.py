@@ -0,0 +1,365 @@
+import itertools
+import logging
+import math
+import threading
+import time
+
+from binance.error import ClientError
+
+
+def _valid(price):
+    return price is not None and not math.isnan(price) and price > 0
+
+
+class PaperPosition:
+    __slots__ = ('symbol', 'amount', 'entry_price', 'realized')
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.amount = 0.0
+        self.entry_price = 0.0
+        self.realized = 0.0
+
+    def apply_fill(self, signed_qty, price):
+        # One-way mode: fills in the position's direction average into the
+        # entry price, opposite fills realize PnL and can flip the position.
+        # Returns the realized PnL of this fill.
+        if self.amount == 0 or (self.amount > 0) == (signed_qty > 0):
+            total = self.amount + signed_qty
+            self.entry_price = (self.entry_price * abs(self.amount) + price * abs(signed_qty)) / abs(total)
+            self.amount = total
+            return 0.0
+
+        closed = min(abs(signed_qty), abs(self.amount))
+        pnl = closed * (price - self.entry_price) * (1 if self.amount > 0 else -1)
+        self.realized += pnl
+        remaining = self.amount + signed_qty
+        if abs(remaining) < 1e-12:
+            self.amount, self.entry_price = 0.0, 0.0
+        elif (remaining > 0) != (self.amount > 0):
+            self.amount, self.entry_price = remaining, price
+        else:
+            self.amount = remaining
+        return pnl
+
+
+class PaperExchange:
+    # In-memory stand-in for the UMFutures order and account endpoints the
+    # engine uses, so DRY_RUN cycles run the full loop without sending
+    # orders. Orders match against quote(symbol) -> (best bid, best ask),
+    # which the engine serves from the streamed books or the last polled
+    # snapshot. Matching happens on submission, before every account read
+    # (balance, positions, orders) and, once start_matching() is called,
+    # every `interval` seconds while orders rest:
+    #   LIMIT             BUY fills at its price once ask <= price, SELL once bid >= price
+    #                     (at the touch if already marketable on submission)
+    #   MARKET            fills at the touch
+    #   STOP_MARKET       BUY triggers at ask >= stopPrice, SELL at bid <= stopPrice
+    #   TAKE_PROFIT_MARKET BUY triggers at ask <= stopPrice, SELL at bid >= stopPrice
+    # Triggered stops fill at the touch. Like the exchange, exits without
+    # reduceOnly open a new position when there is nothing left to close; a
+    # reduceOnly order is rejected (-2022) when placed with no position it
+    # could reduce, fills at most the open position and expires if that
+    # position is gone when it triggers. Triggers are only judged at those
+    # moments: with streamed books the timer catches moves within a cycle,
+    # but a polled snapshot changes once per cycle, so a move that crosses a
+    # stop and reverses between two polls is not simulated.
+    # Responses mirror Binance's payload shapes, numbers as strings.
+    CLOSED_KEPT = 1000
+
+    def __init__(self, quote, balance=1000.0, fee_rate=0.0, asset='USDT', default_leverage=20):
+        self.quote = quote
+        self.asset = asset
+        self.fee_rate = fee_rate
+        self.default_leverage = default_leverage
+        self.wallet = float(balance)
+        self.fees = 0.0
+        self.fills = 0
+        self.positions = {}
+        self.orders = {}
+        # Filled, cancelled and expired orders, for query_order; oldest
+        # dropped past CLOSED_KEPT.
+        self.closed = {}
+        self.leverage = {}
+        self.margin_type = {}
+        self._order_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._matcher = None
+        self._stop_matching = threading.Event()
+
+    def _reject(self, code, message, status=400):
+        raise ClientError(status, code, message, {})
+
+    def _leverage(self, symbol):
+        return self.leverage.get(symbol, self.default_leverage)
+
+    def _quote(self, symbol):
+        try:
+            bid, ask = self.quote(symbol)
+        except Exception as e:
+            logging.warning(f"Paper quote for {symbol} failed: {str(e)}")
+            return None, None
+        return (bid if _valid(bid) else None), (ask if _valid(ask) else None)
+
+    def _close(self, order, status, **fields):
+        order.update(status=status, update_time=int(time.time() * 1000), **fields)
+        self.orders.pop(order['orderId'], None)
+        self.closed[order['orderId']] = order
+        if len(self.closed) > self.CLOSED_KEPT:
+            self.closed.pop(next(iter(self.closed)))
+
+    def _reduces(self, symbol, side):
+        position = self.positions.get(symbol)
+        return position is not None and position.amount != 0 and (position.amount > 0) == (side == 'SELL')
+
+    def _fill(self, order, price):
+        signed_qty = order['qty'] if order['side'] == 'BUY' else -order['qty']
+        position = self.positions.setdefault(order['symbol'], PaperPosition(order['symbol']))
+        if order['reduce_only']:
+            if not self._reduces(order['symbol'], order['side']):
+                self._close(order, 'EXPIRED')
+                return
+            signed_qty = math.copysign(min(abs(signed_qty), abs(position.amount)), signed_qty)
+            order['qty'] = abs(signed_qty)
+        fee = abs(signed_qty) * price * self.fee_rate
+        self.wallet += position.apply_fill(signed_qty, price) - fee
+        self.fees += fee
+        self.fills += 1
+        self._close(order, 'FILLED', avg_price=price)
+
+    def _match_price(self, order, bid, ask):
+        side, kind = order['side'], order['type']
+        if kind == 'LIMIT':
+            if side == 'BUY' and ask is not None and ask <= order['price']:
+                return order['price'] if order['resting'] else ask
+            if side == 'SELL' and bid is not None and bid >= order['price']:
+                return order['price'] if order['resting'] else bid
+        elif kind == 'MARKET':
+            return ask if side == 'BUY' else bid
+        elif kind == 'STOP_MARKET':
+            if side == 'BUY' and ask is not None and ask >= order['stop_price']:
+                return ask
+            if side == 'SELL' and bid is not None and bid <= order['stop_price']:
+                return bid
+        elif kind == 'TAKE_PROFIT_MARKET':
+            if side == 'BUY' and ask is not None and ask <= order['stop_price']:
+                return ask
+            if side == 'SELL' and bid is not None and bid >= order['stop_price']:
+                return bid
+        return None
+
+    def match(self, symbols=None):
+        with self._lock:
+            quotes = {}
+            for order in sorted(self.orders.values(), key=lambda order: order['orderId']):
+                symbol = order['symbol']
+                if symbols is not None and symbol not in symbols:
+                    continue
+                if symbol not in quotes:
+                    quotes[symbol] = self._quote(symbol)
+                price = self._match_price(order, *quotes[symbol])
+                if price is not None:
+                    self._fill(order, price)
+                else:
+                    order['resting'] = True
+
+    def _open_margin(self):
+        margin = 0.0
+        for position in self.positions.values():
+            if position.amount:
+                margin += abs(position.amount) * position.entry_price / self._leverage(position.symbol)
+        for order in self.orders.values():
+            if order['type'] == 'LIMIT':
+                margin += order['qty'] * order['price'] / self._leverage(order['symbol'])
+        return margin
+
+    def _unrealized(self):
+        total = 0.0
+        for position in self.positions.values():
+            if not position.amount:
+                continue
+            bid, ask = self._quote(position.symbol)
+            mark = bid if position.amount > 0 else ask
+            if mark is not None:
+                total += position.amount * (mark - position.entry_price)
+        return total
+
+    def _available(self):
+        return self.wallet + self._unrealized() - self._open_margin()
+
+    def _payload(self, order):
+        return {
+            'orderId': order['orderId'],
+            'symbol': order['symbol'],
+            'status': order['status'],
+            'side': order['side'],
+            'type': order['type'],
+            'timeInForce': order['time_in_force'],
+            'origQty': str(order['qty']),
+            'executedQty': str(order['qty'] if order['status'] == 'FILLED' else 0.0),
+            'price': str(order['price'] or 0.0),
+            'avgPrice': str(order['avg_price'] or 0.0),
+            'stopPrice': str(order['stop_price'] or 0.0),
+            'reduceOnly': order['reduce_only'],
+            'updateTime': order['update_time'],
+        }
+
+    def _place(self, symbol, side, type, quantity, price=None, stopPrice=None, timeInForce=None, reduceOnly=False):
+        side, type = side.upper(), type.upper()
+        if type not in ('LIMIT', 'MARKET', 'STOP_MARKET', 'TAKE_PROFIT_MARKET'):
+            self._reject(-1116, f"Invalid orderType: {type}.")
+        qty = float(quantity)
+        if qty <= 0:
+            self._reject(-4003, "Quantity less than or equal to zero.")
+        if type == 'LIMIT' and price is None:
+            self._reject(-1102, "Mandatory parameter 'price' was not sent, was empty/null, or malformed.")
+        if type in ('STOP_MARKET', 'TAKE_PROFIT_MARKET') and stopPrice is None:
+            self._reject(-1102, "Mandatory parameter 'stopPrice' was not sent, was empty/null, or malformed.")
+
+        order = {
+            'orderId': next(self._order_ids), 'symbol': symbol, 'side': side, 'type': type, 'qty': qty,
+            'price': float(price) if price is not None else None,
+            'stop_price': float(stopPrice) if stopPrice is not None else None,
+            'time_in_force': timeInForce or 'GTC', 'status': 'NEW', 'avg_price': None,
+            'update_time': int(time.time() * 1000), 'resting': False,
+            'reduce_only': str(reduceOnly).lower() == 'true',
+        }
+        if order['reduce_only'] and not self._reduces(symbol, side):
+            self._reject(-2022, "ReduceOnly Order is rejected.")
+        if type == 'LIMIT' and not order['reduce_only']:
+            required = qty * order['price'] / self._leverage(symbol)
+            if required > self._available():
+                self._reject(-2019, "Margin is insufficient.")
+
+        self.orders[order['orderId']] = order
+        fill_price = self._match_price(order, *self._quote(symbol))
+        if fill_price is not None:
+            self._fill(order, fill_price)
+        else:
+            order['resting'] = True
+        return self._payload(order)
+
+    def new_order(self, symbol, side, type, quantity, price=None, stopPrice=None, timeInForce=None,
+                  reduceOnly=False, **kwargs):
+        with self._lock:
+            return self._place(symbol, side, type, quantity, price, stopPrice, timeInForce, reduceOnly)
+
+    def new_batch_order(self, batchOrders, **kwargs):
+        # Per-order errors come back in the list, as the batch endpoint does.
+        results = []
+        with self._lock:
+            for params in batchOrders:
+                try:
+                    results.append(self._place(
+                        params['symbol'], params['side'], params['type'], params['quantity'],
+                        params.get('price'), params.get('stopPrice'), params.get('timeInForce'),
+                        params.get('reduceOnly', False),
+                    ))
+                except ClientError as error:
+                    results.append({'code': error.error_code, 'msg': error.error_message})
+        return results
+
+    def change_leverage(self, symbol, leverage, **kwargs):
+        with self._lock:
+            self.leverage[symbol] = int(leverage)
+        return {'symbol': symbol, 'leverage': int(leverage), 'maxNotionalValue': 'INF'}
+
+    def change_margin_type(self, symbol, marginType, **kwargs):
+        with self._lock:
+            if self.margin_type.get(symbol) == marginType:
+                self._reject(-4046, "No need to change margin type.")
+            self.margin_type[symbol] = marginType
+        return {'code': 200, 'msg': 'success'}
+
+    def balance(self, **kwargs):
+        self.match()
+        with self._lock:
+            unrealized = self._unrealized()
+            return [{
+                'asset': self.asset,
+                'balance': str(self.wallet),
+                'crossUnPnl': str(unrealized),
+                'availableBalance': str(self.wallet + unrealized - self._open_margin()),
+            }]
+
+    def get_position_risk(self, symbol=None, **kwargs):
+        self.match()
+        with self._lock:
+            result = []
+            for position in self.positions.values():
+                if symbol is not None and position.symbol != symbol:
+                    continue
+                bid, ask = self._quote(position.symbol)
+                mark = (bid if position.amount > 0 else ask) or position.entry_price
+                result.append({
+                    'symbol': position.symbol,
+                    'positionAmt': str(position.amount),
+                    'entryPrice': str(position.entry_price),
+                    'markPrice': str(mark),
+                    'unRealizedProfit': str(position.amount * (mark - position.entry_price)),
+                    'leverage': str(self._leverage(position.symbol)),
+                    'marginType': self.margin_type.get(position.symbol, 'CROSSED').lower(),
+                })
+            return result
+
+    def get_orders(self, symbol=None, **kwargs):
+        self.match()
+        with self._lock:
+            return [
+                self._payload(order) for order in self.orders.values()
+                if symbol is None or order['symbol'] == symbol
+            ]
+
+    def query_order(self, symbol, orderId, **kwargs):
+        self.match([symbol])
+        with self._lock:
+            order = self.orders.get(orderId) or self.closed.get(orderId)
+            if order is None or order['symbol'] != symbol:
+                self._reject(-2013, "Order does not exist.")
+            return self._payload(order)
+
+    def cancel_order(self, symbol, orderId, **kwargs):
+        with self._lock:
+            order = self.orders.get(orderId)
+            if order is None or order['symbol'] != symbol:
+                self._reject(-2011, "Unknown order sent.")
+            self._close(order, 'CANCELED')
+            return self._payload(order)
+
+    def cancel_open_orders(self, symbol, **kwargs):
+        with self._lock:
+            for order in [order for order in self.orders.values() if order['symbol'] == symbol]:
+                self._close(order, 'CANCELED')
+        return {'code': 200, 'msg': 'The operation of cancel all open order is done.'}
+
+    def start_matching(self, interval=1.0):
+        if self._matcher is not None or interval <= 0:
+            return
+        self._stop_matching.clear()
+        self._matcher = threading.Thread(target=self._match_loop, args=(interval,), name="paper-matcher", daemon=True)
+        self._matcher.start()
+
+    def stop_matching(self):
+        self._stop_matching.set()
+        if self._matcher is not None:
+            self._matcher.join(timeout=5)
+            self._matcher = None
+
+    def _match_loop(self, interval):
+        while not self._stop_matching.wait(interval):
+            if self.orders:
+                try:
+                    self.match()
+                except Exception as e:
+                    logging.error(f"Paper matching failed: {str(e)}")
+
+    def status(self):
+        with self._lock:
+            return {
+                'wallet_balance': self.wallet,
+                'unrealized_pnl': self._unrealized(),
+                'fees': self.fees,
+                'fills': self.fills,
+                'open_orders': len(self.orders),
+                'open_positions': sum(1 for position in self.positions.values() if position.amount),
+            }
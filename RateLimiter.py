@@ -0,0 +1,159 @@
+import threading
+import time
+
+
+# Request weights for the USDⓈ-M futures REST endpoints the engine calls.
+# depth and klines are priced by the requested limit.
+def depth_weight(limit=500):
+    if limit <= 50:
+        return 2
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 10
+    return 20
+
+
+def klines_weight(limit=500):
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+# Lower runs first. Orders and cancels may also spend the reserve that
+# the other classes leave untouched.
+PRIORITY_ORDER = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_DATA = 2
+PRIORITIES = (PRIORITY_ORDER, PRIORITY_ACCOUNT, PRIORITY_DATA)
+
+ORDER_ENDPOINTS = {
+    'new_order', 'new_batch_order', 'cancel_order', 'cancel_open_orders', 'cancel_batch_order',
+    'change_leverage', 'change_margin_type',
+}
+ACCOUNT_ENDPOINTS = {
+    'balance', 'account', 'get_position_risk', 'get_orders', 'get_all_orders', 'query_order',
+    'new_listen_key', 'renew_listen_key', 'close_listen_key',
+}
+
+# (weight with a symbol, weight without one) for endpoints priced that way.
+SYMBOL_WEIGHTS = {
+    'ticker_24hr_price_change': (1, 40),
+    'book_ticker': (2, 5),
+    'ticker_price': (1, 2),
+    'get_orders': (1, 40),
+}
+FIXED_WEIGHTS = {
+    'balance': 5,
+    'account': 5,
+    'get_position_risk': 5,
+    'new_batch_order': 5,
+    'get_all_orders': 5,
+}
+
+
+def request_weight(endpoint, args=(), kwargs=None):
+    kwargs = kwargs or {}
+    if endpoint == 'depth':
+        return depth_weight(int(kwargs.get('limit', 500)))
+    if endpoint == 'klines':
+        return klines_weight(int(kwargs.get('limit', 500)))
+    if endpoint in SYMBOL_WEIGHTS:
+        with_symbol, without_symbol = SYMBOL_WEIGHTS[endpoint]
+        return with_symbol if (args or kwargs.get('symbol')) else without_symbol
+    return FIXED_WEIGHTS.get(endpoint, 1)
+
+
+def request_priority(endpoint):
+    if endpoint in ORDER_ENDPOINTS:
+        return PRIORITY_ORDER
+    if endpoint in ACCOUNT_ENDPOINTS:
+        return PRIORITY_ACCOUNT
+    return PRIORITY_DATA
+
+
+class WeightLimiter:
+    # Token bucket holding up to `weight_per_minute` tokens, refilled at
+    # `weight_per_minute` per minute. That bounds the sustained rate; a full
+    # bucket plus a minute of refill can spend close to twice the budget in
+    # one rolling minute, which observe_used_weight() reins in against the
+    # exchange's own count before `ip_limit` is reached. Waiters are served by
+    # priority, and everything but PRIORITY_ORDER stops short of the last
+    # `reserve` tokens so orders still go out while data calls are
+    # throttled. observe_used_weight() folds in the exchange's own
+    # X-MBX-USED-WEIGHT-1M count, which also covers weight spent by other
+    # processes on the same IP; pause() holds every caller after a 429/418.
+    def __init__(self, weight_per_minute=2000, ip_limit=2400, reserve_fraction=0.1):
+        self.capacity = float(weight_per_minute)
+        self.tokens = self.capacity
+        self.refill_rate = self.capacity / 60.0
+        self.ip_limit = ip_limit
+        self.reserve = self.capacity * reserve_fraction
+        self.paused_until = 0.0
+        self.updated_at = time.monotonic()
+        self.waiting = {priority: 0 for priority in PRIORITIES}
+        self.condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def acquire(self, weight=1, timeout=None, priority=PRIORITY_DATA):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        floor = 0.0 if priority == PRIORITY_ORDER else self.reserve
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    self._refill()
+                    now = time.monotonic()
+                    ahead = any(self.waiting[p] for p in PRIORITIES if p < priority)
+                    if now < self.paused_until:
+                        wait = self.paused_until - now
+                    elif ahead:
+                        wait = 0.05
+                    elif self.tokens - weight >= floor or (self.tokens >= self.capacity and weight > self.capacity - floor):
+                        self.tokens -= weight
+                        self.condition.notify_all()
+                        return True
+                    else:
+                        wait = (weight + floor - self.tokens) / self.refill_rate
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self.condition.wait(wait)
+            finally:
+                self.waiting[priority] -= 1
+
+    def available(self):
+        with self.condition:
+            self._refill()
+            return self.tokens
+
+    def observe_used_weight(self, used_weight):
+        # The exchange's window resets on the minute; once it is exhausted
+        # nothing is sent until then.
+        remaining = self.ip_limit - used_weight
+        with self.condition:
+            self._refill()
+            self.tokens = min(self.tokens, max(remaining, 0))
+            if remaining <= 0:
+                self.paused_until = max(self.paused_until, time.monotonic() + 60 - time.time() % 60)
+            self.condition.notify_all()
+
+    def pause(self, seconds):
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated_at = time.monotonic()
+            self.condition.notify_all()
+
+    def paused_for(self):
+        return max(self.paused_until - time.monotonic(), 0.0)
@@ -0,0 +1,96 @@
+import logging
+import math
+import threading
+import time
+
+
+class EngineScheduler:
+    # Runs engine.run_cycle() on a background thread every CYCLE_INTERVAL
+    # seconds, optionally aligned to bar closes (e.g. every 15m boundary plus
+    # BAR_CLOSE_DELAY). When a cycle overruns its next trigger, OVERLAP_POLICY
+    # decides what happens to the missed triggers: "skip" drops them and
+    # waits for the next boundary, "coalesce" folds them into one immediate
+    # cycle.
+    def __init__(self, engine):
+        self.engine = engine
+        self.thread = None
+        self.next_run_at = None
+        self.skipped = 0
+        self.coalesced = 0
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive() and not self._stop.is_set()
+
+    def _settings(self):
+        config = self.engine.config
+        interval = max(float(config.get("CYCLE_INTERVAL", 900)), 1.0)
+        align = bool(config.get("ALIGN_TO_BAR_CLOSE", True))
+        delay = float(config.get("BAR_CLOSE_DELAY", 2))
+        policy = str(config.get("OVERLAP_POLICY", "skip"))
+        return interval, align, delay, policy
+
+    def _next_trigger(self, after, interval, align, delay):
+        if align:
+            return math.floor((after - delay) / interval + 1) * interval + delay
+        return after + interval
+
+    def start(self):
+        if self.running:
+            return False
+        # Each loop gets its own event: a loop stopped while still inside
+        # run_cycle() exits when that cycle returns, even if a new one has
+        # been started meanwhile, and never writes the new loop's state.
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._loop, args=(self._stop,), name="engine-scheduler", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, stop):
+        interval, align, delay, _ = self._settings()
+        # The first cycle runs straight away; later ones follow the cadence.
+        self.next_run_at = time.time()
+        logging.info(f"Scheduler started: interval {interval}s, aligned to bar close: {align}")
+
+        while not stop.is_set():
+            wait = self.next_run_at - time.time()
+            if wait > 0 and stop.wait(wait):
+                break
+
+            planned = self.next_run_at
+            try:
+                self.engine.run_cycle()
+            except Exception as e:
+                logging.error(f"Scheduled cycle failed: {str(e)}")
+
+            interval, align, delay, policy = self._settings()
+            now = time.time()
+            next_run = self._next_trigger(planned, interval, align, delay)
+            if next_run <= now:
+                missed = int((now - next_run) // interval) + 1
+                if policy == "coalesce":
+                    self.coalesced += missed
+                    logging.warning(f"Cycle overran by {now - next_run:.1f}s, coalescing {missed} missed trigger(s)")
+                    next_run = now
+                else:
+                    self.skipped += missed
+                    logging.warning(f"Cycle overran by {now - next_run:.1f}s, skipping {missed} trigger(s)")
+                    next_run = self._next_trigger(now, interval, align, delay)
+            if not stop.is_set():
+                self.next_run_at = next_run
+
+        if stop is self._stop:
+            self.next_run_at = None
+        logging.info("Scheduler stopped")
+
+    def status(self):
+        return {
+            'running': self.running,
+            'next_run_at': self.next_run_at,
+            'skipped': self.skipped,
+            'coalesced': self.coalesced,
+        }
@@ -0,0 +1,195 @@
+import logging
+import multiprocessing
+import queue
+import time
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+# market_state fields, one row each in the shared block: block[field, slot].
+SHARED_FIELDS = ('price', 'volume', 'spread', 'liquidity')
+
+
+def shard_of(symbol, shards):
+    # Stable across cycles and restarts, so a symbol keeps hitting the same
+    # worker's kline cache and indicator state.
+    return zlib.crc32(symbol.encode()) % shards
+
+
+def weight_share(config, shards):
+    # Request weight per minute for the coordinator and for each of its
+    # `shards` workers: the one REQUEST_WEIGHT_PER_MINUTE budget split
+    # evenly between all of them.
+    return max(int(config.get("REQUEST_WEIGHT_PER_MINUTE", 2000)) // (shards + 1), 1)
+
+
+def _attach(name):
+    block = shared_memory.SharedMemory(name=name)
+    # The coordinator owns the block; without this the worker's resource
+    # tracker would unlink it when the worker exits.
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+def _shard_main(index, config, tasks, results):
+    # Worker process: a shard-role engine that only fetches klines/depth and
+    # computes metrics for the symbols it is handed each cycle.
+    from BinanceQuantTradingEngine import BinanceQuantTradingEngine
+
+    engine = BinanceQuantTradingEngine(config, role="shard")
+    block = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        cycle, name, capacity, rows = task
+        started = time.perf_counter()
+        try:
+            if block is None or block.name != name:
+                if block is not None:
+                    block.close()
+                block = _attach(name)
+            view = np.ndarray((len(SHARED_FIELDS), capacity), dtype=np.float64, buffer=block.buf)
+            engine.market_state = {
+                symbol: {field: float(view[i, slot]) for i, field in enumerate(SHARED_FIELDS)}
+                for symbol, slot in rows
+            }
+            del view
+            engine._calculate_market_metrics()
+            results.put((index, cycle, {
+                'metrics': list(engine.market_metrics.values()),
+                'trend_scores': engine.trend_scores,
+                'fetch_latency': engine.fetch_latency,
+                'duration': time.perf_counter() - started,
+            }, None))
+        except Exception as e:
+            results.put((index, cycle, None, str(e)))
+
+    if block is not None:
+        block.close()
+    engine.close()
+
+
+class ShardCoordinator:
+    # Splits each cycle's market_state across SHARDS worker processes. The
+    # selected rows go into one shared-memory float block and each worker
+    # gets only (symbol, slot) pairs, so the snapshot itself is never
+    # pickled. Workers return their PairMetrics, trend scores and fetch
+    # latencies; trading, risk limits and order placement stay with the
+    # coordinating engine. Request weight is split evenly between the
+    # coordinator and the workers: see weight_share(), which the
+    # coordinator's own MarketData is built with too.
+    def __init__(self, config, shards):
+        self.shards = shards
+        self.config = config
+        self.processes = []
+        self.tasks = []
+        self.results = None
+        self.block = None
+        self.capacity = 0
+        self.cycle = 0
+        self.shard_timings = {}
+
+    def _worker_config(self):
+        config = dict(self.config)
+        config["REQUEST_WEIGHT_PER_MINUTE"] = weight_share(self.config, self.shards)
+        config["FETCH_WORKERS"] = max(int(config.get("FETCH_WORKERS", 8)) // self.shards, 1)
+        return config
+
+    @property
+    def running(self):
+        return bool(self.processes) and all(process.is_alive() for process in self.processes)
+
+    def start(self):
+        if self.running:
+            return
+        self.stop()
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+        self.tasks = [context.Queue() for _ in range(self.shards)]
+        config = self._worker_config()
+        self.processes = [
+            context.Process(target=_shard_main, args=(index, config, self.tasks[index], self.results),
+                            name=f"engine-shard-{index}", daemon=True)
+            for index in range(self.shards)
+        ]
+        for process in self.processes:
+            process.start()
+        logging.info(f"Started {self.shards} engine shards")
+
+    def stop(self):
+        for task_queue, process in zip(self.tasks, self.processes):
+            if process.is_alive():
+                task_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.processes, self.tasks = [], []
+        self._release_block()
+
+    def _release_block(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block, self.capacity = None, 0
+
+    def _publish(self, market_state):
+        # Writes market_state into the shared block, reallocating it (with
+        # headroom) only when the universe outgrows it.
+        needed = max(len(market_state), 1)
+        if needed > self.capacity:
+            self._release_block()
+            self.capacity = max(needed, 2 * self.capacity, 64)
+            self.block = shared_memory.SharedMemory(create=True, size=len(SHARED_FIELDS) * self.capacity * 8)
+        view = np.ndarray((len(SHARED_FIELDS), self.capacity), dtype=np.float64, buffer=self.block.buf)
+        rows = []
+        for slot, (symbol, data) in enumerate(market_state.items()):
+            for i, field in enumerate(SHARED_FIELDS):
+                view[i, slot] = data[field]
+            rows.append((symbol, slot))
+        del view
+        return rows
+
+    def compute(self, market_state, timeout=120):
+        # (PairMetrics list, trend scores, fetch latency) for the whole universe.
+        # A shard that fails or times out only loses its own symbols.
+        self.start()
+        self.cycle += 1
+        rows = self._publish(market_state)
+        assigned = [[] for _ in range(self.shards)]
+        for symbol, slot in rows:
+            assigned[shard_of(symbol, self.shards)].append((symbol, slot))
+
+        pending = set()
+        for index, shard_rows in enumerate(assigned):
+            if shard_rows:
+                self.tasks[index].put((self.cycle, self.block.name, self.capacity, shard_rows))
+                pending.add(index)
+
+        metrics, trend_scores, fetch_latency = [], {}, {}
+        deadline = time.monotonic() + timeout
+        self.shard_timings = {}
+        while pending:
+            try:
+                index, cycle, result, error = self.results.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                logging.error(f"Shards {sorted(pending)} timed out after {timeout}s")
+                break
+            if cycle != self.cycle:
+                continue
+            pending.discard(index)
+            if error is not None:
+                logging.error(f"Shard {index} failed: {error}")
+                continue
+            metrics.extend(result['metrics'])
+            trend_scores.update(result['trend_scores'])
+            fetch_latency.update(result['fetch_latency'])
+            self.shard_timings[index] = result['duration']
+
+        # Keep the market_state (SORTBY) order the strategy loop expects.
+        order = {symbol: slot for symbol, slot in rows}
+        metrics.sort(key=lambda row: order.get(row.pair, len(order)))
+        return metrics, trend_scores, fetch_latency
@@ -0,0 +1,203 @@
+import numpy as np
+from scipy.signal import lfilter
+
+
+# Batch versions of the indicators _analyze_trend used to compute per pair
+# with TA-Lib. Every function takes (symbols x bars) arrays and reproduces
+# TA-Lib's seeding, so the last column matches talib on each row. The
+# Wilder/EMA recursions are linear filters and run through lfilter along
+# the bar axis instead of a Python loop.
+
+SMA_FAST = 20
+SMA_SLOW = 50
+RSI_PERIOD = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+ADX_PERIOD = 14
+
+# Bars before the first row on which every indicator is defined (SMA50),
+# and the minimum history _analyze_trend required: 50 bars plus 20 rows
+# left after dropping the indicator warm-up.
+WARMUP = SMA_SLOW - 1
+MIN_BARS = WARMUP + 20
+
+
+def _recursive(x, seed, start, decay, gain):
+    # y[start] = seed; y[t] = decay * y[t-1] + gain * x[t] for t > start.
+    out = np.full(x.shape, np.nan)
+    out[:, start] = seed
+    if start + 1 < x.shape[1]:
+        out[:, start + 1:] = lfilter([gain], [1.0, -decay], x[:, start + 1:], axis=1, zi=(decay * seed)[:, None])[0]
+    return out
+
+
+def sma(x, period):
+    out = np.full(x.shape, np.nan)
+    csum = np.cumsum(x, axis=1)
+    out[:, period - 1] = csum[:, period - 1]
+    out[:, period:] = csum[:, period:] - csum[:, :-period]
+    out[:, period - 1:] /= period
+    return out
+
+
+def ema(x, period, start=None):
+    # TA-Lib seeds the EMA with the simple average of the `period` values
+    # ending at `start` (default: the first possible bar).
+    if start is None:
+        start = period - 1
+    k = 2.0 / (period + 1)
+    seed = x[:, start - period + 1:start + 1].mean(axis=1)
+    return _recursive(x, seed, start, 1.0 - k, k)
+
+
+def rsi(close, period=RSI_PERIOD):
+    delta = np.diff(close, axis=1)
+    gain = np.concatenate((np.zeros((close.shape[0], 1)), np.where(delta > 0, delta, 0.0)), axis=1)
+    loss = np.concatenate((np.zeros((close.shape[0], 1)), np.where(delta < 0, -delta, 0.0)), axis=1)
+
+    decay, weight = (period - 1) / period, 1.0 / period
+    avg_gain = _recursive(gain, gain[:, 1:period + 1].mean(axis=1), period, decay, weight)
+    avg_loss = _recursive(loss, loss[:, 1:period + 1].mean(axis=1), period, decay, weight)
+
+    total = avg_gain + avg_loss
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(np.abs(total) < 1e-8, 0.0, 100.0 * avg_gain / total)
+
+
+def macd(close, fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL):
+    start = slow - 1
+    line = ema(close, fast, start) - ema(close, slow, start)
+    signal_line = np.full(close.shape, np.nan)
+    signal_line[:, start:] = ema(line[:, start:], signal)
+    line[:, :start + signal - 1] = np.nan
+    return line, signal_line
+
+
+def adx(high, low, close, period=ADX_PERIOD):
+    rows, bars = close.shape
+    diff_plus = np.zeros((rows, bars))
+    diff_minus = np.zeros((rows, bars))
+    diff_plus[:, 1:] = high[:, 1:] - high[:, :-1]
+    diff_minus[:, 1:] = low[:, :-1] - low[:, 1:]
+
+    minus_dm = np.where((diff_minus > 0) & (diff_plus < diff_minus), diff_minus, 0.0)
+    plus_dm = np.where((diff_plus > 0) & (diff_plus > diff_minus), diff_plus, 0.0)
+
+    true_range = np.zeros((rows, bars))
+    prev_close = close[:, :-1]
+    true_range[:, 1:] = np.maximum(
+        high[:, 1:] - low[:, 1:],
+        np.maximum(np.abs(high[:, 1:] - prev_close), np.abs(low[:, 1:] - prev_close)),
+    )
+
+    # Wilder sums seeded with the plain sum of the first period-1 moves.
+    seed_idx = period - 1
+    decay = 1.0 - 1.0 / period
+    smooth_plus = _recursive(plus_dm, plus_dm[:, 1:period].sum(axis=1), seed_idx, decay, 1.0)
+    smooth_minus = _recursive(minus_dm, minus_dm[:, 1:period].sum(axis=1), seed_idx, decay, 1.0)
+    smooth_tr = _recursive(true_range, true_range[:, 1:period].sum(axis=1), seed_idx, decay, 1.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        plus_di = 100.0 * smooth_plus / smooth_tr
+        minus_di = 100.0 * smooth_minus / smooth_tr
+        di_sum = plus_di + minus_di
+        dx = np.where(np.abs(di_sum) < 1e-8, 0.0, 100.0 * np.abs(minus_di - plus_di) / di_sum)
+    dx = np.where(np.abs(smooth_tr) < 1e-8, 0.0, dx)
+
+    first = 2 * period - 1
+    seed = dx[:, period:first + 1].mean(axis=1)
+    return _recursive(dx, seed, first, (period - 1) / period, 1.0 / period)
+
+
+def trend_score_series(close, high, low):
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+
+    sma_fast = sma(close, SMA_FAST)
+    sma_slow = sma(close, SMA_SLOW)
+    rsi_line = rsi(close)
+    macd_line, macd_signal = macd(close)
+    adx_line = adx(high, low, close)
+
+    score = np.where(sma_fast > sma_slow, 1, -1)
+    score += np.where(close > sma_fast, 1, -1)
+    score += np.where(macd_line > macd_signal, 1, -1)
+    score += np.where(rsi_line > 55, 1, 0)
+    score += np.where(rsi_line < 45, -1, 0)
+    score = score + np.where(adx_line > 25, np.sign(sma_fast - sma_slow), 0)
+
+    normalized = np.clip(score / 5.0, -1, 1)
+    normalized[:, :WARMUP] = np.nan
+    return normalized
+
+
+def trend_scores(close, high, low):
+    # Score of the latest bar for every row; rows that _analyze_trend would
+    # have rejected (short history, non-positive prices) score 0.0.
+    close = np.asarray(close, dtype=np.float64)
+    if close.ndim != 2 or close.shape[1] < MIN_BARS:
+        return np.zeros(close.shape[0] if close.ndim == 2 else 0)
+
+    scores = trend_score_series(close, high, low)[:, -1]
+    scores[(close <= 0).any(axis=1)] = 0.0
+    return np.nan_to_num(scores)
+
+
+def trend_scores_by_symbol(bars_by_symbol):
+    # Symbols are grouped by history length so each group is a dense 2-D
+    # block; in practice nearly every symbol has the full kline limit.
+    groups = {}
+    for symbol, bars in bars_by_symbol.items():
+        if bars is not None:
+            groups.setdefault(len(bars), []).append(symbol)
+
+    scores = {}
+    for length, symbols in groups.items():
+        if length < MIN_BARS:
+            scores.update({symbol: 0.0 for symbol in symbols})
+            continue
+        close = np.vstack([bars_by_symbol[symbol]['close'] for symbol in symbols])
+        high = np.vstack([bars_by_symbol[symbol]['high'] for symbol in symbols])
+        low = np.vstack([bars_by_symbol[symbol]['low'] for symbol in symbols])
+        for symbol, score in zip(symbols, trend_scores(close, high, low)):
+            scores[symbol] = float(score)
+    return scores
+
+
+def reference_trend_score(bars):
+    # The original per-pair pandas/TA-Lib implementation, kept as the parity
+    # reference for the batch engine.
+    import pandas as pd
+    import talib
+
+    if bars is None or len(bars) < 50:
+        return 0.0
+
+    df = pd.DataFrame({column: bars[column] for column in ('open', 'high', 'low', 'close', 'volume')})
+    if df['close'].min() <= 0:
+        return 0.0
+
+    df['returns'] = np.log(df['close']).diff().fillna(0)
+    df['SMA20'] = talib.SMA(df['close'], 20)
+    df['SMA50'] = talib.SMA(df['close'], 50)
+    df['RSI'] = talib.RSI(df['close'], 14)
+    df['MACD'], df['MACD_Signal'], _ = talib.MACD(df['close'])
+    df['ADX'] = talib.ADX(df['high'], df['low'], df['close'], 14)
+    df.dropna(inplace=True)
+    if len(df) < 20:
+        return 0.0
+
+    score = pd.Series(0, index=df.index)
+    score += np.where(df['SMA20'] > df['SMA50'], 1, -1)
+    score += np.where(df['close'] > df['SMA20'], 1, -1)
+    score += np.where(df['MACD'] > df['MACD_Signal'], 1, -1)
+    score += np.where(df['RSI'] > 55, 1, 0)
+    score += np.where(df['RSI'] < 45, -1, 0)
+
+    adx_trend_direction = np.sign(df['SMA20'] - df['SMA50'])
+    score += np.where(df['ADX'] > 25, adx_trend_direction, 0)
+
+    normalized_trend = np.clip(score / 5.0, -1, 1)
+    return normalized_trend.iloc[-1]
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+# Entry, risk and sizing rules shared by the live engine and the backtester.
+# The checks use NumPy operators, so they take a scalar for one pair or an
+# array for a whole (symbols x bars) block.
+
+SIGNAL_THRESHOLD = 0.6
+MAX_VOLATILITY = 1.3
+MAX_SPREAD_RATIO = 0.1
+FIXED_POSITION_SIZE = 0.1
+
+
+def signal_direction(trend_strength):
+    # 1 = BUY, -1 = SELL, 0 = no clear signal.
+    trend_strength = np.asarray(trend_strength)
+    return np.where(trend_strength > SIGNAL_THRESHOLD, 1, np.where(trend_strength < -SIGNAL_THRESHOLD, -1, 0))
+
+
+def volatility_ok(volatility):
+    return np.logical_not(np.asarray(volatility) > MAX_VOLATILITY)
+
+
+def spread_ok(spread, price):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.logical_not(np.asarray(spread) / price > MAX_SPREAD_RATIO)
+
+
+def position_size(balance, price, volatility, liquidity, trend_strength, risk_reward_ratio, max_portfolio_risk):
+    # Kelly-scaled quantity, shrunk when top-of-book liquidity is thin or
+    # volatility is high; element-wise for arrays of pairs. Callers handle
+    # DYNAMIC_POSITION_SIZING = False.
+    if balance <= 0:
+        return np.zeros(np.shape(price))[()]
+
+    win_prob = np.maximum(0.55, np.abs(trend_strength))
+    kelly_fraction = (win_prob * (risk_reward_ratio + 1) - 1) / risk_reward_ratio
+    risk_capital = balance * max_portfolio_risk * kelly_fraction
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        liquidity_factor = np.where(risk_capital != 0, np.minimum(liquidity / (risk_capital * 2), 1), 0)
+        volatility_factor = np.where(volatility != 0, 1 / (1 + volatility), 1)
+        return (risk_capital * liquidity_factor * volatility_factor / price)[()]
+
+
+def entry_price(side, best_bid, best_ask, spread_adjustment):
+    # Passive LIMIT price: below the bid for buys, above the ask for sells.
+    if side.upper() == 'BUY':
+        return best_bid * (1 - spread_adjustment)
+    return best_ask * (1 + spread_adjustment)
+
+
+def bracket_prices(side, price, sl, tp):
+    # (stop-loss, take-profit) trigger prices for an entry at `price`.
+    if side.upper() == 'BUY':
+        return price - price * sl, price + price * tp
+    return price + price * sl, price - price * tp
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+
+from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
+
+
+class StreamConnection:
+    # Shared connect / watchdog / reconnect handling for the WebSocket
+    # components. Subclasses implement handle_message() and subscribe in
+    # on_connected(); on_reconnected() is where they resync from REST.
+    def __init__(self, stream_url="wss://fstream.binance.com", stale_after=30, name="stream"):
+        self.stream_url = stream_url
+        self.stale_after = stale_after
+        self.name = name
+
+        self.connected = False
+        self.running = False
+        self.last_message_at = 0.0
+        self.reconnects = 0
+
+        self._ws = None
+        self._watchdog = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._connect()
+        self._watchdog = threading.Thread(target=self._watch, name=f"{self.name}-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self.running = False
+        self._disconnect()
+
+    def is_live(self):
+        return self.connected and time.monotonic() - self.last_message_at < self.stale_after
+
+    def mark_alive(self):
+        self.last_message_at = time.monotonic()
+
+    def handle_message(self, raw):
+        raise NotImplementedError
+
+    def on_connected(self, ws):
+        pass
+
+    def on_reconnected(self):
+        pass
+
+    def _on_message(self, _, raw):
+        try:
+            self.handle_message(raw)
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Malformed {self.name} message: {str(e)}")
+
+    def _is_current(self, manager):
+        ws = self._ws
+        return ws is not None and ws.socket_manager is manager
+
+    def _on_close(self, manager):
+        if self._is_current(manager):
+            self.connected = False
+        logging.warning(f"{self.name} connection closed")
+
+    def _on_error(self, manager, error):
+        if self._is_current(manager):
+            self.connected = False
+        logging.error(f"{self.name} error: {str(error)}")
+
+    def _connect(self):
+        try:
+            self._ws = UMFuturesWebsocketClient(
+                stream_url=self.stream_url,
+                on_message=self._on_message,
+                on_close=self._on_close,
+                on_error=self._on_error,
+            )
+            # Marked connected before subscribing: a close that arrives while
+            # on_connected() runs must not be overwritten afterwards.
+            self.connected = True
+            self.mark_alive()
+            self.on_connected(self._ws)
+            return True
+        except Exception as e:
+            logging.error(f"{self.name} connect failed: {str(e)}")
+            self.connected = False
+            return False
+
+    def _disconnect(self):
+        with self._lock:
+            ws, self._ws = self._ws, None
+        self.connected = False
+        if ws is None:
+            return
+        manager = ws.socket_manager
+        try:
+            manager.close()
+            manager.join(timeout=5)
+            if manager.is_alive():
+                manager.ws.shutdown()
+        except Exception as e:
+            logging.warning(f"{self.name} close failed: {str(e)}")
+
+    def _watch(self):
+        backoff = 1
+        while self.running:
+            time.sleep(1)
+            if not self.running or self.is_live():
+                if self.connected:
+                    backoff = 1
+                continue
+
+            logging.warning(f"{self.name} stale or disconnected, reconnecting")
+            self._disconnect()
+            if self._connect():
+                self.reconnects += 1
+                self.on_reconnected()
+                backoff = 1
+            else:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import json
+import logging
+import threading
+
+import websockets
+
+
+class StreamReplay:
+    # Local WebSocket server that plays back a recording made with
+    # STREAM_RECORD_PATH (one raw message per line), so MARKET_DATA_MODE =
+    # "stream" can run against STREAM_URL = replay.url without Binance. It
+    # answers SUBSCRIBE/UNSUBSCRIBE requests like the exchange and starts
+    # sending once the first subscription arrives; every connection replays
+    # the recording from the start, `interval` seconds apart. With
+    # `close_after` set, the first connection is dropped after that many
+    # messages to exercise the reconnect and resync path.
+    def __init__(self, messages, host="127.0.0.1", port=0, interval=0.0, close_after=None):
+        self.messages = list(messages)
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.close_after = close_after
+        self.connections = 0
+        self.sent = 0
+        self.subscriptions = []
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as recording:
+            return cls((line.rstrip("\n") for line in recording if line.strip()), **kwargs)
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def _handle(self, websocket):
+        self.connections += 1
+        drop_after = self.close_after if self.connections == 1 else None
+        subscribed = asyncio.Event()
+
+        async def requests():
+            async for raw in websocket:
+                request = json.loads(raw)
+                if request.get('method') == 'SUBSCRIBE':
+                    self.subscriptions.extend(request.get('params') or [])
+                    subscribed.set()
+                await websocket.send(json.dumps({'result': None, 'id': request.get('id')}))
+
+        reader = asyncio.ensure_future(requests())
+        try:
+            await subscribed.wait()
+            for count, message in enumerate(self.messages, 1):
+                await websocket.send(message)
+                self.sent += 1
+                if drop_after is not None and count >= drop_after:
+                    return
+                await asyncio.sleep(self.interval)
+            await reader
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            reader.cancel()
+
+    async def _serve(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        await self._server.wait_closed()
+
+    def start(self):
+        # Serves on a background thread; returns the URL to connect to.
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_until_complete, args=(self._serve(),), name="stream-replay", daemon=True,
+        )
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded market stream on a local WebSocket server")
+    parser.add_argument("recording", help="file written through STREAM_RECORD_PATH")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between messages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    replay = StreamReplay.from_file(args.recording, host=args.host, port=args.port, interval=args.interval)
+    logging.info(f"Replaying {len(replay.messages)} messages on {replay.start()} (set STREAM_URL to it)")
+    try:
+        replay._thread.join()
+    except KeyboardInterrupt:
+        replay.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+from binance.error import ClientError
+
+
+class SymbolInfo:
+    __slots__ = (
+        'symbol', 'quote_asset', 'status', 'price_precision', 'qty_precision',
+        'tick_size', 'step_size', 'min_qty', 'max_qty', 'min_notional', 'max_leverage',
+    )
+
+    def __init__(self, symbol, quote_asset, status, price_precision, qty_precision,
+                 tick_size, step_size, min_qty, max_qty, min_notional, max_leverage=None):
+        self.symbol = symbol
+        self.quote_asset = quote_asset
+        self.status = status
+        self.price_precision = price_precision
+        self.qty_precision = qty_precision
+        self.tick_size = tick_size
+        self.step_size = step_size
+        self.min_qty = min_qty
+        self.max_qty = max_qty
+        self.min_notional = min_notional
+        self.max_leverage = max_leverage
+
+    @classmethod
+    def from_exchange_info(cls, elem):
+        filters = {f['filterType']: f for f in elem.get('filters', [])}
+        price_filter = filters.get('PRICE_FILTER', {})
+        lot_size = filters.get('LOT_SIZE', {})
+        min_notional = filters.get('MIN_NOTIONAL', {})
+
+        return cls(
+            symbol=elem['symbol'],
+            quote_asset=elem.get('quoteAsset'),
+            status=elem.get('status'),
+            price_precision=int(elem['pricePrecision']),
+            qty_precision=int(elem['quantityPrecision']),
+            tick_size=Decimal(price_filter.get('tickSize', '0')),
+            step_size=Decimal(lot_size.get('stepSize', '0')),
+            min_qty=float(lot_size.get('minQty', 0)),
+            max_qty=float(lot_size.get('maxQty', 0)) or None,
+            min_notional=float(min_notional.get('notional', 5)),
+        )
+
+
+class SymbolRegistry:
+    # exchange_info() is a multi-megabyte payload, so it is pulled once and
+    # served from memory until the TTL expires or refresh() is called. One
+    # thread downloads at a time; while it does, the others keep serving the
+    # stale table (they only wait when nothing is loaded yet). peek() never
+    # touches the network and refreshes a stale table in the background.
+    RETRY_INTERVAL = 60
+
+    def __init__(self, client, ttl=3600):
+        self.client = client
+        self.ttl = ttl
+        self._symbols = {}
+        self._loaded_at = 0.0
+        self._last_attempt = 0.0
+        self._leverage_loaded = False
+        self._leverage_retry_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._background = None
+
+    def refresh(self):
+        with self._refresh_lock:
+            return self._download()
+
+    def _download(self):
+        self._last_attempt = time.monotonic()
+        try:
+            resp = self.client.exchange_info()['symbols']
+        except ClientError as error:
+            logging.warning(
+                "Found error. status: {}, error code: {}, error message: {}".format(
+                    error.status_code, error.error_code, error.error_message
+                )
+            )
+            return False
+        except Exception as e:
+            logging.error(f"Exchange info refresh failed: {str(e)}")
+            return False
+
+        symbols = {}
+        for elem in resp:
+            try:
+                info = SymbolInfo.from_exchange_info(elem)
+            except (KeyError, ValueError) as e:
+                logging.warning(f"Skipping malformed exchange info for {elem.get('symbol')}: {str(e)}")
+                continue
+            previous = self._symbols.get(info.symbol)
+            if previous is not None:
+                info.max_leverage = previous.max_leverage
+            symbols[info.symbol] = info
+
+        with self._lock:
+            self._symbols = symbols
+            self._loaded_at = time.monotonic()
+            # Brackets are reloaded with the next lookup, so newly listed
+            # symbols get their cap too.
+            self._leverage_loaded = False
+        logging.info(f"Symbol registry loaded: {len(symbols)} symbols")
+        return True
+
+    def _stale(self):
+        now = time.monotonic()
+        if self._symbols and now - self._loaded_at <= self.ttl:
+            return False
+        return now - self._last_attempt >= self.RETRY_INTERVAL
+
+    def _ensure_fresh(self):
+        if not self._stale():
+            return
+        if not self._refresh_lock.acquire(blocking=not self._symbols):
+            return
+        try:
+            # Another thread may have finished while this one waited.
+            if self._stale():
+                self._download()
+        finally:
+            self._refresh_lock.release()
+
+    def get(self, symbol):
+        self._ensure_fresh()
+        return self._symbols.get(symbol)
+
+    def peek(self, symbol):
+        if self._stale() and not self._refresh_lock.locked():
+            background = self._background
+            if background is None or not background.is_alive():
+                self._background = threading.Thread(
+                    target=self._ensure_fresh, name="symbol-registry-refresh", daemon=True,
+                )
+                self._background.start()
+        return self._symbols.get(symbol)
+
+    def __contains__(self, symbol):
+        return self.get(symbol) is not None
+
+    def symbols(self):
+        self._ensure_fresh()
+        return self._symbols
+
+    def get_price_precision(self, symbol):
+        info = self.get(symbol)
+        return info.price_precision if info else None
+
+    def get_qty_precision(self, symbol):
+        info = self.get(symbol)
+        return info.qty_precision if info else None
+
+    def get_min_notional(self, symbol, default=5.0):
+        info = self.get(symbol)
+        return info.min_notional if info else default
+
+    def get_min_qty(self, symbol, default=0.0):
+        info = self.get(symbol)
+        return info.min_qty if info else default
+
+    def get_max_leverage(self, symbol):
+        info = self.get(symbol)
+        if info is None:
+            return None
+        if not self._leverage_loaded and time.monotonic() >= self._leverage_retry_at:
+            self._load_leverage_brackets()
+        return info.max_leverage
+
+    def _load_leverage_brackets(self):
+        # Signed endpoint: without credentials the registry simply reports no
+        # cap. A failed load is retried after RETRY_INTERVAL.
+        try:
+            brackets = self.client.leverage_brackets()
+        except ClientError as error:
+            logging.warning(
+                "Found error. status: {}, error code: {}, error message: {}".format(
+                    error.status_code, error.error_code, error.error_message
+                )
+            )
+            self._leverage_retry_at = time.monotonic() + self.RETRY_INTERVAL
+            return
+        except Exception as e:
+            logging.warning(f"Leverage bracket load failed: {str(e)}")
+            self._leverage_retry_at = time.monotonic() + self.RETRY_INTERVAL
+            return
+
+        for elem in brackets or []:
+            info = self._symbols.get(elem.get('symbol'))
+            if info is None or not elem.get('brackets'):
+                continue
+            info.max_leverage = max(int(b['initialLeverage']) for b in elem['brackets'])
+        self._leverage_loaded = True
+
+    def round_price(self, symbol, price):
+        info = self.get(symbol)
+        if info is None or not info.tick_size:
+            precision = info.price_precision if info else 8
+            return round(price, precision)
+        ticks = (Decimal(str(price)) / info.tick_size).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        return float(ticks * info.tick_size)
+
+    def round_qty(self, symbol, qty):
+        # Quantities are floored so an order never exceeds the sized amount.
+        info = self.get(symbol)
+        if info is None or not info.step_size:
+            precision = info.qty_precision if info else 3
+            return round(qty, precision)
+        steps = (Decimal(str(qty)) / info.step_size).quantize(Decimal(1), rounding=ROUND_DOWN)
+        qty = float(steps * info.step_size)
+        if info.max_qty:
+            qty = min(qty, info.max_qty)
+        return qty
+
+    def meets_min_notional(self, symbol, qty, price):
+        return qty * price >= self.get_min_notional(symbol)
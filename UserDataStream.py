@@ -0,0 +1,337 @@
+import json
+import logging
+import threading
+import time
+
+from StreamConnection import StreamConnection
+
+
+# Orders in these states are no longer working on the book.
+CLOSED_ORDER_STATES = {'FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH'}
+# Binance's default for symbols whose leverage was never changed or seen.
+DEFAULT_LEVERAGE = 20
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class AccountLedger:
+    # In-memory positions, working orders and balances kept current from
+    # user-data events and seeded/reconciled from REST. Every entry remembers
+    # the exchange time it was last written at, so a REST snapshot that was
+    # taken before an event already applied cannot roll that event back;
+    # orders closed by an event are remembered until a newer snapshot no
+    # longer lists them.
+    #
+    # ACCOUNT_UPDATE carries wallet balances but not availableBalance, so
+    # free balance is the last REST value moved by what changed since: cross
+    # wallet balance, unrealized PnL and the initial margin of positions and
+    # LIMIT orders (notional / leverage). The periodic reconcile resets it.
+    #
+    # Listeners added with add_listener() get every ORDER_TRADE_UPDATE as
+    # the ledger's order dict, on the stream thread, after it is applied.
+    def __init__(self, quote_of=None):
+        self.quote_of = quote_of or (lambda symbol: 'USDT')
+        self.positions = {}
+        self.open_positions = {}
+        self.orders = {}
+        self.balances = {}
+        self.leverage = {}
+        self.synced_at = 0.0
+        self.events = 0
+        self._closed_orders = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _margin_and_pnl(self, asset):
+        margin = pnl = 0.0
+        for position in self.positions.values():
+            if position['amount'] and self.quote_of(position['symbol']) == asset:
+                margin += abs(position['amount']) * position['entry_price'] / self.leverage.get(position['symbol'], DEFAULT_LEVERAGE)
+                pnl += position['unrealized']
+        for order in self.orders.values():
+            if order['type'] == 'LIMIT' and self.quote_of(order['symbol']) == asset:
+                remaining = order['qty'] - order['filled']
+                margin += remaining * order['price'] / self.leverage.get(order['symbol'], DEFAULT_LEVERAGE)
+        return margin, pnl
+
+    def _set_position(self, symbol, side, amount, entry_price, unrealized, updated):
+        key = (symbol, side)
+        current = self.positions.get(key)
+        if current is not None and current['updated'] > updated:
+            return
+        self.positions[key] = {
+            'symbol': symbol, 'side': side, 'amount': amount,
+            'entry_price': entry_price, 'unrealized': unrealized, 'updated': updated,
+        }
+        if amount:
+            self.open_positions[key] = symbol
+        else:
+            self.open_positions.pop(key, None)
+
+    def _set_order(self, order_id, order, updated):
+        current = self.orders.get(order_id)
+        if current is not None and current['updated'] > updated:
+            return
+        if order['status'] in CLOSED_ORDER_STATES:
+            self.orders.pop(order_id, None)
+            self._closed_orders[order_id] = updated
+        elif self._closed_orders.get(order_id, -1) < updated:
+            order['updated'] = updated
+            self.orders[order_id] = order
+
+    def _set_balance(self, asset, wallet, cross_wallet, updated, available=None):
+        current = self.balances.get(asset)
+        if current is not None and current['updated'] > updated:
+            return
+        if available is not None or current is None:
+            # REST snapshot: new baseline for the available-balance estimate.
+            balance = {'available': cross_wallet if available is None else available}
+            balance['base_cross_wallet'] = cross_wallet
+            balance['base_margin'], balance['base_pnl'] = self._margin_and_pnl(asset)
+        else:
+            balance = current
+        balance.update(wallet=wallet, cross_wallet=cross_wallet, updated=updated)
+        self.balances[asset] = balance
+
+    def load(self, balances, positions, orders, taken_at):
+        # REST snapshot taken at `taken_at` (ms). Entries the snapshot does
+        # not mention are dropped unless an event wrote them afterwards.
+        with self._lock:
+            seen = set()
+            for item in positions:
+                side = item.get('positionSide', 'BOTH')
+                symbol = item['symbol']
+                seen.add((symbol, side))
+                if item.get('leverage'):
+                    self.leverage[symbol] = int(float(item['leverage']))
+                self._set_position(
+                    symbol, side, float(item['positionAmt']), float(item['entryPrice']),
+                    float(item.get('unRealizedProfit', 0.0)), taken_at,
+                )
+            for key in [key for key in self.open_positions if key not in seen]:
+                if self.positions[key]['updated'] <= taken_at:
+                    self._set_position(key[0], key[1], 0.0, 0.0, 0.0, taken_at)
+
+            listed = set()
+            for item in orders:
+                listed.add(item['orderId'])
+                self._set_order(item['orderId'], {
+                    'order_id': item['orderId'], 'symbol': item['symbol'], 'side': item['side'],
+                    'type': item['type'], 'status': item['status'],
+                    'price': float(item.get('price', 0.0)), 'stop_price': float(item.get('stopPrice', 0.0)),
+                    'qty': float(item['origQty']), 'filled': float(item.get('executedQty', 0.0)),
+                }, taken_at)
+            for order_id in [order_id for order_id in self.orders if order_id not in listed]:
+                if self.orders[order_id]['updated'] <= taken_at:
+                    self.orders.pop(order_id)
+            self._closed_orders = {
+                order_id: updated for order_id, updated in self._closed_orders.items() if updated > taken_at
+            }
+
+            for item in balances:
+                wallet = float(item['balance'])
+                self._set_balance(
+                    item['asset'], wallet, float(item.get('crossWalletBalance', wallet)), taken_at,
+                    available=float(item['availableBalance']),
+                )
+            self.synced_at = time.time()
+
+    def apply(self, message):
+        # One user-data event; returns False for event types it ignores.
+        kind = message.get('e')
+        update = None
+        with self._lock:
+            if kind == 'ACCOUNT_UPDATE':
+                updated = int(message.get('E', _now_ms()))
+                account = message['a']
+                for item in account.get('P', ()):
+                    self._set_position(
+                        item['s'], item.get('ps', 'BOTH'), float(item['pa']), float(item['ep']),
+                        float(item.get('up', 0.0)), updated,
+                    )
+                for item in account.get('B', ()):
+                    self._set_balance(item['a'], float(item['wb']), float(item['cw']), updated)
+            elif kind == 'ORDER_TRADE_UPDATE':
+                updated = int(message.get('E', _now_ms()))
+                order = message['o']
+                update = {
+                    'order_id': order['i'], 'symbol': order['s'], 'side': order['S'],
+                    'type': order['o'], 'status': order['X'],
+                    'price': float(order.get('p', 0.0)), 'stop_price': float(order.get('sp', 0.0)),
+                    'qty': float(order['q']), 'filled': float(order.get('z', 0.0)),
+                }
+                self._set_order(order['i'], dict(update), updated)
+            elif kind == 'ACCOUNT_CONFIG_UPDATE':
+                config = message.get('ac')
+                if config:
+                    self.leverage[config['s']] = int(config['l'])
+            else:
+                return False
+            self.events += 1
+        if update is not None:
+            for listener in self._listeners:
+                try:
+                    listener(update)
+                except Exception as e:
+                    logging.error(f"Order update listener failed: {str(e)}")
+        return True
+
+    def position_symbols(self):
+        with self._lock:
+            return list(dict.fromkeys(self.open_positions.values()))
+
+    def open_position_count(self):
+        with self._lock:
+            return len(set(self.open_positions.values()))
+
+    def order_symbols(self):
+        with self._lock:
+            return [order['symbol'] for order in self.orders.values()]
+
+    def portfolio(self):
+        # Same shape as the engine's REST-built portfolio.
+        with self._lock:
+            result = {}
+            for asset, balance in self.balances.items():
+                margin, pnl = self._margin_and_pnl(asset)
+                free = (
+                    balance['available']
+                    + (balance['cross_wallet'] - balance['base_cross_wallet'])
+                    + (pnl - balance['base_pnl'])
+                    - (margin - balance['base_margin'])
+                )
+                result[asset] = {'free': free, 'locked': balance['wallet'] - free}
+            return result
+
+    def status(self):
+        with self._lock:
+            return {
+                'open_positions': len(set(self.open_positions.values())),
+                'open_orders': len(self.orders),
+                'assets': len(self.balances),
+                'events': self.events,
+                'synced_at': self.synced_at,
+            }
+
+
+class UserDataStream(StreamConnection):
+    # Keeps an AccountLedger current from the user-data stream, so the
+    # engine reads positions, working orders and balances without polling.
+    # A listenKey is (re)requested on every connect, kept alive every
+    # `keepalive_interval` seconds and the ledger is reconciled from REST on
+    # start, after every reconnect and every `reconcile_interval` seconds.
+    # The stream is quiet when nothing trades, so successful reconciles and
+    # keepalives count as signs of life for the watchdog. REST snapshots are
+    # stamped in exchange time (local clock + the offset measured from
+    # /fapi/v1/time on each reconcile), the clock event times `E` use.
+    def __init__(self, client, stream_url="wss://fstream.binance.com", keepalive_interval=1800,
+                 reconcile_interval=300, quote_of=None):
+        super().__init__(stream_url, stale_after=2 * reconcile_interval + 60, name="User data stream")
+        self.client = client
+        self.keepalive_interval = keepalive_interval
+        self.reconcile_interval = reconcile_interval
+        self.ledger = AccountLedger(quote_of)
+        self.listen_key = None
+        self.synced = False
+        self.clock_offset = 0
+
+        self._stopped = threading.Event()
+        self._keepalive = None
+
+    def start(self):
+        if self.running:
+            return
+        self._stopped.clear()
+        super().start()
+        self.resync()
+        self._keepalive = threading.Thread(target=self._keep_alive, name="user-data-keepalive", daemon=True)
+        self._keepalive.start()
+
+    def stop(self):
+        self._stopped.set()
+        super().stop()
+        if self.listen_key is not None:
+            try:
+                self.client.close_listen_key(self.listen_key)
+            except Exception as e:
+                logging.warning(f"User data stream listenKey close failed: {str(e)}")
+            self.listen_key = None
+
+    def ready(self):
+        # True when the ledger can stand in for the REST account endpoints.
+        return self.synced and self.is_live()
+
+    def _server_now_ms(self):
+        # Exchange time now, re-measuring the clock offset; a failed
+        # measurement keeps the last one.
+        sent = _now_ms()
+        try:
+            server_time = int(self.client.time()['serverTime'])
+            self.clock_offset = server_time - (sent + _now_ms()) // 2
+        except Exception as e:
+            logging.warning(f"Server time check failed, keeping offset {self.clock_offset}ms: {str(e)}")
+        return _now_ms() + self.clock_offset
+
+    def resync(self):
+        taken_at = self._server_now_ms()
+        try:
+            balances = self.client.balance(recvWindow=6000)
+            positions = self.client.get_position_risk(recvWindow=6000)
+            orders = self.client.get_orders(recvWindow=6000)
+        except Exception as e:
+            logging.error(f"User data stream resync failed: {str(e)}")
+            return False
+
+        self.ledger.load(balances or [], positions or [], orders or [], taken_at)
+        self.synced = True
+        self.mark_alive()
+        logging.info(
+            f"User data stream resynced: {self.ledger.open_position_count()} positions, "
+            f"{len(self.ledger.orders)} open orders"
+        )
+        return True
+
+    def on_connected(self, ws):
+        # Returns the current key while it is still valid, a new one otherwise.
+        self.synced = False
+        self.listen_key = self.client.new_listen_key()['listenKey']
+        ws.user_data(listen_key=self.listen_key)
+
+    def on_reconnected(self):
+        self.resync()
+
+    def handle_message(self, raw):
+        message = json.loads(raw)
+        if isinstance(message, dict) and 'stream' in message:
+            message = message['data']
+        if not isinstance(message, dict):
+            return
+        if message.get('e') == 'listenKeyExpired':
+            logging.warning("User data stream listenKey expired, reconnecting")
+            self.connected = False
+            return
+        if self.ledger.apply(message):
+            self.mark_alive()
+
+    def _keep_alive(self):
+        last_keepalive = last_reconcile = time.monotonic()
+        while not self._stopped.wait(5):
+            now = time.monotonic()
+            if self.listen_key is not None and now - last_keepalive >= self.keepalive_interval:
+                try:
+                    self.client.renew_listen_key(self.listen_key)
+                    last_keepalive = now
+                    self.mark_alive()
+                except Exception as e:
+                    logging.error(f"User data stream keepalive failed: {str(e)}")
+            if now - last_reconcile >= self.reconcile_interval and self.connected:
+                self.resync()
+                last_reconcile = now
+
+    def status(self):
+        return {'live': self.ready(), 'reconnects': self.reconnects, **self.ledger.status()}
@@ -0,0 +1,89 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("websockets")
+
+from MarketDataFeed import MarketDataFeed
+from StreamReplay import StreamReplay
+
+
+class RestSnapshot:
+    # REST side of the feed: the snapshot it resyncs from, and how often.
+    def __init__(self):
+        self.resyncs = 0
+
+    def ticker_24hr_price_change(self):
+        self.resyncs += 1
+        return [{'symbol': 'BTCUSDT', 'lastPrice': '100.0', 'volume': '10'},
+                {'symbol': 'ETHUSDT', 'lastPrice': '10.0', 'volume': '5'}]
+
+    def book_ticker(self):
+        return [{'symbol': 'BTCUSDT', 'bidPrice': '99.9', 'askPrice': '100.1', 'bidQty': '1', 'askQty': '1'},
+                {'symbol': 'ETHUSDT', 'bidPrice': '9.9', 'askPrice': '10.1', 'bidQty': '1', 'askQty': '1'}]
+
+
+def recording(prices):
+    messages = []
+    for price in prices:
+        messages.append(json.dumps([{'e': '24hrTicker', 's': 'BTCUSDT', 'c': str(price), 'v': '11'}]))
+        messages.append(json.dumps({'e': 'bookTicker', 's': 'BTCUSDT', 'b': str(price - 0.1),
+                                    'a': str(price + 0.1), 'B': '2', 'A': '3'}))
+    return messages
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def replay_file(tmp_path):
+    path = tmp_path / "stream.jsonl"
+    path.write_text("\n".join(recording([101.0, 102.0, 103.0])) + "\n")
+    return path
+
+
+def test_feed_applies_replayed_messages(replay_file):
+    replay = StreamReplay.from_file(replay_file)
+    client = RestSnapshot()
+    feed = MarketDataFeed(client, stream_url=replay.start())
+    try:
+        feed.start()
+        assert wait_for(lambda: feed.snapshot().row('BTCUSDT')['ask'] == pytest.approx(103.1))
+        row = feed.snapshot().row('BTCUSDT')
+        assert row['price'] == 103.0 and row['volume'] == 11.0 and row['ask_qty'] == 3.0
+        # Symbols the stream did not mention keep their REST values.
+        assert feed.snapshot().row('ETHUSDT')['price'] == 10.0
+        assert feed.is_live()
+        assert wait_for(lambda: set(replay.subscriptions) == {'!ticker@arr', '!bookTicker'})
+    finally:
+        feed.stop()
+        replay.stop()
+
+
+def test_feed_reconnects_and_resyncs_after_disconnect(replay_file, tmp_path):
+    replay = StreamReplay.from_file(replay_file, close_after=2)
+    client = RestSnapshot()
+    record_path = tmp_path / "recorded.jsonl"
+    feed = MarketDataFeed(client, stream_url=replay.start(), record_path=str(record_path))
+    try:
+        feed.start()
+        assert wait_for(lambda: feed.reconnects >= 1 and replay.connections >= 2)
+        # The reconnect resynced from REST, then the second connection
+        # replayed the whole recording.
+        assert client.resyncs >= 2
+        assert wait_for(lambda: feed.snapshot().row('BTCUSDT')['price'] == 103.0)
+        assert feed.is_live()
+    finally:
+        feed.stop()
+        replay.stop()
+    # The feed records what it received (subscription acks included) in
+    # the format the replay server reads.
+    received = [line for line in record_path.read_text().splitlines() if 'result' not in json.loads(line)]
+    assert received[:2] == recording([101.0])
@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("websockets")
+
+from OrderBook import OrderBook, OrderBookManager
+from StreamReplay import StreamReplay
+
+
+def diff(first, final, previous, bids=(), asks=()):
+    return json.dumps({'e': 'depthUpdate', 's': 'BTCUSDT', 'U': first, 'u': final, 'pu': previous,
+                       'b': [[str(p), str(q)] for p, q in bids], 'a': [[str(p), str(q)] for p, q in asks]})
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class DepthSnapshots:
+    # REST side of the books: returns the queued snapshots in turn, each
+    # only once the manager has buffered `buffered` diff events for it, so
+    # the bridging always runs over the same events.
+    def __init__(self, snapshots):
+        self.snapshots = list(snapshots)
+        self.calls = []
+        self.manager = None
+
+    def depth(self, symbol, limit):
+        self.calls.append(limit)
+        snapshot, buffered = self.snapshots[min(len(self.calls), len(self.snapshots)) - 1]
+        wait_for(lambda: len(self.manager._buffers.get(symbol, [])) >= buffered)
+        return snapshot
+
+
+def tracked(client, replay):
+    manager = OrderBookManager(client, stream_url=replay.start(), resync_interval=0)
+    client.manager = manager
+    manager.track(['BTCUSDT'])
+    return manager
+
+
+SNAPSHOT = {'lastUpdateId': 100, 'bids': [['99.0', '1']], 'asks': [['101.0', '1']]}
+
+
+def test_snapshot_bridges_buffered_events():
+    replay = StreamReplay([
+        diff(90, 95, 89, bids=[(98.0, 5)]),        # before the snapshot, dropped
+        diff(96, 102, 95, bids=[(99.5, 2)]),       # straddles lastUpdateId 100
+        diff(103, 105, 102, asks=[(100.5, 1)]),    # continues from pu 102
+    ], interval=0.2)
+    client = DepthSnapshots([(SNAPSHOT, 2)])
+    manager = tracked(client, replay)
+    try:
+        assert wait_for(lambda: manager.get('BTCUSDT') is not None and manager.get('BTCUSDT').best_ask() == 100.5)
+        book = manager.get('BTCUSDT')
+        assert book.best_bid() == 99.5 and book.last_update_id == 105
+        assert 98.0 not in book.bid_prices
+        assert client.calls == [100]
+    finally:
+        manager.stop()
+        replay.stop()
+
+
+def test_gap_in_update_ids_resyncs():
+    replay = StreamReplay([
+        diff(96, 102, 95, bids=[(99.5, 2)]),
+        diff(106, 108, 105, bids=[(99.7, 1)]),     # pu 105 != 102: updates were lost
+        diff(109, 112, 108, asks=[(100.2, 4)]),
+    ], interval=0.3)
+    resynced = {'lastUpdateId': 110, 'bids': [['99.6', '3']], 'asks': [['100.4', '2']]}
+    client = DepthSnapshots([(SNAPSHOT, 1), (resynced, 2)])
+    manager = tracked(client, replay)
+    try:
+        assert wait_for(lambda: len(client.calls) == 2 and manager.get('BTCUSDT') is not None
+                        and manager.get('BTCUSDT').last_update_id == 112)
+        book = manager.get('BTCUSDT')
+        # Rebuilt from the second snapshot; the event after it was applied
+        # and the one that revealed the gap was not.
+        assert book.best_bid() == 99.6 and book.best_ask() == 100.2
+        assert 99.7 not in book.bid_prices
+    finally:
+        manager.stop()
+        replay.stop()
+
+
+def test_reconnect_resyncs_every_book():
+    replay = StreamReplay([
+        diff(96, 102, 95, bids=[(99.5, 2)]),
+        diff(103, 105, 102, asks=[(100.5, 1)]),
+    ], interval=0.2, close_after=2)
+    client = DepthSnapshots([(SNAPSHOT, 1)])
+    manager = tracked(client, replay)
+    try:
+        assert wait_for(lambda: manager.reconnects >= 1 and len(client.calls) >= 2)
+        # The second connection replays the recording onto the new snapshot.
+        assert wait_for(lambda: manager.get('BTCUSDT') is not None and manager.get('BTCUSDT').last_update_id == 105)
+        assert manager.get('BTCUSDT').best_bid() == 99.5
+    finally:
+        manager.stop()
+        replay.stop()
+
+
+def test_readers_wait_for_the_writer():
+    book = OrderBook('BTCUSDT')
+    book.load_snapshot(SNAPSHOT)
+    seen = []
+    with book.lock:
+        reader = threading.Thread(target=lambda: seen.append(book.best_bid()))
+        reader.start()
+        reader.join(timeout=0.2)
+        assert reader.is_alive()
+        book.bid_prices = book.bid_prices + 1
+    reader.join(timeout=1)
+    assert seen == [100.0]
@@ -0,0 +1,138 @@
+import time
+
+from binance.error import ClientError
+
+from OrderExecutor import OrderExecutor
+from PaperExchange import PaperExchange, PaperPosition
+from UserDataStream import AccountLedger
+
+
+class Registry:
+    def get_qty_precision(self, symbol):
+        return 3
+
+    def get_price_precision(self, symbol):
+        return 2
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def paper(bid=100.0, ask=100.1):
+    quote = {'BTCUSDT': (bid, ask)}
+    return quote, PaperExchange(lambda symbol: quote[symbol], balance=10000.0)
+
+
+def bracket(executor, results, side='BUY', price=99.0):
+    sl, tp = (95.0, 110.0) if side == 'BUY' else (105.0, 90.0)
+    return executor.submit_bracket('BTCUSDT', side, 1.0, price, sl, tp, 10, 'CROSSED', on_exits=results.append).result()
+
+
+def test_paper_rejects_reduce_only_without_position():
+    _, exchange = paper()
+    result = exchange.new_batch_order([
+        {'symbol': 'BTCUSDT', 'side': 'SELL', 'type': 'STOP_MARKET', 'quantity': '1', 'stopPrice': '95',
+         'reduceOnly': 'true'},
+    ])
+    assert result == [{'code': -2022, 'msg': 'ReduceOnly Order is rejected.'}]
+
+
+def test_exits_wait_for_the_entry_fill():
+    quote, exchange = paper()
+    executor = OrderExecutor(exchange, Registry(), poll_interval=0.05)
+    results = []
+    try:
+        entry = bracket(executor, results)['entry']
+        time.sleep(0.2)
+        # Resting entry: nothing to protect yet, and no exits were sent.
+        assert results == [] and list(exchange.orders) == [entry['orderId']]
+
+        quote['BTCUSDT'] = (98.9, 99.0)
+        assert wait_for(lambda: results)
+        assert results[0]['protected'] and results[0]['qty'] == 1.0 and results[0]['open']
+        exits = sorted((order['type'], order['reduce_only']) for order in exchange.orders.values())
+        assert exits == [('STOP_MARKET', True), ('TAKE_PROFIT_MARKET', True)]
+        assert executor.watching == {}
+    finally:
+        executor.shutdown()
+
+
+def test_marketable_entry_is_protected_at_once():
+    _, exchange = paper()
+    executor = OrderExecutor(exchange, Registry(), poll_interval=60)
+    results = []
+    try:
+        bracket(executor, results, side='SELL', price=99.5)
+        executor.drain()
+        assert len(results) == 1 and results[0]['protected']
+        assert exchange.positions['BTCUSDT'].amount == -1.0
+    finally:
+        executor.shutdown()
+
+
+def test_fills_from_the_ledger_size_each_exit_pair():
+    _, exchange = paper()
+    ledger = AccountLedger()
+    executor = OrderExecutor(exchange, Registry(), poll_interval=60)
+    executor.follow(ledger, lambda: True)
+    results = []
+    try:
+        entry = bracket(executor, results)['entry']
+        # The paper exchange does not partially fill; stand in a position
+        # and let the stream report a partial, then the full fill.
+        exchange.positions.setdefault('BTCUSDT', PaperPosition('BTCUSDT')).apply_fill(0.4, 99.0)
+        for status, filled in (('PARTIALLY_FILLED', 0.4), ('FILLED', 1.0)):
+            if status == 'FILLED':
+                exchange.positions['BTCUSDT'].apply_fill(0.6, 99.0)
+            ledger.apply({'e': 'ORDER_TRADE_UPDATE', 'E': 1, 'o': {
+                'i': entry['orderId'], 's': 'BTCUSDT', 'S': 'BUY', 'o': 'LIMIT', 'X': status,
+                'p': '99', 'q': '1', 'z': str(filled)}})
+            executor.drain()
+        assert [round(result['qty'], 3) for result in results] == [0.4, 0.6]
+        assert all(result['protected'] for result in results)
+        assert entry['orderId'] not in executor.watching
+    finally:
+        executor.shutdown()
+
+
+class RejectingExits(PaperExchange):
+    def new_batch_order(self, batchOrders, **kwargs):
+        self.batches = getattr(self, 'batches', 0) + 1
+        return [{'code': -2022, 'msg': 'ReduceOnly Order is rejected.'} for _ in batchOrders]
+
+
+def test_rejected_exits_flatten_the_fill():
+    quote = {'BTCUSDT': (100.0, 100.1)}
+    exchange = RejectingExits(lambda symbol: quote[symbol], balance=10000.0)
+    executor = OrderExecutor(exchange, Registry(), poll_interval=60, exit_retries=1)
+    results = []
+    try:
+        bracket(executor, results, price=100.2)
+        executor.drain()
+        assert exchange.batches == 2
+        assert results[0]['flattened'] and not results[0]['protected'] and not results[0]['open']
+        assert exchange.positions['BTCUSDT'].amount == 0
+        assert exchange.orders == {}
+    finally:
+        executor.shutdown()
+
+
+class NoLeverage(PaperExchange):
+    def change_leverage(self, symbol, leverage, **kwargs):
+        raise ClientError(400, -4028, "Leverage 200 is not valid", {})
+
+
+def test_no_entry_when_leverage_cannot_be_set():
+    exchange = NoLeverage(lambda symbol: (100.0, 100.1), balance=10000.0)
+    executor = OrderExecutor(exchange, Registry())
+    try:
+        assert bracket(executor, [])['entry'] is None
+        assert exchange.orders == {} and exchange.closed == {}
+    finally:
+        executor.shutdown()
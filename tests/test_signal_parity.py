@@ -0,0 +1,12 @@
+import pytest
+
+from SignalBenchmark import check_incremental_parity, check_parity
+
+
+def test_batch_scores_match_talib():
+    pytest.importorskip("talib")
+    assert check_parity(symbols=50, bars=300) == []
+
+
+def test_incremental_state_matches_batch_scores():
+    assert check_incremental_parity(symbols=50, bars=300) == []